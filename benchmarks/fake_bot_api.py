@@ -0,0 +1,406 @@
+"""
+Локальный поддельный Bot API для бенчмарков.
+
+Понимает ровно то, что нужно боту: getMe, getUpdates (long polling), setWebhook /
+deleteWebhook, send*/edit*/answer*, setMyCommands, getFile и скачивание файла —
+на всё отвечает правдоподобным JSON и записывает каждый вызов с временем
+получения. С global_rate / chat_rate отвечает 429, как настоящий Telegram. Апдейты подаются через
+push_update(): в режиме polling они уходят в ответ getUpdates, если бот
+поставил вебхук — отправляются POST-запросом на его адрес с секретом.
+
+HTTP-сервер — голый asyncio, без зависимостей (keep-alive, Content-Length).
+Можно поднять отдельно и направить на него настоящего бота (BOT_API_URL в .env):
+
+    python -m benchmarks.fake_bot_api --port 8081
+
+InProcessRequest — то же самое без сокетов: подставляется в Bot(request=...)
+и отвечает из FakeBotAPI.call прямо в процессе (для офлайн-бенчмарков хэндлеров).
+"""
+import asyncio
+import email.parser
+import email.policy
+import itertools
+import json
+import time
+import urllib.parse
+from collections import Counter, deque
+
+import httpx
+from telegram.request import BaseRequest
+
+# Минимальный валидный JPEG для скачивания файлов (getFile → /file/bot<token>/…)
+FAKE_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912130f141d1a"
+    "1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27393d38323c2e333432ffc0000b080001000101011100ffc4001f"
+    "0000010501010101010100000000000000000102030405060708090a0bffda0008010100003f00d2cf20ffd9"
+)
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "NDsborki", "username": "ndsborki_bot"}
+
+
+class BotAPIError(Exception):
+    """Поднимите из FakeBotAPI.call, чтобы ответить ошибкой Bot API (403, 429…)."""
+
+    def __init__(self, description: str, error_code: int = 400, retry_after: int = None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+def _parse_body(content_type: str, body: bytes) -> dict:
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        params = {}
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            params[name] = payload if part.get_filename() else payload.decode("utf-8", "replace")
+        return params
+    return dict(urllib.parse.parse_qsl(body.decode("utf-8")))
+
+
+def _json_param(params: dict, name: str, default=None):
+    value = params.get(name, default)
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FakeBotAPI:
+    """
+    Поддельный Bot API. С global_rate / chat_rate ведёт себя как Telegram при
+    флуде: сообщений (send*/edit*) больше лимита за секунду — ответ 429 с retry_after.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, global_rate: int = None, chat_rate: int = None,
+                 record_calls: bool = True):
+        self.host = host
+        self.port = port
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.record_calls = record_calls
+        self.calls = []                 # (время, метод, параметры), если record_calls
+        self.method_counts = Counter()
+        self.flood_errors = Counter()   # метод -> сколько раз ответили 429
+        self.replies = asyncio.Queue()  # (время, метод, параметры) для send*/edit*
+        self.ready = asyncio.Event()    # бот начал забирать апдейты
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.commands = {}              # область (JSON) -> меню команд
+        self._updates = asyncio.Queue()
+        self._chat_replies = {}
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._sent_global = deque()
+        self._sent_by_chat = {}
+        self._server = None
+        self._client = None
+
+    @property
+    def url(self) -> str:
+        """Для BOT_API_URL в .env бота."""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def base_url(self) -> str:
+        """Для ApplicationBuilder.base_url(): к нему добавляется токен."""
+        return f"{self.url}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._client = httpx.AsyncClient(timeout=10)
+        return self
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- Подача апдейтов и ответы бота ---
+
+    def next_update_id(self) -> int:
+        return next(self._update_ids)
+
+    async def push_update(self, update: dict):
+        """Отдаёт апдейт боту: через getUpdates или POST на вебхук."""
+        if self.webhook_url:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret} if self.webhook_secret else {}
+            resp = await self._client.post(self.webhook_url, json=update, headers=headers)
+            resp.raise_for_status()
+        else:
+            await self._updates.put(update)
+
+    def chat_replies(self, chat_id: int) -> asyncio.Queue:
+        """Очередь сообщений бота в чат: (время, метод, параметры, message_id)."""
+        queue = self._chat_replies.get(chat_id)
+        if queue is None:
+            queue = self._chat_replies[chat_id] = asyncio.Queue()
+        return queue
+
+    def _check_flood(self, chat_id, now: float):
+        """Скользящее окно в 1 с: как Telegram, отвечаем 429, если бот шлёт слишком часто."""
+        windows = []
+        if self.global_rate:
+            windows.append((self._sent_global, self.global_rate))
+        if self.chat_rate and chat_id is not None:
+            windows.append((self._sent_by_chat.setdefault(chat_id, deque()), self.chat_rate))
+        for window, limit in windows:
+            while window and now - window[0] > 1:
+                window.popleft()
+            if len(window) >= limit:
+                raise BotAPIError("Too Many Requests: retry after 1", 429, retry_after=1)
+        for window, _ in windows:
+            window.append(now)
+
+    # --- Методы Bot API ---
+
+    def _message(self, params: dict, message_id: int = None) -> dict:
+        chat_id = _json_param(params, "chat_id", 0)
+        message = {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "photo" in params or "media" in params:
+            message["photo"] = [{"file_id": f"fake-photo-{message['message_id']}", "file_unique_id": "u",
+                                 "width": 320, "height": 320}]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+        if "reply_markup" in params:
+            markup = _json_param(params, "reply_markup")
+            if isinstance(markup, dict) and "inline_keyboard" in markup:
+                message["reply_markup"] = markup
+        return message
+
+    async def _get_updates(self, params: dict):
+        self.ready.set()
+        timeout = float(_json_param(params, "timeout", 0) or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout) if timeout else self._updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def call(self, method: str, params: dict):
+        received = time.perf_counter()
+        self.method_counts[method] += 1
+        if self.record_calls:
+            self.calls.append((received, method, params))
+        name = method.lower()
+        if name == "getme":
+            return BOT_USER
+        if name == "getupdates":
+            return await self._get_updates(params)
+        if name == "setwebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_secret = params.get("secret_token")
+            return True
+        if name == "deletewebhook":
+            self.webhook_url = None
+            return True
+        if name == "getfile":
+            file_id = params.get("file_id", "")
+            return {"file_id": file_id, "file_unique_id": file_id[-16:] or "u", "file_size": len(FAKE_JPEG),
+                    "file_path": f"photos/{file_id or 'file'}.jpg"}
+        if name.startswith(("send", "edit")):
+            chat_id = _json_param(params, "chat_id")
+            try:
+                self._check_flood(chat_id, received)
+            except BotAPIError:
+                self.flood_errors[method] += 1
+                raise
+            edited_id = _json_param(params, "message_id") if name.startswith("edit") else None
+            message = self._message(params, edited_id)
+            await self.replies.put((received, method, params))
+            if chat_id is not None:
+                await self.chat_replies(chat_id).put((received, method, params, message["message_id"]))
+            if name.startswith("edit") and "media" not in params and "text" not in params and "caption" not in params:
+                return True
+            return message
+        if name in ("getmycommands", "setmycommands", "deletemycommands"):
+            scope = json.dumps(_json_param(params, "scope") or {"type": "default"}, sort_keys=True)
+            if name == "setmycommands":
+                self.commands[scope] = _json_param(params, "commands", [])
+            elif name == "deletemycommands":
+                self.commands.pop(scope, None)
+            else:
+                return self.commands.get(scope, [])
+            return True
+        # answerCallbackQuery, answerInlineQuery, deleteMessage…
+        return True
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                if path.startswith("/file/"):
+                    # Скачивание файла, полученного через getFile
+                    self.method_counts["download"] += 1
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\nContent-Type: image/jpeg\r\n"
+                        + f"Content-Length: {len(FAKE_JPEG)}\r\n\r\n".encode() + FAKE_JPEG
+                    )
+                    await writer.drain()
+                    continue
+
+                method = path.rsplit("/", 1)[-1].split("?", 1)[0]
+                params = _parse_body(headers.get("content-type", ""), body)
+                try:
+                    payload = {"ok": True, "result": await self.call(method, params)}
+                except BotAPIError as e:
+                    payload = {"ok": False, "error_code": e.error_code, "description": str(e)}
+                    if e.retry_after is not None:
+                        payload["parameters"] = {"retry_after": e.retry_after}
+                except Exception as e:  # noqa: BLE001 — бенчмарк должен видеть ошибку, а не обрыв соединения
+                    payload = {"ok": False, "error_code": 400, "description": str(e)}
+                data = json.dumps(payload).encode()
+                status = payload.get("error_code", 200)
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n".encode()
+                    + b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Клиент закрыл соединение или сервер останавливается посреди long polling
+            pass
+        finally:
+            writer.close()
+
+
+class InProcessRequest(BaseRequest):
+    """Сетевой слой PTB, который вместо HTTP зовёт FakeBotAPI.call."""
+
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        params = {}
+        if request_data is not None:
+            params = dict(request_data.json_parameters)
+            if request_data.contains_files:
+                params.update({k: v for k, v in request_data.multipart_data.items() if k not in params})
+        try:
+            payload = {"ok": True, "result": await self.api.call(url.rsplit("/", 1)[-1], params)}
+        except BotAPIError as e:
+            payload = {"ok": False, "error_code": e.error_code, "description": str(e)}
+            if e.retry_after is not None:
+                payload["parameters"] = {"retry_after": e.retry_after}
+            return e.error_code, json.dumps(payload).encode()
+        return 200, json.dumps(payload).encode()
+
+
+def command_update(update_id: int, text: str, user_id: int = 1) -> dict:
+    """Апдейт «пользователь написал команду»."""
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+def text_update(update_id: int, text: str, user_id: int = 1) -> dict:
+    """Апдейт «пользователь нажал кнопку reply-клавиатуры / написал текст»."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id: int, data: str, message_id: int, user_id: int = 1) -> dict:
+    """Апдейт «пользователь нажал инлайн-кнопку под сообщением бота message_id»."""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": "Bench"},
+                "from": BOT_USER,
+                "text": "…",
+            },
+        },
+    }
+
+
+async def _serve(port: int, global_rate: int, chat_rate: int):
+    api = await FakeBotAPI(port=port, global_rate=global_rate, chat_rate=chat_rate, record_calls=False).start()
+    print(f"🧪 Поддельный Bot API: BOT_API_URL={api.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Поддельный Telegram Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=int, default=30, help="сообщений в секунду на бота (0 — без лимита)")
+    parser.add_argument("--chat-rate", type=int, default=0, help="сообщений в секунду в один чат (0 — без лимита)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.port, args.global_rate, args.chat_rate))
+    except KeyboardInterrupt:
+        pass
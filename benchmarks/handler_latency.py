@@ -0,0 +1,345 @@
+"""
+Офлайн-бенчмарк хэндлеров на синтетических каталогах (1k / 10k / 100k сборок).
+
+Настоящие корутины conversations/view.py, handlers/show_all.py,
+conversations/delete.py и handlers/admin.status_command вызываются с
+поддельными Update, бот отвечает из FakeBotAPI прямо в процессе (без сети).
+Для каждого шага — p50/p95/среднее, пиковая память на шаг и сколько памяти
+шаг оставил после себя (tracemalloc, отдельным проходом), для каталога —
+время загрузки и пиковый RSS процесса. Каждый размер гоняется в отдельном
+процессе, чтобы RSS и кэши одного размера не влияли на другой.
+
+    python -m benchmarks.handler_latency                       # 1k, 10k, 100k
+    python -m benchmarks.handler_latency --sizes 1000 10000 --save
+    python -m benchmarks.handler_latency --compare             # сравнить с baselines/handlers.json
+
+Базовая линия лежит в benchmarks/baselines/handlers.json: после оптимизации
+перезапишите её (--save) и закоммитьте — регрессии видны в диффе.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BASELINE = ROOT / "benchmarks" / "baselines" / "handlers.json"
+DEFAULT_SIZES = (1000, 10_000, 100_000)
+
+BENCH_USER = 777000001
+# Порог, с которого изменение считается регрессией в --compare
+REGRESSION = 0.20
+# Шаги быстрее этого в --compare не сравниваем: там один шум планировщика
+LATENCY_FLOOR_MS = 2.0
+
+
+# --- Поддельные апдейты ---
+
+def _user() -> dict:
+    return {"id": BENCH_USER, "is_bot": False, "first_name": "Bench"}
+
+
+def _chat() -> dict:
+    return {"id": BENCH_USER, "type": "private", "first_name": "Bench"}
+
+
+def message_update(update_id: int, text: str) -> dict:
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "chat": _chat(), "from": _user(),
+            "text": text, "entities": entities,
+        },
+    }
+
+
+def callback_update(update_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "bench", "from": _user(), "data": data,
+            "message": {
+                "message_id": 1, "date": int(time.time()), "chat": _chat(),
+                "from": {"id": 100000, "is_bot": True, "first_name": "NDsborki"}, "text": "…",
+            },
+        },
+    }
+
+
+# --- Прогон в отдельном процессе ---
+
+class Runner:
+    def __init__(self, app, api):
+        self.app = app
+        self.api = api
+        self.update_id = 0
+        self.samples = {}
+        self.alloc = {}
+        self.trace = False
+
+    def _last_buttons(self) -> list:
+        """callback_data кнопок последнего отправленного/изменённого сообщения."""
+        for _, method, params in reversed(self.api.calls):
+            markup = params.get("reply_markup")
+            if method.startswith(("send", "edit")) and markup:
+                rows = json.loads(markup).get("inline_keyboard", [])
+                return [b["callback_data"] for row in rows for b in row if "callback_data" in b]
+        return []
+
+    async def step(self, name: str, handler, update_dict: dict):
+        from telegram import Update
+        from telegram.ext import CallbackContext
+
+        self.update_id += 1
+        update_dict["update_id"] = self.update_id
+        update = Update.de_json(update_dict, self.app.bot)
+        context = CallbackContext.from_update(update, self.app)
+        self.api.calls.clear()
+
+        if self.trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = await handler(update, context)
+            current, peak = tracemalloc.get_traced_memory()
+            self.alloc.setdefault(name, []).append((peak - before, current - before))
+        else:
+            started = time.perf_counter()
+            result = await handler(update, context)
+            self.samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        while not self.api.replies.empty():
+            self.api.replies.get_nowait()
+        return result
+
+    async def scenario_view(self, rng: random.Random, rounds: int, pages: int):
+        from conversations import view
+
+        for _ in range(rounds):
+            await self.step("view.start", view.view_start, message_update(0, "📋 Сборки Warzone"))
+            cat = rng.choice([b for b in self._last_buttons() if b.startswith("cat|")])
+            await self.step("view.category", view.on_category_selected, callback_update(0, cat))
+            type_btn = rng.choice([b for b in self._last_buttons() if b.startswith("type|")])
+            await self.step("view.type", view.on_type_selected, callback_update(0, type_btn))
+            weapon = rng.choice([b for b in self._last_buttons() if b.startswith("weapon|")])
+            await self.step("view.weapon", view.on_weapon_selected, callback_update(0, weapon))
+            count = rng.choice(["view|5|0", "view|8|0"])
+            await self.step("view.first_build", view.on_view_callback, callback_update(0, count))
+            for _ in range(pages):
+                nxt = [b for b in self._last_buttons() if b.startswith("view|")]
+                if not nxt:
+                    break
+                await self.step("view.next", view.on_view_callback, callback_update(0, nxt[-1]))
+
+    async def scenario_show_all(self, rng: random.Random, rounds: int, pages: int):
+        from handlers import show_all
+
+        for _ in range(rounds):
+            await self.step("show_all.start", show_all.show_all_command, message_update(0, "/show_all"))
+            cat = rng.choice([b for b in self._last_buttons() if b.startswith("cat|")])
+            await self.step("show_all.category", show_all.category_callback, callback_update(0, cat))
+            for _ in range(pages):
+                nxt = [b for b in self._last_buttons() if b.startswith("cat|") and not b.endswith("|0")]
+                if not nxt:
+                    break
+                await self.step("show_all.page", show_all.category_callback, callback_update(0, nxt[-1]))
+
+    async def scenario_delete(self, rng: random.Random, rounds: int, pages: int):
+        from conversations import delete
+
+        for _ in range(rounds):
+            self.app.user_data[BENCH_USER].pop("delete_cursor", None)
+            await self.step("delete.start", delete.delete_start, message_update(0, "/delete"))
+            for _ in range(pages):
+                nxt = [b for b in self._last_buttons() if b.startswith("del|page|")]
+                if not nxt:
+                    break
+                await self.step("delete.page", delete.browser_callback, callback_update(0, nxt[-1]))
+            await self.step("delete.filter_menu", delete.browser_callback, callback_update(0, "del|filter|type"))
+            option = rng.choice([b for b in self._last_buttons() if b.startswith("del|set|type|") and not b.endswith("|-")])
+            await self.step("delete.filter_set", delete.browser_callback, callback_update(0, option))
+            ask = rng.choice([b for b in self._last_buttons() if b.startswith("del|ask|")])
+            await self.step("delete.ask", delete.browser_callback, callback_update(0, ask))
+            confirm = [b for b in self._last_buttons() if b.startswith("confirm_delete|")]
+            await self.step("delete.confirm", delete.delete_confirm, callback_update(0, confirm[0]))
+
+    async def scenario_status(self, rounds: int):
+        from handlers import admin
+
+        for _ in range(rounds):
+            await self.step("admin.status", admin.status_command, message_update(0, "/status"))
+
+    async def run_all(self, seed: int, rounds: int, pages: int):
+        rng = random.Random(seed)
+        await self.scenario_view(rng, rounds, pages)
+        await self.scenario_show_all(rng, rounds, pages)
+        await self.scenario_delete(rng, max(1, rounds // 3), pages)
+        await self.scenario_status(max(1, rounds // 10))
+
+
+async def _worker(rounds: int, pages: int) -> dict:
+    from benchmarks.fake_bot_api import FakeBotAPI, InProcessRequest
+    from telegram.ext import ApplicationBuilder
+    from utils import repository
+    from utils.module_catalog import catalog
+
+    catalog.refresh()
+    started = time.perf_counter()
+    total = await repository.total()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    api = FakeBotAPI()
+    request = InProcessRequest(api)
+    app = ApplicationBuilder().token("123456:BENCH").request(request).get_updates_request(request).build()
+    await app.initialize()
+
+    runner = Runner(app, api)
+    await runner.run_all(seed=1, rounds=rounds, pages=pages)
+    # Второй проход — с tracemalloc: сколько памяти нужно шагу (на тех же, уже прогретых данных)
+    tracemalloc.start()
+    runner.trace = True
+    await runner.run_all(seed=2, rounds=max(1, rounds // 3), pages=pages)
+    tracemalloc.stop()
+    await app.shutdown()
+
+    steps = {}
+    for name, samples in runner.samples.items():
+        ordered = sorted(samples)
+        alloc = runner.alloc.get(name)
+        steps[name] = {
+            "n": len(samples),
+            "p50_ms": round(statistics.median(ordered), 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+            "mean_ms": round(statistics.fmean(ordered), 3),
+            # None — шаг не встретился в проходе с tracemalloc
+            "alloc_peak_kb": round(max(a[0] for a in alloc) / 1024, 1) if alloc else None,
+            "retained_kb": round(statistics.median(a[1] for a in alloc) / 1024, 1) if alloc else None,
+        }
+    return {
+        "builds": total,
+        "load_ms": round(load_ms, 1),
+        # ru_maxrss в Linux — килобайты
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "steps": steps,
+    }
+
+
+def run_size(size: int, rounds: int, pages: int) -> dict:
+    """Генерирует каталог и гоняет бенчмарк в отдельном процессе."""
+    from benchmarks import synthetic
+
+    with tempfile.TemporaryDirectory(prefix="ndsborki-bench-") as tmp:
+        workdir = pathlib.Path(tmp)
+        db = synthetic.write(workdir / "builds.json", size)
+        out = workdir / "result.json"
+        env = {
+            **os.environ,
+            "BUILDS_BACKEND": "json",
+            "BUILDS_JSON_PATH": str(db),
+            "ALLOWED_USERS": str(BENCH_USER),
+            "STATE_PATH": str(workdir / "state.sqlite3"),
+            "SUBSCRIBERS_PATH": str(workdir / "subscribers.sqlite3"),
+            "METRICS_PATH": str(workdir / "metrics.prom"),
+            "FILE_IDS_PATH": str(workdir / "file_ids.json"),
+            "IMAGES_DIR": str(workdir / "images"),
+        }
+        cmd = [
+            sys.executable, "-m", "benchmarks.handler_latency", "--worker",
+            "--sizes", str(size), "--rounds", str(rounds), "--pages", str(pages), "--out", str(out),
+        ]
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+        result = json.loads(out.read_text(encoding="utf-8"))
+        result["file_mb"] = round(db.stat().st_size / 1e6, 1)
+        return result
+
+
+# --- Отчёт и сравнение с базовой линией ---
+
+def print_report(results: dict):
+    for size, r in results.items():
+        print(f"\n📦 {int(size):,} сборок ({r['file_mb']} МБ): загрузка {r['load_ms']:.0f} мс, "
+              f"пиковый RSS {r['peak_rss_mb']:.0f} МБ")
+        print(f"  {'шаг':22} {'n':>4} {'p50 мс':>8} {'p95 мс':>8} {'пик КБ':>8} {'остал. КБ':>9}")
+        kb = lambda v, width: f"{v:>{width}.1f}" if v is not None else f"{'—':>{width}}"  # noqa: E731
+        for name, s in r["steps"].items():
+            print(f"  {name:22} {s['n']:>4} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+                  f"{kb(s['alloc_peak_kb'], 8)} {kb(s['retained_kb'], 9)}")
+
+
+def compare(results: dict, baseline: dict) -> int:
+    """Печатает изменения относительно базовой линии; возвращает число регрессий."""
+    regressions = 0
+
+    def check(label: str, new: float, old: float, floor: float):
+        nonlocal regressions
+        # Совсем маленькие величины шумят — сравниваем, только если хоть одна заметна
+        if old is None or new is None or max(new, old) < floor:
+            return
+        change = (new - old) / old if old else float("inf")
+        if abs(change) >= REGRESSION:
+            mark = "⚠️ " if change > 0 else "✅ "
+            regressions += change > 0
+            print(f"  {mark}{label}: {old:.2f} → {new:.2f} ({change:+.0%})")
+
+    for size, r in results.items():
+        base = baseline.get(size)
+        if base is None:
+            continue
+        print(f"\n🔍 {int(size):,} сборок против базовой линии:")
+        check("загрузка, мс", r["load_ms"], base.get("load_ms"), 5)
+        check("пиковый RSS, МБ", r["peak_rss_mb"], base.get("peak_rss_mb"), 1)
+        for name, s in r["steps"].items():
+            b = base["steps"].get(name)
+            if b is None:
+                continue
+            check(f"{name} p50, мс", s["p50_ms"], b["p50_ms"], LATENCY_FLOOR_MS)
+            check(f"{name} p95, мс", s["p95_ms"], b["p95_ms"], LATENCY_FLOOR_MS)
+            check(f"{name} пик памяти, КБ", s["alloc_peak_kb"], b["alloc_peak_kb"], 64)
+    print(f"\nРегрессий: {regressions}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк хэндлеров на синтетических каталогах")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--rounds", type=int, default=30, help="сколько раз пройти каждый сценарий")
+    parser.add_argument("--pages", type=int, default=5, help="сколько раз листать «дальше» в сценарии")
+    parser.add_argument("--save", nargs="?", const=str(BASELINE), help="сохранить как базовую линию")
+    parser.add_argument("--compare", nargs="?", const=str(BASELINE), help="сравнить с базовой линией")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = asyncio.run(_worker(args.rounds, args.pages))
+        pathlib.Path(args.out).write_text(json.dumps(result), encoding="utf-8")
+        return 0
+
+    results = {}
+    for size in args.sizes:
+        print(f"⏳ {size:,} сборок…", flush=True)
+        results[str(size)] = run_size(size, args.rounds, args.pages)
+    print_report(results)
+
+    status = 0
+    if args.compare:
+        status = 1 if compare(results, json.loads(pathlib.Path(args.compare).read_text(encoding="utf-8"))) else 0
+    if args.save:
+        path = pathlib.Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        saved = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        saved.update(results)
+        path.write_text(json.dumps(saved, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"💾 Базовая линия: {path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Сквозной нагрузочный тест: настоящий bot.py против поддельного Bot API.
+
+Поднимает benchmarks/fake_bot_api.py, запускает bot.py отдельным процессом
+(BOT_API_URL указывает на подделку, каталог — синтетический из
+benchmarks/synthetic.py) и гоняет N одновременных пользователей: половина
+проходит диалог просмотра сборок (категория → тип → оружие → карточка →
+листание), половина листает /show_all. Каждый шаг — апдейт через getUpdates и
+ожидание ответа бота (sendMessage / editMessageText / editMessageMedia) в этот
+чат. Задержка шага — от выдачи апдейта до получения ответа, то есть вместе с
+polling, хэндлером и rate limiter'ом бота.
+
+Поддельный API, как и Telegram, отвечает 429 при превышении лимитов
+(--global-rate, --chat-rate) — в отчёте видно, сколько раз бот в них упёрся.
+
+    python -m benchmarks.load_test --users 50 --duration 30
+    python -m benchmarks.load_test --users 200 --builds 100000 --chat-rate 1 --save
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks import synthetic  # noqa: E402
+from benchmarks.fake_bot_api import FakeBotAPI, callback_update, command_update, text_update  # noqa: E402
+
+RESULTS = ROOT / "benchmarks" / "baselines" / "load.json"
+FIRST_USER = 900_000_001
+# Сколько ждать, пока бот загрузит каталог и начнёт polling
+STARTUP_TIMEOUT = 180
+
+
+class StepTimeout(Exception):
+    pass
+
+
+def _buttons(params: dict) -> list:
+    """[(текст, callback_data)] инлайн-клавиатуры из параметров send*/edit*."""
+    markup = params.get("reply_markup")
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    rows = (markup or {}).get("inline_keyboard", [])
+    return [(b.get("text", ""), b["callback_data"]) for row in rows for b in row if "callback_data" in b]
+
+
+class User:
+    def __init__(self, test: "LoadTest", user_id: int, rng: random.Random):
+        self.test = test
+        self.api = test.api
+        self.user_id = user_id
+        self.rng = rng
+        self.replies = test.api.chat_replies(user_id)
+        self.message_id = None  # сообщение бота, под которым нажимаем кнопки
+        self.buttons = []       # и его кнопки
+
+    async def step(self, name: str, update: dict) -> list:
+        """Отдаёт апдейт и ждёт ответа бота с инлайн-клавиатурой; возвращает её кнопки."""
+        # Ответы, опоздавшие к прошлому шагу, к этому не относятся
+        while not self.replies.empty():
+            self.replies.get_nowait()
+        started = time.perf_counter()
+        await self.api.push_update(update)
+        deadline = started + self.test.timeout
+        while True:
+            try:
+                received, method, params, message_id = await asyncio.wait_for(
+                    self.replies.get(), max(0.0, deadline - time.perf_counter())
+                )
+            except asyncio.TimeoutError:
+                self.test.timeouts[name] = self.test.timeouts.get(name, 0) + 1
+                raise StepTimeout(name) from None
+            buttons = _buttons(params)
+            # «Загружаю меню…» без инлайн-кнопок — ждём следующее сообщение;
+            # правка без кнопок («нет сборок») — конец сценария
+            if buttons or method.lower().startswith("edit"):
+                break
+        self.test.samples.setdefault(name, []).append((received - started) * 1000)
+        self.message_id = message_id
+        self.buttons = buttons
+        return buttons
+
+    async def think(self):
+        if self.test.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.test.think))
+
+    def _message(self, text: str) -> dict:
+        update_id = self.api.next_update_id()
+        if text.startswith("/"):
+            return command_update(update_id, text, self.user_id)
+        return text_update(update_id, text, self.user_id)
+
+    def _press(self, data: str) -> dict:
+        return callback_update(self.api.next_update_id(), data, self.message_id, self.user_id)
+
+    def _pick(self, buttons: list, prefix: str) -> str:
+        options = [data for _, data in buttons if data.startswith(prefix)]
+        if not options:
+            raise StepTimeout(prefix)
+        return self.rng.choice(options)
+
+    async def walk_view(self):
+        if any(data == "restart" for _, data in self.buttons):
+            # Диалог ещё открыт (кнопка меню в нём не сработает) — «📋 Категории», как сделал бы человек
+            buttons = await self.step("view.restart", self._press("restart"))
+        else:
+            buttons = await self.step("view.start", self._message("📋 Сборки Warzone"))
+        await self.think()
+        buttons = await self.step("view.category", self._press(self._pick(buttons, "cat|")))
+        await self.think()
+        buttons = await self.step("view.type", self._press(self._pick(buttons, "type|")))
+        await self.think()
+        buttons = await self.step("view.weapon", self._press(self._pick(buttons, "weapon|")))
+        await self.think()
+        # «5 модулей (N)» / «8 модулей (N)» — берём тот, где сборки есть
+        counts = [data for text, data in buttons if data.startswith("view|") and not text.endswith("(0)")]
+        if not counts:
+            return
+        buttons = await self.step("view.first_build", self._press(self.rng.choice(counts)))
+        for _ in range(self.test.pages):
+            nxt = [data for text, data in buttons if data.startswith("view|") and "Следующая" in text]
+            if not nxt:
+                return
+            await self.think()
+            buttons = await self.step("view.next", self._press(nxt[0]))
+
+    async def walk_show_all(self):
+        buttons = await self.step("show_all.start", self._message("/show_all"))
+        await self.think()
+        buttons = await self.step("show_all.category", self._press(self._pick(buttons, "cat|")))
+        for _ in range(self.test.pages):
+            nxt = [data for text, data in buttons if data.startswith("cat|") and "След" in text]
+            if not nxt:
+                return
+            await self.think()
+            buttons = await self.step("show_all.page", self._press(nxt[0]))
+
+    async def run(self, walk, stop_at: float):
+        while time.perf_counter() < stop_at:
+            try:
+                await walk()
+                self.test.walks += 1
+            except StepTimeout:
+                # Бот не ответил — начинаем сценарий заново, как сделал бы человек
+                self.buttons = []
+            await self.think()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.users = args.users
+        self.duration = args.duration
+        self.builds = args.builds
+        self.pages = args.pages
+        self.think = args.think
+        self.timeout = args.timeout
+        self.show_all_share = args.show_all_share
+        self.api = FakeBotAPI(global_rate=args.global_rate or None, chat_rate=args.chat_rate or None,
+                              record_calls=False)
+        self.samples = {}
+        self.timeouts = {}
+        self.walks = 0
+
+    def _env(self, workdir: pathlib.Path, db: pathlib.Path) -> dict:
+        user_ids = ",".join(str(FIRST_USER + i) for i in range(self.users))
+        return {
+            **os.environ,
+            "BOT_TOKEN": "123456:LOADTEST",
+            "BOT_API_URL": self.api.url,
+            "BOT_MODE": "polling",
+            "BUILDS_BACKEND": "json",
+            "BUILDS_JSON_PATH": str(db),
+            # view_start доступен только админам — делаем ими всех виртуальных пользователей
+            "ALLOWED_USERS": user_ids,
+            "STATE_PATH": str(workdir / "state.sqlite3"),
+            "SUBSCRIBERS_PATH": str(workdir / "subscribers.sqlite3"),
+            "METRICS_PATH": str(workdir / "metrics.prom"),
+            "LOG_DIR": str(workdir / "logs"),
+            # Фейковые file_id не должны попасть в кэш рабочего бота
+            "FILE_IDS_PATH": str(workdir / "file_ids.json"),
+            "IMAGES_DIR": str(workdir / "images"),
+        }
+
+    async def _wait_ready(self, proc: subprocess.Popen, log_path: pathlib.Path):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while not self.api.ready.is_set():
+            if proc.poll() is not None:
+                errors = log_path.parent / "logs" / "error.log"
+                tail = (errors.read_text() if errors.exists() else "") + log_path.read_text()
+                sys.exit(f"❌ bot.py завершился с кодом {proc.returncode}:\n{tail[-3000:]}")
+            if time.monotonic() > deadline:
+                sys.exit(f"❌ bot.py не начал polling за {STARTUP_TIMEOUT} с")
+            try:
+                await asyncio.wait_for(self.api.ready.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> dict:
+        await self.api.start()
+        with tempfile.TemporaryDirectory(prefix="ndsborki-load-") as tmp:
+            workdir = pathlib.Path(tmp)
+            db = synthetic.write(workdir / "builds.json", self.builds)
+            log_path = workdir / "bot.log"
+            with open(log_path, "w") as log:
+                proc = subprocess.Popen(
+                    [sys.executable, "bot.py"], cwd=ROOT, env=self._env(workdir, db),
+                    stdout=log, stderr=subprocess.STDOUT,
+                )
+            try:
+                started = time.perf_counter()
+                await self._wait_ready(proc, log_path)
+                startup = time.perf_counter() - started
+                print(f"🤖 бот поднялся за {startup:.1f} с, {self.users} пользователей на {self.duration:.0f} с…")
+
+                calls_before = sum(self.api.method_counts.values())
+                rng = random.Random(42)
+                stop_at = time.perf_counter() + self.duration
+                tasks = []
+                for i in range(self.users):
+                    user = User(self, FIRST_USER + i, random.Random(rng.random()))
+                    walk = user.walk_show_all if i < self.users * self.show_all_share else user.walk_view
+                    tasks.append(asyncio.create_task(user.run(walk, stop_at)))
+                load_started = time.perf_counter()
+                await asyncio.gather(*tasks)
+                elapsed = time.perf_counter() - load_started
+            finally:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(20)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                await self.api.stop()
+        return self._report(startup, elapsed, sum(self.api.method_counts.values()) - calls_before)
+
+    def _report(self, startup: float, elapsed: float, api_calls: int) -> dict:
+        def summary(samples: list) -> dict:
+            ordered = sorted(samples)
+            q = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)  # noqa: E731
+            return {"n": len(ordered), "p50_ms": q(0.5), "p95_ms": q(0.95), "p99_ms": q(0.99),
+                    "mean_ms": round(statistics.fmean(ordered), 2)}
+
+        everything = [s for samples in self.samples.values() for s in samples]
+        return {
+            "users": self.users,
+            "builds": self.builds,
+            "duration_s": round(elapsed, 1),
+            "startup_s": round(startup, 1),
+            "steps_per_s": round(len(everything) / elapsed, 1),
+            "walks": self.walks,
+            "api_calls_per_s": round(api_calls / elapsed, 1),
+            "flood_429": dict(self.api.flood_errors),
+            "timeouts": self.timeouts,
+            "all": summary(everything) if everything else None,
+            "steps": {name: summary(samples) for name, samples in self.samples.items()},
+        }
+
+
+def print_report(r: dict):
+    print(f"\n📦 {r['builds']:,} сборок, {r['users']} пользователей, {r['duration_s']} с "
+          f"(старт бота {r['startup_s']} с)")
+    print(f"  шагов в секунду: {r['steps_per_s']}, сценариев пройдено: {r['walks']}, "
+          f"вызовов Bot API в секунду: {r['api_calls_per_s']}")
+    flood = sum(r["flood_429"].values())
+    print(f"  429 Too Many Requests: {flood}" + (f" {r['flood_429']}" if flood else ""))
+    if r["timeouts"]:
+        print(f"  ⚠️ без ответа за таймаут: {r['timeouts']}")
+    print(f"  {'шаг':20} {'n':>6} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}")
+    rows = [*r["steps"].items(), ("всего", r["all"])] if r["all"] else []
+    for name, s in rows:
+        print(f"  {name:20} {s['n']:>6} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест bot.py на поддельном Bot API")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="секунд нагрузки")
+    parser.add_argument("--builds", type=int, default=10_000, help="размер синтетического каталога")
+    parser.add_argument("--pages", type=int, default=5, help="сколько страниц листать в сценарии")
+    parser.add_argument("--think", type=float, default=0.5, help="средняя пауза пользователя между шагами, с")
+    parser.add_argument("--timeout", type=float, default=15, help="сколько ждать ответа на шаг, с")
+    parser.add_argument("--show-all-share", type=float, default=0.5, help="доля пользователей, листающих /show_all")
+    parser.add_argument("--global-rate", type=int, default=30, help="лимит поддельного API на бота, сообщений/с (0 — нет)")
+    parser.add_argument("--chat-rate", type=int, default=0, help="лимит поддельного API на чат, сообщений/с (0 — нет)")
+    parser.add_argument("--save", nargs="?", const=RESULTS, type=pathlib.Path, help=f"записать отчёт (по умолчанию {RESULTS})")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n💾 отчёт записан в {args.save}")
+
+
+if __name__ == "__main__":
+    main()
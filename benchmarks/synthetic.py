@@ -0,0 +1,88 @@
+"""
+Синтетические каталоги сборок для бенчмарков.
+
+Типы берутся из database/types.json, модули и их варианты — из modules-*.json
+(для типов без своего файла — из штурмовых винтовок), так что карточки, переводы
+и клавиатуры строятся по тем же данным, что и в проде. Генерация детерминирована
+(seed), поэтому каталоги одного размера совпадают между запусками.
+
+    python -m benchmarks.synthetic 10000 /tmp/builds-10k.json
+"""
+import json
+import pathlib
+import random
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+DB_DIR = ROOT / "database"
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils.module_catalog import FILE_MAP  # noqa: E402
+
+CATEGORIES = ("Топовая мета", "Мета", "Новинки")
+# Вес категорий: «Мета» — основная масса сборок
+CATEGORY_WEIGHTS = (2, 6, 1)
+AUTHORS = ("NDaimon", "R", "Kuzya", "Shadow", "Lisa", "Medved", "Grom", "Vortex")
+ROLES = ("#1 Дальняя дистанция", "#2 Средняя дистанция", "#3 Ближний бой", "Снайперская поддержка")
+WEAPONS_PER_TYPE = 25
+
+
+def load_module_variants() -> dict:
+    """{тип: {модуль: [en-варианты]}}; для типов без файла — варианты штурмовых."""
+    types = json.loads((DB_DIR / "types.json").read_text(encoding="utf-8"))
+    variants = {}
+    for t in types:
+        fname = FILE_MAP.get(t["key"])
+        path = DB_DIR / fname if fname else None
+        if path is not None and path.exists():
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            variants[t["key"]] = {module: [v["en"] for v in items] for module, items in raw.items() if items}
+    fallback = variants.get("assault") or next(iter(variants.values()))
+    return {t["key"]: variants.get(t["key"], fallback) for t in types}
+
+
+def generate(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    variants = load_module_variants()
+    type_keys = list(variants)
+    weapons = {
+        key: [f"{key.upper()}-{n:02d}" for n in range(1, WEAPONS_PER_TYPE + 1)]
+        for key in type_keys
+    }
+
+    builds = []
+    for build_id in range(1, count + 1):
+        type_key = rng.choice(type_keys)
+        modules = variants[type_key]
+        size = 5 if rng.random() < 0.6 else 8
+        chosen = rng.sample(list(modules), min(size, len(modules)))
+        builds.append({
+            "id": build_id,
+            "weapon_name": rng.choice(weapons[type_key]),
+            "role": rng.choice(ROLES),
+            "category": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            "mode": "Warzone",
+            "type": type_key,
+            "modules": {m: rng.choice(modules[m]) for m in chosen},
+            "image": f"images/synthetic-{build_id}.jpg",
+            "thumb": "",
+            # Картинки в проде уходят по file_id — файлов на диске для бенчмарка не нужно
+            "image_file_id": f"AgACAgIAAxkBAAI{build_id:08d}",
+            "author": rng.choice(AUTHORS),
+        })
+    return builds
+
+
+def write(path: pathlib.Path, count: int, seed: int = 42) -> pathlib.Path:
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(generate(count, seed), ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Использование: python -m benchmarks.synthetic <кол-во> <путь.json>")
+    out = write(pathlib.Path(sys.argv[2]), int(sys.argv[1]))
+    print(f"✅ {sys.argv[1]} сборок → {out} ({out.stat().st_size / 1e6:.1f} МБ)")
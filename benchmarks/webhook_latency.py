@@ -0,0 +1,119 @@
+"""
+Задержка «апдейт → ответ» в режимах polling и webhook.
+
+Бот (настоящий Application с обработчиком /help) ходит в локальный поддельный
+Bot API (benchmarks/fake_bot_api.py). Бенчмарк по одному подаёт апдейты и
+меряет время от подачи до прихода sendMessage.
+
+    python -m benchmarks.webhook_latency -n 300 --save benchmarks/results/webhook_latency.json
+
+Для режима webhook нужен tornado (python-telegram-bot[webhooks]); без него
+режим пропускается.
+"""
+import argparse
+import asyncio
+import json
+import pathlib
+import socket
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from telegram.ext import ApplicationBuilder  # noqa: E402
+
+from benchmarks.fake_bot_api import FakeBotAPI, command_update  # noqa: E402
+from handlers.help import help_handler  # noqa: E402
+
+TOKEN = "123456:BENCHMARK"
+WEBHOOK_SECRET = "bench-secret"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+async def _measure(api: FakeBotAPI, count: int, first_id: int) -> list:
+    samples = []
+    for i in range(count):
+        started = time.perf_counter()
+        await api.push_update(command_update(first_id + i, "/help"))
+        received, _, _ = await asyncio.wait_for(api.replies.get(), 10)
+        samples.append((received - started) * 1000)
+    return samples
+
+
+async def run_mode(mode: str, count: int, warmup: int) -> dict:
+    api = await FakeBotAPI().start()
+    app = ApplicationBuilder().token(TOKEN).base_url(api.base_url).build()
+    app.add_handler(help_handler)
+
+    await app.initialize()
+    try:
+        if mode == "polling":
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+        else:
+            port = _free_port()
+            await app.updater.start_webhook(
+                listen="127.0.0.1", port=port, url_path="telegram",
+                webhook_url=f"http://127.0.0.1:{port}/telegram", secret_token=WEBHOOK_SECRET,
+            )
+        await app.start()
+
+        await _measure(api, warmup, 1)
+        samples = await _measure(api, count, warmup + 1)
+    finally:
+        if app.updater.running:
+            await app.updater.stop()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await api.stop()
+    return _summary(samples)
+
+
+async def main(args):
+    modes = ["polling", "webhook"]
+    try:
+        import tornado  # noqa: F401
+    except ImportError:
+        print("⚠️ tornado не установлен — режим webhook пропущен (pip install 'python-telegram-bot[webhooks]')")
+        modes.remove("webhook")
+
+    results = {}
+    for mode in modes:
+        results[mode] = await run_mode(mode, args.count, args.warmup)
+        r = results[mode]
+        print(f"{mode:8} n={r['count']}  p50={r['p50_ms']:.2f} мс  p95={r['p95_ms']:.2f} мс  "
+              f"mean={r['mean_ms']:.2f} мс  max={r['max_ms']:.2f} мс")
+
+    if args.save:
+        path = pathlib.Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 Сохранено в {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=200, help="сколько апдейтов мерить в каждом режиме")
+    parser.add_argument("--warmup", type=int, default=20, help="сколько апдейтов прогнать до замера")
+    parser.add_argument("--save", help="куда сохранить результаты в JSON")
+    asyncio.run(main(parser.parse_args()))
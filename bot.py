@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import os
+import time
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder
 
@@ -9,9 +10,11 @@ from handlers.help import help_handler
 from handlers.home import home_cmd, home_button
 
 from handlers.show_all import show_all_handler, show_all_callback
+from handlers.inline import inline_handler, ensure_search_index
 
 from handlers.test import test_handler
 from handlers.admin import admin_handlers
+from handlers.subscription import subscription_handlers
 
 # ← Вот здесь поправили путь:
 from conversations.view import view_conv
@@ -20,24 +23,69 @@ from conversations.add import add_conv
 from conversations.delete import delete_conv, stop_delete_callback
 
 from utils.logging_config import configure_logging
-from utils.command_setup import set_commands, clear_all_scopes
+from utils.command_setup import sync_commands
 from utils.keyboards import get_main_menu
+from utils import aio, repository, run_mode
+from utils.images import shutdown_pool
+from utils.module_catalog import catalog
+from utils.persistence import make_persistence
+from utils.rate_limiter import rate_limiter
+from utils.broadcast import broadcaster
+from utils.metrics import metrics, instrument
+from utils.system_info import system_info
 
 load_dotenv(dotenv_path=".env")
 configure_logging()
 TOKEN = os.getenv("BOT_TOKEN")
+BOT_API_URL = os.getenv("BOT_API_URL", "").strip().rstrip("/")
+
+background_tasks = []
+
+async def _phase(phases: dict, name: str, coro):
+    """Выполняет этап запуска и записывает его длительность для итогового отчёта."""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        phases[name] = time.perf_counter() - started
 
 async def on_startup(app):
-    logging.info("Устанавливаю команды…")
-    await clear_all_scopes(app)
-    await set_commands(app)
-    await asyncio.sleep(1)
+    started = time.perf_counter()
+    phases = {}
+    # BOT_DEBUG_BLOCKING=1 — ловим блокирующий ввод-вывод в хэндлерах
+    aio.install_blocking_guard(asyncio.get_running_loop())
+
+    # Поднимаем базу сборок (для json — снапшот + журнал)
+    await _phase(phases, "база", repository.warm_up())
+
+    # Каталог модулей и типов: читаем один раз, дальше следим за файлами в фоне
+    await _phase(phases, "каталог", aio.run(catalog.refresh))
+    background_tasks.append(asyncio.create_task(catalog.watch()))
+    # Метрики в формате Prometheus — в файл для node_exporter
+    background_tasks.append(asyncio.create_task(metrics.export_loop()))
+    # systemctl/git для /status — сразу в фоне, дальше по TTL
+    system_info.refresh_in_background()
+
+    # Индекс инлайн-поиска (@бот запрос) строится в пуле потоков, пока идут
+    # запросы к Bot API за меню команд (отправляются только изменившиеся области)
+    _, commands = await asyncio.gather(
+        _phase(phases, "поиск", ensure_search_index()),
+        _phase(phases, "команды", sync_commands(app)),
+    )
+
+    # Рассылки, прерванные остановкой, продолжаются с сохранённого места
+    await _phase(phases, "рассылки", broadcaster.resume(app.bot))
+
+    logging.info(
+        f"🚀 Запуск за {time.perf_counter() - started:.2f} с: "
+        + ", ".join(f"{name} {sec:.2f} с" for name, sec in phases.items())
+        + f"; команды: {commands}"
+    )
 
     # Если был рестарт — уведомляем пользователя
     flag = "restart_message.txt"
-    if os.path.exists(flag):
-        with open(flag, encoding="utf-8") as f:
-            user_id = int(f.read().strip())
+    if await aio.exists(flag):
+        user_id = int((await aio.read_text(flag)).strip())
         try:
             kb = get_main_menu(user_id)
             await app.bot.send_message(
@@ -48,14 +96,34 @@ async def on_startup(app):
         except Exception:
             logging.exception("Не удалось уведомить после рестарта")
         finally:
-            os.remove(flag)
+            await aio.remove(flag)
+
+async def on_stop(app):
+    # Пока бот ещё может отправлять — останавливаем рассылки и сохраняем прогресс
+    await broadcaster.stop()
+
+async def on_shutdown(app):
+    for task in background_tasks:
+        task.cancel()
+    shutdown_pool()
+    aio.shutdown()
 
-app = (
+builder = (
     ApplicationBuilder()
     .token(TOKEN)
+    # Состояния диалогов и user_data переживают /restart и падения
+    .persistence(make_persistence())
+    # Все исходящие запросы — через лимиты Telegram с очередью по приоритету
+    .rate_limiter(rate_limiter)
     .post_init(on_startup)
-    .build()
+    .post_stop(on_stop)
+    .post_shutdown(on_shutdown)
 )
+if BOT_API_URL:
+    # Свой Bot API сервер (или поддельный из benchmarks/fake_bot_api.py для нагрузочных тестов)
+    builder.base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+    logging.info(f"Bot API: {BOT_API_URL}")
+app = builder.build()
 
 # Регистрируем хэндлеры
 app.add_handler(start_handler)
@@ -64,6 +132,8 @@ app.add_handler(home_cmd)
 app.add_handler(home_button)
 for h in admin_handlers:
     app.add_handler(h)
+for h in subscription_handlers:
+    app.add_handler(h)
 
 # ← тут регистрируем наш переписанный ConversationHandler
 app.add_handler(view_conv)
@@ -77,5 +147,12 @@ app.add_handler(test_handler)
 app.add_handler(show_all_handler)
 app.add_handler(show_all_callback)
 
+# Инлайн-поиск сборок: @бот kastov
+app.add_handler(inline_handler)
+
+# Замер задержек всех хэндлеров выше (/metrics)
+instrument(app)
+
 logging.info("Бот запущен…")
-app.run_polling()
+# polling или вебхук — см. utils/run_mode.py
+run_mode.run(app)
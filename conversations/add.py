@@ -1,5 +1,3 @@
-import os
-import json
 import logging
 import pathlib
 
@@ -20,11 +18,14 @@ from telegram.ext import (
 )
 
 from utils.permissions import admin_only
-from utils.db import load_weapon_types
+from utils.module_catalog import catalog
+from utils import aio, repository
+from utils.media_cache import file_ids
+from utils import images
+from utils.broadcast import broadcaster, BROADCAST_CATEGORIES
 
 HERE = pathlib.Path(__file__).resolve().parent
 ROOT = HERE.parent
-DB_PATH = ROOT / "database" / "builds.json"
 
 # Шаги диалога
 (
@@ -104,72 +105,44 @@ async def get_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data['mode'] = text
     # Загружаем типы оружия для выбора
-    weapon_types = load_weapon_types()
-    if not weapon_types:
+    types = catalog.types()
+    if not types:
         await update.message.reply_text(
             "❌ Нет доступных типов оружия.",
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
 
-    # строим reply-кнопки по 2 в ряд
-    context.user_data['type_map'] = {wt['key']: wt['label'] for wt in weapon_types}
-    labels = list(context.user_data['type_map'].values())
-    buttons = [labels[i:i+2] for i in range(0, len(labels), 2)]
-
+    # reply-кнопки по 2 в ряд — готовые из каталога
     await update.message.reply_text(
         "Выберите тип оружия:",
-        reply_markup=ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        reply_markup=catalog.type_keyboard()
     )
     return TYPE_CHOICE
 
 
 async def get_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     sel = update.message.text.strip()
-    type_map = context.user_data['type_map']
-    key = next((k for k, v in type_map.items() if v == sel), None)
+    key = catalog.type_registry().key_for(sel)
     if not key:
         # повтор выбора
-        buttons = [[v] for v in type_map.values()]
         await update.message.reply_text(
             "❌ Нажмите кнопку с типом оружия.",
-            reply_markup=ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+            reply_markup=catalog.type_keyboard()
         )
         return TYPE_CHOICE
 
     context.user_data['type'] = key
 
-    # Загружаем варианты модулей из соответствующего файла
-    file_map = {
-        "assault":  "modules-assault.json",
-        "battle":   "modules-battle.json",
-        "smg":      "modules-pp.json",
-        "shotgun":  "modules-drobovik.json",
-        "marksman": "modules-pehotnay.json",
-        "lmg":      "modules-pulemet.json",
-        "sniper":   "modules-snayperki.json",
-        "pistol":   "modules-pistolet.json",
-        "special":  "modules-osoboe.json",
-    }
-    fname = file_map.get(key)
-    if not fname:
+    # Варианты модулей — из каталога (он сам перечитывает изменённые файлы)
+    variants = catalog.variants(key)
+    if not variants:
         await update.message.reply_text(
             "❌ Для этого типа модули не настроены.",
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
 
-    try:
-        path = ROOT / "database" / fname
-        variants = json.loads(path.read_text(encoding="utf-8"))
-    except Exception as e:
-        logging.exception("Ошибка загрузки модулей")
-        await update.message.reply_text(
-            f"❌ Ошибка загрузки: {e}",
-            reply_markup=ReplyKeyboardRemove()
-        )
-        return ConversationHandler.END
-
     context.user_data['module_variants'] = variants
     context.user_data['module_options'] = list(variants.keys())
 
@@ -193,10 +166,14 @@ async def get_module_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # показываем reply-кнопки для выбора модулей
     opts = context.user_data['module_options']
-    buttons = [opts[i:i+2] for i in range(0, len(opts), 2)]
+    if catalog.variants(context.user_data['type']) is context.user_data['module_variants']:
+        markup = catalog.module_keyboard(context.user_data['type'])
+    else:
+        # каталог перечитали посреди диалога — строим по данным этого диалога
+        markup = ReplyKeyboardMarkup([opts[i:i+2] for i in range(0, len(opts), 2)], resize_keyboard=True)
     await update.message.reply_text(
         "Выберите модуль (категорию):",
-        reply_markup=ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+        reply_markup=markup
     )
     return MODULE_SELECT
 
@@ -212,10 +189,13 @@ async def select_modules(update: Update, context: ContextTypes.DEFAULT_TYPE):
     variants = context.user_data['module_variants'][module]
 
     # Inline-кнопки для вариантов этого модуля
-    inline = [[InlineKeyboardButton(v['en'], callback_data=v['en'])] for v in variants]
+    if catalog.variants(context.user_data['type']) is context.user_data['module_variants']:
+        markup = catalog.variant_keyboard(context.user_data['type'], module)
+    else:
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton(v['en'], callback_data=v['en'])] for v in variants])
     await update.message.reply_text(
         f"Варианты для «{module}»:",
-        reply_markup=InlineKeyboardMarkup(inline)
+        reply_markup=markup
     )
     return MODULE_SELECT
 
@@ -255,22 +235,38 @@ async def module_variant_callback(update: Update, context: ContextTypes.DEFAULT_
 async def handle_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     file_obj = None
+    # file_id присланного фото: при просмотре картинка уйдёт по нему, без загрузки файла.
+    # Для документа его не сохраняем — Telegram не примет document file_id как фото.
+    photo_file_id = None
     if msg.photo:
         file_obj = await msg.photo[-1].get_file()
+        photo_file_id = msg.photo[-1].file_id
     elif msg.document and msg.document.mime_type.startswith("image/"):
         file_obj = await msg.document.get_file()
     else:
         await msg.reply_text("❌ Отправьте фото или скриншот.")
         return IMAGE_UPLOAD
 
-    os.makedirs(ROOT / "images", exist_ok=True)
-    img_name = f"{context.user_data['weapon'].replace(' ', '_')}.jpg"
-    img_path = ROOT / "images" / img_name
-    await file_obj.download_to_drive(str(img_path))
-    context.user_data['image'] = str(img_path)
+    # Качаем в память и нормализуем в пуле процессов: JPEG ограниченного размера,
+    # миниатюра, без метаданных, имя файла — хэш содержимого
+    raw = await file_obj.download_as_bytearray()
+    try:
+        result = await images.process_upload(raw)
+    except Exception:
+        logging.exception("[ADD] Image processing failed")
+        await msg.reply_text("❌ Не удалось обработать изображение. Отправьте другое.")
+        return IMAGE_UPLOAD
+
+    context.user_data['image'] = result["image"]
+    context.user_data['thumb'] = result["thumb"]
+    context.user_data['image_file_id'] = photo_file_id
+    if photo_file_id:
+        await aio.run(file_ids.put, result["image"], photo_file_id)
 
+    saved_kb = result["bytes_saved"] // 1024
     await msg.reply_text(
-        "✅ Изображение получено. Нажмите «Завершить»:",
+        (f"🗜 Сжато на {saved_kb} КБ.\n" if saved_kb > 0 else "")
+        + "✅ Изображение получено. Нажмите «Завершить»:",
         reply_markup=ReplyKeyboardMarkup([["Завершить"]], resize_keyboard=True)
     )
     return CONFIRMATION
@@ -285,22 +281,32 @@ async def confirm_build(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "type":        context.user_data.get('type', ''),
         "modules":     context.user_data.get('detailed_modules', {}),
         "image":       context.user_data.get('image', ''),
+        "thumb":       context.user_data.get('thumb', ''),
+        "image_file_id": context.user_data.get('image_file_id'),
         "author":      update.effective_user.full_name
     }
     logging.info("[ADD] New build: %r", new_build)
 
     try:
-        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        data = json.loads(DB_PATH.read_text(encoding="utf-8")) if DB_PATH.exists() else []
-        data.append(new_build)
-        DB_PATH.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        build_id = await repository.add(new_build)
     except Exception:
         logging.exception("[ADD] Save failed")
         await update.message.reply_text("❌ Ошибка сохранения.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
+    logging.info("[ADD] Saved as #%s", build_id)
+
+    notice = ""
+    if new_build["category"] in BROADCAST_CATEGORIES:
+        # Сборка уже сохранена — сбой рассылки не должен выглядеть как ошибка добавления
+        try:
+            job = await broadcaster.start(context.bot, build_id)
+            notice = f"\n📣 Рассылка подписчикам запущена ({job['total']})."
+        except Exception:
+            logging.exception("[ADD] Broadcast start failed for #%s", build_id)
+            notice = "\n⚠️ Рассылку запустить не удалось."
 
     await update.message.reply_text(
-        "✅ Сборка добавлена! Что дальше?",
+        "✅ Сборка добавлена!" + notice + " Что дальше?",
         reply_markup=ReplyKeyboardMarkup([["➕ Добавить ещё"], ["◀ Отмена"]], resize_keyboard=True)
     )
     return POST_CONFIRM
@@ -335,6 +341,8 @@ add_conv = ConversationHandler(
         ],
     },
     fallbacks=[CommandHandler("cancel", cancel)],
+    name="add_conv",
+    persistent=True,
 )
 
 __all__ = ["add_conv"]
@@ -1,109 +1,254 @@
-import os
-import json
+import hashlib
+import html
+
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import BadRequest
 from telegram.ext import (
     CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler,
     ContextTypes, filters
 )
 from utils.permissions import ALLOWED_USERS
 from utils.translators import load_translation_dict
+from utils.module_catalog import catalog
+from utils import repository
 
-DB_PATH = "database/builds.json"
 DELETE_ENTER_ID, DELETE_CONFIRM_SIMPLE = range(130, 132)
 
+PAGE_SIZE = 8
+
+# Фильтры браузера: измерение → подпись кнопки
+FILTERS = {
+    "category": "📁 Категория",
+    "type":     "🔫 Тип",
+    "author":   "👤 Автор",
+}
+
+
+def _cursor(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    """
+    Состояние браузера у админа — только курсор: фильтры и номер страницы.
+    Сами сборки каждый раз берутся из индекса хранилища.
+    """
+    return context.user_data.setdefault(
+        "delete_cursor", {"category": None, "type": None, "author": None, "page": 0}
+    )
+
+
+def _filter_label(dim: str, value: str) -> str:
+    return catalog.type_label(value) if dim == "type" else value
+
+
+async def render_browser(cursor: dict, notice: str = ""):
+    """Текст и клавиатура текущей страницы браузера удаления."""
+    page = cursor["page"]
+    builds, total = await repository.browse(
+        cursor["category"], cursor["type"], cursor["author"], page * PAGE_SIZE, PAGE_SIZE
+    )
+    if not builds and page > 0:
+        # Страница опустела (удалили последние сборки) — откатываемся на последнюю
+        cursor["page"] = page = max(0, (total - 1) // PAGE_SIZE)
+        builds, total = await repository.browse(
+            cursor["category"], cursor["type"], cursor["author"], page * PAGE_SIZE, PAGE_SIZE
+        )
+    pages = max(1, -(-total // PAGE_SIZE))
+
+    lines = [notice] if notice else []
+    lines.append(f"🧾 <b>Сборки для удаления</b> (<code>{total}</code>)")
+    active = [
+        f"{FILTERS[dim]}: <b>{html.escape(_filter_label(dim, cursor[dim]))}</b>"
+        for dim in FILTERS if cursor[dim] is not None
+    ]
+    if active:
+        lines.append(" · ".join(active))
+    lines.append("")
+    if not builds:
+        lines.append("❌ Нет сборок для удаления.")
+    for b in builds:
+        lines.append(
+            f"<code>#{b['id']}</code> <b>{html.escape(b.get('weapon_name', '—'))}</b> · "
+            f"{html.escape(catalog.type_label(b.get('type', '')))} · "
+            f"{html.escape(b.get('category', '—'))} · {html.escape(b.get('author', '—'))}"
+        )
+    if builds:
+        lines.append("")
+        lines.append(f"Нажмите на сборку или введите её ID (например: {builds[0]['id']})")
+
+    rows = [
+        [InlineKeyboardButton(f"🗑 #{b['id']} {b.get('weapon_name', '—')}", callback_data=f"del|ask|{b['id']}")]
+        for b in builds
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅", callback_data=f"del|page|{page - 1}"))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="del|noop"))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton("➡", callback_data=f"del|page|{page + 1}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(lbl, callback_data=f"del|filter|{dim}") for dim, lbl in FILTERS.items()])
+    last = [InlineKeyboardButton("🚪 Выйти из удаления", callback_data="stop_delete")]
+    if active:
+        last.insert(0, InlineKeyboardButton("♻ Сбросить фильтры", callback_data="del|reset"))
+    rows.append(last)
+
+    return "\n".join(lines), InlineKeyboardMarkup(rows)
+
+
+async def _filter_options(dim: str) -> list:
+    """Значения фильтра с количеством сборок: [(значение, кол-во)]."""
+    facets = await repository.browse_facets()
+    return list(facets.get(dim, {}).items())
+
+
+def _value_token(value: str) -> str:
+    """
+    Короткий хэш значения фильтра для callback_data: не зависит от порядка
+    значений (каталог мог измениться между показом и нажатием) и укладывается
+    в 64 байта даже для длинных имён авторов.
+    """
+    return hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:10]
+
 
 async def delete_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ALLOWED_USERS:
         await update.message.reply_text("⛔ У вас нет доступа к этой команде.")
         return ConversationHandler.END
 
-    if not os.path.exists(DB_PATH):
-        await update.message.reply_text("❌ База сборок пуста.")
-        return ConversationHandler.END
+    cursor = _cursor(context)
+    cursor["page"] = 0
+    context.user_data.pop("delete_map", None)  # старый формат: полная копия базы
 
-    with open(DB_PATH, 'r') as f:
-        data = json.load(f)
+    text, markup = await render_browser(cursor)
+    await update.effective_message.reply_text(text, parse_mode="HTML", reply_markup=markup)
+    return DELETE_ENTER_ID
 
-    if not data:
-        await update.message.reply_text("❌ Нет сборок для удаления.")
-        return ConversationHandler.END
 
-    context.user_data['delete_map'] = {}
-    text_lines = ["🧾 Сборки для удаления:"]
+async def browser_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    cursor = _cursor(context)
+    _, action, *args = query.data.split("|")
+
+    if action == "noop":
+        # Индикатор «2/5» — только подпись
+        return DELETE_ENTER_ID
+    if action == "page":
+        cursor["page"] = max(0, int(args[0]))
+    elif action == "reset":
+        cursor.update(category=None, type=None, author=None, page=0)
+    elif action == "filter":
+        dim = args[0]
+        options = await _filter_options(dim)
+        rows = [[InlineKeyboardButton("Все", callback_data=f"del|set|{dim}|-")]]
+        rows += [
+            [InlineKeyboardButton(f"{_filter_label(dim, value)} ({count})", callback_data=f"del|set|{dim}|{_value_token(value)}")]
+            for value, count in options
+        ]
+        rows.append([InlineKeyboardButton("⬅ Назад", callback_data=f"del|page|{cursor['page']}")])
+        await query.edit_message_text(f"Фильтр — {FILTERS[dim]}:", reply_markup=InlineKeyboardMarkup(rows))
+        return DELETE_ENTER_ID
+    elif action == "set":
+        dim, token = args
+        if token == "-":
+            cursor[dim] = None
+        else:
+            # Значения, которого уже нет среди сборок, фильтр не меняет
+            for value, _ in await _filter_options(dim):
+                if _value_token(value) == token:
+                    cursor[dim] = value
+                    break
+        cursor["page"] = 0
+    elif action == "ask":
+        return await ask_confirm(query.message, context, int(args[0]), edit=True)
+
+    text, markup = await render_browser(cursor)
+    try:
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=markup)
+    except BadRequest as e:
+        # Фильтр или «Назад» ничего не поменяли — сообщение уже такое
+        if "not modified" not in str(e).lower():
+            raise
+    return DELETE_ENTER_ID
 
-    for idx, b in enumerate(data, start=1):
-        context.user_data['delete_map'][str(idx)] = b
-        translation = load_translation_dict(b.get("type", ""))
-        modules = "\n".join(f"🔸 {k}: {translation.get(v, v)}" for k, v in b.get("modules", {}).items())
-        text_lines.append(
-            f"{b['weapon_name']} (ID {idx})\nТип: {b['type']}\n\nМодулей: {len(b['modules'])}\n{modules}\n\nАвтор: {b['author']}"
-        )
 
-    message = "\n\n".join(text_lines)
-    keyboard = InlineKeyboardMarkup.from_button(InlineKeyboardButton("🚪 Выйти из удаления", callback_data="stop_delete"))
+async def ask_confirm(message, context: ContextTypes.DEFAULT_TYPE, build_id: int, edit: bool):
+    b = await repository.get_build(build_id)
+    if not b:
+        await message.reply_text("❌ Неверный ID. Попробуйте снова.")
+        return DELETE_ENTER_ID
 
-    await update.message.reply_text(
-        message + "\n\nВведите ID сборки для удаления (например: 1)",
-        parse_mode="HTML",
-        reply_markup=keyboard
+    translation = load_translation_dict(b.get("type", ""))
+    modules = "\n".join(
+        f"🔸 {html.escape(k)}: {html.escape(translation.get(v, v))}" for k, v in b.get("modules", {}).items()
     )
-    return DELETE_ENTER_ID
+    text = (
+        f"❗ Вы уверены, что хотите удалить сборку <b>{html.escape(b['weapon_name'])}</b> (ID: {b['id']})?\n\n"
+        f"Тип: {html.escape(catalog.type_label(b.get('type', '')))}\n"
+        f"Модулей: {len(b.get('modules', {}))}\n{modules}\n\n"
+        f"Автор: {html.escape(b.get('author', '—'))}"
+    )
+    markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton("Да", callback_data=f"confirm_delete|{b['id']}"),
+        InlineKeyboardButton("⬅ Назад", callback_data=f"del|page|{_cursor(context)['page']}"),
+    ]])
+    if edit:
+        await message.edit_text(text, parse_mode="HTML", reply_markup=markup)
+    else:
+        await message.reply_text(text, parse_mode="HTML", reply_markup=markup)
+    return DELETE_CONFIRM_SIMPLE
 
 
 async def stop_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     await update.callback_query.message.edit_text("🚫 Вы вышли из режима удаления.")
+    context.user_data.pop("delete_cursor", None)
     return ConversationHandler.END
 
 
 async def delete_enter_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    build_id = update.message.text.strip()
-    if build_id not in context.user_data.get('delete_map', {}):
+    text = update.message.text.strip().lstrip("#")
+    if not text.isdigit():
         await update.message.reply_text("❌ Неверный ID. Попробуйте снова.")
         return DELETE_ENTER_ID
-
-    context.user_data['delete_id'] = build_id
-    b = context.user_data['delete_map'][build_id]
-
-    await update.message.reply_text(
-        f"❗ Вы уверены, что хотите удалить сборку {b['weapon_name']} (ID: {build_id})?",
-        reply_markup=InlineKeyboardMarkup.from_button(
-            InlineKeyboardButton("Да", callback_data="confirm_delete")
-        )
-    )
-    return DELETE_CONFIRM_SIMPLE
+    return await ask_confirm(update.message, context, int(text), edit=False)
 
 
 async def delete_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    build_id = context.user_data.get('delete_id')
-    if not build_id or build_id not in context.user_data.get('delete_map', {}):
-        await update.message.reply_text("❌ Ошибка ID. Возврат к списку.")
-        return await delete_start(update, context)
+    query = update.callback_query
+    await query.answer()
 
-    to_delete = context.user_data['delete_map'][build_id]
-    with open(DB_PATH, 'r') as f:
-        data = json.load(f)
+    _, id_s = query.data.split("|", 1)
+    if await repository.remove(int(id_s)):
+        notice = f"✅ Сборка #{id_s} удалена."
+    else:
+        notice = "❌ Сборка уже удалена. Возврат к списку."
 
-    new_data = [b for b in data if b != to_delete]
-    with open(DB_PATH, 'w') as f:
-        json.dump(new_data, f, indent=2)
+    text, markup = await render_browser(_cursor(context), notice)
+    await query.message.edit_text(text, parse_mode="HTML", reply_markup=markup)
+    return DELETE_ENTER_ID
 
-    await update.callback_query.answer()
-    await update.callback_query.message.edit_text("✅ Сборка удалена.")
-    return await delete_start(update, context)
 
+browser_handlers = [
+    CallbackQueryHandler(browser_callback, pattern="^del\\|"),
+    CallbackQueryHandler(delete_confirm, pattern="^confirm_delete\\|"),
+]
 
 delete_conv = ConversationHandler(
     entry_points=[CommandHandler("delete", delete_start)],
     states={
         DELETE_ENTER_ID: [
             MessageHandler(filters.TEXT & ~filters.COMMAND, delete_enter_id),
+            *browser_handlers,
         ],
         DELETE_CONFIRM_SIMPLE: [
-            CallbackQueryHandler(delete_confirm, pattern="^confirm_delete$")
+            *browser_handlers,
+            MessageHandler(filters.TEXT & ~filters.COMMAND, delete_enter_id),
         ],
     },
     fallbacks=[],
+    name="delete_conv",
+    persistent=True,
 )
 
 stop_delete_callback = CallbackQueryHandler(stop_delete_callback, pattern="^stop_delete$")
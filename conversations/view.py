@@ -1,5 +1,4 @@
 import logging
-import pathlib
 
 from telegram import (
     Update,
@@ -8,6 +7,7 @@ from telegram import (
     InputMediaPhoto,
     ReplyKeyboardRemove,
 )
+from telegram.error import BadRequest
 from telegram.ext import (
     ConversationHandler,
     CallbackQueryHandler,
@@ -17,13 +17,19 @@ from telegram.ext import (
     filters,
 )
 
-from utils.db import load_db, load_weapon_types, get_type_label_by_key
-from utils.translators import load_translation_dict
+from utils.captions import build_caption
+from utils.module_catalog import catalog
+from utils import aio, repository
 from utils.permissions import admin_only
+from utils.media_cache import file_ids
+from utils.render_cache import render_cache, render_key
 
 # состояния
 VIEW_CATEGORY_SELECT, VIEW_WEAPON, VIEW_SET_COUNT, VIEW_DISPLAY = range(4)
 
+# Так Telegram отвечает на file_id, который больше не принимает
+FILE_ID_ERRORS = ("wrong file identifier", "file_id", "wrong remote file")
+
 # категории
 RAW_CATEGORIES = {
     "Топовая мета": "🔥 Топовая мета",
@@ -32,6 +38,50 @@ RAW_CATEGORIES = {
 }
 
 
+async def send_build_card(query, build: dict, caption: str, markup: InlineKeyboardMarkup):
+    """
+    Показывает карточку сборки в том же сообщении.
+    Картинку берём по file_id (без повторной загрузки): сначала сохранённый
+    при добавлении, затем из кэша; файл с диска отправляется только один раз.
+    """
+    img = build.get("image")
+    file_id = build.get("image_file_id") or (await aio.run(file_ids.get, img) if img else None)
+    stale_stored_id = False
+
+    if file_id:
+        try:
+            media = InputMediaPhoto(file_id, caption=caption, parse_mode="HTML")
+            await query.edit_message_media(media=media, reply_markup=markup)
+            return
+        except BadRequest as e:
+            error = str(e).lower()
+            if "not modified" in error:
+                return
+            # Ошибки подписи/разметки не про картинку — file_id в них не виноват
+            if not any(marker in error for marker in FILE_ID_ERRORS):
+                raise
+            # file_id протух (например, сменили токен) — загрузим файл заново
+            logging.warning(f"⚠️ file_id не принят Telegram, загружаю файл: {e}")
+            if img:
+                await aio.run(file_ids.forget, img)
+            stale_stored_id = file_id == build.get("image_file_id")
+
+    new_file_id = None
+    if img and await aio.exists(img):
+        data = await aio.read_bytes(img)
+        media = InputMediaPhoto(data, caption=caption, parse_mode="HTML")
+        msg = await query.edit_message_media(media=media, reply_markup=markup)
+        if getattr(msg, "photo", None):
+            new_file_id = msg.photo[-1].file_id
+            await aio.run(file_ids.put, img, new_file_id)
+    else:
+        await query.edit_message_text(caption, reply_markup=markup, parse_mode="HTML")
+
+    if stale_stored_id:
+        # Иначе протухший file_id из базы пробовали бы при каждом показе
+        await repository.update(build["id"], {"image_file_id": new_file_id})
+
+
 @admin_only
 async def view_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Убираем старую Reply-клавиатуру
@@ -61,18 +111,13 @@ async def on_category_selected(update: Update, context: ContextTypes.DEFAULT_TYP
     context.user_data["selected_category"] = category
 
     # Формируем список типов
-    data = load_db()
-    type_keys = sorted({
-        b["type"] for b in data
-        if b.get("mode", "").lower() == "warzone" and b.get("category") == category
-    })
+    type_keys = await repository.list_types(category)
     if not type_keys:
         return await query.edit_message_text("⚠️ Нет сборок в этой категории.")
 
     # Генерим кнопки типов + «назад к категориям»
-    key2lbl = {wt["key"]: wt["label"] for wt in load_weapon_types()}
     buttons = [
-        [InlineKeyboardButton(key2lbl.get(k, k), callback_data=f"type|{k}")]
+        [InlineKeyboardButton(catalog.type_label(k), callback_data=f"type|{k}")]
         for k in type_keys
     ]
     buttons.append([InlineKeyboardButton("⬅ Назад к категориям", callback_data="restart")])
@@ -94,10 +139,7 @@ async def on_type_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     category = context.user_data["selected_category"]
 
     # Формируем список оружия
-    weapon_list = sorted({
-        b["weapon_name"] for b in load_db()
-        if b["type"] == type_key and b.get("category") == category
-    })
+    weapon_list = await repository.list_weapons(category, type_key)
     if not weapon_list:
         return await query.edit_message_text("⚠️ По этому типу нет оружия.")
 
@@ -114,7 +156,7 @@ async def on_type_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await query.edit_message_text(
         f"📁 <b>Категория:</b> {RAW_CATEGORIES[category]}\n"
-        f"🔫 <b>Тип:</b> {get_type_label_by_key(type_key)}\n\n"
+        f"🔫 <b>Тип:</b> {catalog.type_label(type_key)}\n\n"
         "➡ Выберите оружие:",
         reply_markup=InlineKeyboardMarkup(buttons),
         parse_mode="HTML"
@@ -133,21 +175,9 @@ async def on_weapon_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     type_key = context.user_data["selected_type"]
 
     # Считаем сборки с 5 и с 8 модулями
-    data = load_db()
-    c5 = sum(
-        1 for b in data
-        if b["weapon_name"] == weapon
-           and b["type"] == type_key
-           and len(b["modules"]) == 5
-           and b.get("category") == category
-    )
-    c8 = sum(
-        1 for b in data
-        if b["weapon_name"] == weapon
-           and b["type"] == type_key
-           and len(b["modules"]) == 8
-           and b.get("category") == category
-    )
+    counts = await repository.module_counts(category, type_key, weapon)
+    c5 = counts.get(5, 0)
+    c8 = counts.get(8, 0)
 
     # Кнопки выбора количества + «назад к оружию» + «назад к категориям»
     row = [
@@ -161,7 +191,7 @@ async def on_weapon_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     await query.edit_message_text(
         f"📁 <b>Категория:</b> {RAW_CATEGORIES[category]}\n"
-        f"🔫 <b>Тип:</b> {get_type_label_by_key(type_key)}\n"
+        f"🔫 <b>Тип:</b> {catalog.type_label(type_key)}\n"
         f"⚔️ <b>Оружие:</b> {weapon}\n\n"
         "➡ Выберите количество модулей:",
         reply_markup=InlineKeyboardMarkup([row, back_row]),
@@ -174,46 +204,35 @@ async def on_view_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    _, count_s, idx_s = query.data.split("|")
-    count, idx = int(count_s), int(idx_s)
+    # view|<кол-во модулей>|<id сборки>; id=0 — первая сборка
+    _, count_s, id_s = query.data.split("|")
+    count, build_id = int(count_s), int(id_s)
 
     category = context.user_data["selected_category"]
     type_key = context.user_data["selected_type"]
     weapon = context.user_data["selected_weapon"]
 
-    filtered = [
-        b for b in load_db()
-        if b["type"] == type_key
-           and b["weapon_name"] == weapon
-           and len(b["modules"]) == count
-           and b.get("category") == category
-    ]
-    if not filtered:
+    build, prev_id, next_id, total = await repository.view_build(category, type_key, weapon, count, build_id)
+    if not build:
         return await query.edit_message_text("⚠️ Сборок с таким количеством нет.")
 
-    idx %= len(filtered)
-    build = filtered[idx]
+    # Готовая карточка зависит от сборки, переводов и соседей в листалке
+    key = render_key(build, ("view", count, prev_id, next_id, total > 1))
+    cached = render_cache.get(key)
+    if cached is not None:
+        caption, markup = cached
+        await send_build_card(query, build, caption, markup)
+        return VIEW_DISPLAY
 
     # Собираем текст сборки
-    tr = load_translation_dict(type_key)
-    mods = "\n".join(f"├ {k}: {tr.get(v, v)}" for k, v in build["modules"].items())
-
-    caption = (
-        f"📌 <b>Оружие:</b> {build['weapon_name']}\n"
-        f"🎯 <b>Роль:</b> {build.get('role','-')}\n"
-        f"🔫 <b>Тип:</b> {get_type_label_by_key(type_key)}\n\n"
-        f"🧩 <b>Модули ({count}):</b>\n{mods}\n\n"
-        f"✍ <b>Автор:</b> {build['author']}"
-    )
+    caption = build_caption(build)
 
     # Кнопки «пред/след»
     nav1 = []
-    if len(filtered) > 1:
-        prev_idx = (idx - 1) % len(filtered)
-        next_idx = (idx + 1) % len(filtered)
+    if total > 1:
         nav1 = [
-            InlineKeyboardButton("⬅ Предыдущая", callback_data=f"view|{count}|{prev_idx}"),
-            InlineKeyboardButton("Следующая ➡",  callback_data=f"view|{count}|{next_idx}"),
+            InlineKeyboardButton("⬅ Предыдущая", callback_data=f"view|{count}|{prev_id}"),
+            InlineKeyboardButton("Следующая ➡",  callback_data=f"view|{count}|{next_id}"),
         ]
 
     # Кнопки возврата
@@ -223,14 +242,9 @@ async def on_view_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
 
     markup = InlineKeyboardMarkup([nav1, nav2])
+    render_cache.put(key, (caption, markup))
 
-    img = build.get("image")
-    if img and pathlib.Path(img).exists():
-        media = InputMediaPhoto(open(img, "rb"), caption=caption, parse_mode="HTML")
-        await query.edit_message_media(media=media, reply_markup=markup)
-    else:
-        await query.edit_message_text(caption, reply_markup=markup, parse_mode="HTML")
-
+    await send_build_card(query, build, caption, markup)
     return VIEW_DISPLAY
 
 
@@ -297,6 +311,8 @@ view_conv = ConversationHandler(
             "❌ Отменено.", reply_markup=None
         )),
     ],
+    name="view_conv",
+    persistent=True,
 )
 
 __all__ = ["view_conv"]
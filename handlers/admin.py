@@ -1,72 +1,75 @@
+import html
 import os
-import json
 import logging
 import asyncio
-from collections import Counter
+import re
+import time
 from datetime import datetime
 
-from telegram import Update
-from telegram.ext import CommandHandler, ContextTypes
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
 
-from utils.permissions import admin_only
+from utils.permissions import admin_only, ALLOWED_USERS
+from utils.logging_config import log_buffer, shutdown_logging
 from utils.keyboards import get_main_menu
-
-DB_PATH = "database/builds.json"
-ADMIN_ID = int(os.getenv("ADMIN_ID"))
+from utils import aio, repository
+from utils.render_cache import render_cache
+from utils.module_catalog import catalog
+from utils.rate_limiter import rate_limiter
+from utils.broadcast import broadcaster
+from utils.subscribers import subscribers
+from utils.metrics import metrics
+from utils.system_info import system_info
 
 
 @admin_only
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Проверяем БД
-    if not os.path.exists(DB_PATH):
-        await update.message.reply_text("❌ База данных отсутствует.")
-        return
-
+    # Статистика ведётся хранилищем на лету, systemctl/git — из кэша (обновляется в фоне)
     try:
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        summary = await repository.summary()
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при чтении БД: {e}")
         return
-
-    # Проверяем статус сервиса
-    try:
-        proc = await asyncio.create_subprocess_exec(
-            "/usr/bin/systemctl", "is-active", "ndsborki.service",
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        out, err = await proc.communicate()
-        service_status = (out or err).decode().strip()
-    except Exception as e:
-        service_status = f"⚠️ Ошибка при проверке systemd: {e}"
-
-    # Считаем статистику
-    total = len(data)
-    authors = Counter(b.get("author", "—") for b in data)
-    categories = Counter(b.get("category", "—") for b in data)
-
-    # Информация о последнем коммите
-    last_commit_time = "—"
-    last_commit_files = []
-    try:
-        proc2 = await asyncio.create_subprocess_exec(
-            "git", "log", "-1", "--format=%ci", "--name-only",
-            cwd=os.getcwd(),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        out2, err2 = await proc2.communicate()
-        lines = (out2 or err2).decode().splitlines()
-        if lines:
-            last_commit_time = lines[0].strip()
-            last_commit_files = [ln for ln in lines[1:] if ln.strip()]
-    except Exception:
-        logging.exception("Не удалось получить данные о последнем коммите")
+    info = system_info.snapshot()
+    total = summary["total"]
+    authors = summary["authors"]
+    categories = summary["categories"]
+    service_status = info["service"]
+    last_commit_time = info["commit_time"]
+    last_commit_files = info["commit_files"]
 
     # Формируем сообщение
+    db_stats = repository.stats()
     msg = [
         f"🖥 <b>Состояние сервиса:</b> <code>{service_status}</code>",
         f"📦 <b>Всего сборок:</b> <code>{total}</code>",
+        f"🗃 <b>Хранилище:</b> <code>{db_stats['backend']}</code>",
+    ]
+    if "hits" in db_stats:
+        msg.append(
+            f"♻️ <b>Кэш БД:</b> попаданий <code>{db_stats['hits']}</code>, "
+            f"перезагрузок <code>{db_stats['reloads']}</code>, записей <code>{db_stats['writes']}</code>"
+        )
+    rc = render_cache.stats()
+    msg.append(
+        f"🖼 <b>Кэш карточек:</b> <code>{rc['size']}/{rc['maxsize']}</code>, "
+        f"попаданий <code>{rc['hit_ratio']:.0%}</code>"
+    )
+    rl = rate_limiter.stats()
+    msg.append(
+        f"🚦 <b>Очередь Bot API:</b> ждут <code>{rl['queued']}</code>, "
+        f"p95 ожидания <code>{rl['waits']['interactive']['p95_ms']:.0f}/{rl['waits']['normal']['p95_ms']:.0f}/"
+        f"{rl['waits']['bulk']['p95_ms']:.0f} мс</code>, 429: <code>{rl['retry_after']}</code>"
+    )
+    msg.append(f"🔔 <b>Подписчиков:</b> <code>{await aio.run(subscribers.count)}</code>")
+    for job in broadcaster.stats():
+        msg.append(
+            f"📣 <b>Рассылка #{job['id']}</b> (сборка #{job['build_id']}): "
+            f"<code>{job['sent']}/{job['total']}</code>, заблокировали <code>{job['blocked']}</code>, "
+            f"ошибок <code>{job['failed']}</code>"
+        )
+    msg += [
         "",
         f"🕑 <b>Последний коммит:</b> <code>{last_commit_time}</code>"
     ]
@@ -76,58 +79,173 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     msg.append("")
     msg.append("👥 <b>Авторы:</b>")
-    msg.extend(f"• <b>{name}</b> — <code>{count}</code>"
-               for name, count in authors.most_common())
+    msg.extend(f"• <b>{html.escape(str(name))}</b> — <code>{count}</code>"
+               for name, count in authors.items())
 
     if categories:
         msg.append("")
         msg.append("📂 <b>Категории сборок:</b>")
-        msg.extend(f"• <b>{cat}</b> — <code>{count}</code>"
+        msg.extend(f"• <b>{html.escape(str(cat))}</b> — <code>{count}</code>"
                    for cat, count in categories.items())
 
+    if summary["types"]:
+        msg.append("")
+        msg.append("🔫 <b>Типы оружия:</b>")
+        msg.extend(f"• <b>{html.escape(catalog.type_label(key))}</b> — <code>{count}</code>"
+                   for key, count in summary["types"].items())
+
+    if summary["module_counts"]:
+        msg.append("")
+        msg.append("🧩 <b>По числу модулей:</b> " + ", ".join(
+            f"{size} — <code>{count}</code>" for size, count in summary["module_counts"].items()
+        ))
+
     await update.message.reply_text("\n".join(msg), parse_mode="HTML")
 
 
+LOG_LEVELS = {
+    "debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "warn": logging.WARNING,
+    "error": logging.ERROR, "critical": logging.CRITICAL,
+}
+# Запас до лимита Telegram в 4096 символов под заголовок и разметку
+LOG_PAGE_CHARS = 3500
+_PERIOD = re.compile(r"^(\d+)([smhd]?)$")
+_PERIOD_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "": 60}
+LOG_USAGE = (
+    "Использование: <code>/log [уровень] [logger=имя] [handler=имя] [период]</code>\n"
+    "уровень — debug/info/warning/error/critical (и выше), период — 30m, 2h, 1d\n"
+    "Например: <code>/log error 2h</code>, <code>/log handler=view_conv 15m</code>"
+)
+
+
+def _parse_log_filter(args: list):
+    """Аргументы /log → фильтр (словарь, хранится в user_data для листания) или None."""
+    spec = {"level": None, "logger": None, "handler": None, "period": None}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        key = key.lower()
+        if sep and key in ("logger", "handler", "level") and value:
+            spec[key] = value
+        elif not sep and key in LOG_LEVELS:
+            spec["level"] = key
+        elif not sep and _PERIOD.match(key):
+            spec["period"] = key
+        else:
+            return None
+    if spec["level"] is not None and spec["level"].lower() not in LOG_LEVELS:
+        return None
+    spec["until"] = time.time()
+    return spec
+
+
+def _query_logs(spec: dict) -> list:
+    since = None
+    if spec["period"]:
+        amount, unit = _PERIOD.match(spec["period"]).groups()
+        since = spec["until"] - int(amount) * _PERIOD_SECONDS[unit]
+    return log_buffer.query(
+        level=LOG_LEVELS[spec["level"].lower()] if spec["level"] else logging.NOTSET,
+        logger=spec["logger"], handler=spec["handler"], since=since, until=spec["until"],
+    )
+
+
+def _log_pages(entries: list) -> list:
+    """Делит записи (от новых к старым) на страницы не длиннее LOG_PAGE_CHARS после экранирования."""
+    pages, page, size = [], [], 0
+    for e in entries:
+        stamp = datetime.fromtimestamp(e["time"]).strftime("%d.%m %H:%M:%S")
+        where = f"{e['logger']} [{e['handler']}]" if e["handler"] else e["logger"]
+        line = html.escape(f"{stamp} {e['level'][:4]} {where}: {e['message']}")
+        if len(line) > LOG_PAGE_CHARS:
+            line = line[:LOG_PAGE_CHARS - 1] + "…"
+        if page and size + len(line) + 1 > LOG_PAGE_CHARS:
+            pages.append(page)
+            page, size = [], 0
+        page.append(line)
+        size += len(line) + 1
+    if page:
+        pages.append(page)
+    return pages
+
+
+def _render_log_page(spec: dict, page: int):
+    """(текст, клавиатура) страницы page (0 — самые свежие записи)."""
+    entries = _query_logs(spec)
+    pages = _log_pages(entries)
+    filters_text = " ".join(
+        f"{k}={spec[k]}" if k in ("logger", "handler") else spec[k]
+        for k in ("level", "logger", "handler", "period") if spec[k]
+    ) or "все записи"
+    stats = log_buffer.stats()
+    if not pages:
+        text = (
+            f"🪵 <b>Логи</b> ({html.escape(filters_text)}): ничего не найдено.\n"
+            f"В буфере <code>{stats['size']}/{stats['capacity']}</code> последних записей."
+        )
+        return text, InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Обновить", callback_data="log|refresh")]])
+    page = max(0, min(page, len(pages) - 1))
+    text = (
+        f"🪵 <b>Логи</b> ({html.escape(filters_text)}): записей <code>{len(entries)}</code>, "
+        f"страница <code>{page + 1}/{len(pages)}</code>\n"
+        # Внутри страницы — по времени, как в файле лога
+        f"<pre>{chr(10).join(reversed(pages[page]))}</pre>"
+    )
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅ Новее", callback_data=f"log|{page - 1}"))
+    if page + 1 < len(pages):
+        nav.append(InlineKeyboardButton("Старее ➡", callback_data=f"log|{page + 1}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton("🔄 Обновить", callback_data="log|refresh")])
+    return text, InlineKeyboardMarkup(rows)
+
+
 @admin_only
 async def get_logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        proc = await asyncio.create_subprocess_exec(
-            "journalctl", "-u", "ndsborki.service", "-n", "30", "--no-pager",
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        out, err = await proc.communicate()
-        logs = (out or err).decode().strip() or "⚠️ Логи пусты или недоступны."
+    spec = _parse_log_filter(context.args or [])
+    if spec is None:
+        await update.message.reply_text(LOG_USAGE, parse_mode="HTML")
+        return
+    # Фильтр и момент запроса запоминаем: листание идёт по тому же срезу буфера
+    context.user_data["log_filter"] = spec
+    text, markup = _render_log_page(spec, 0)
+    await update.message.reply_text(text, parse_mode="HTML", reply_markup=markup)
 
-        await context.bot.send_message(
-            chat_id=ADMIN_ID,
-            text=f"📄 <b>Последние 30 строк лога:</b>\n<pre>{logs}</pre>",
-            parse_mode="HTML"
-        )
-        await update.message.reply_text("📤 Логи отправлены в админский канал.")
-    except Exception:
-        logging.exception("Ошибка при получении логов")
-        await update.message.reply_text("❌ Не удалось получить логи.")
+
+async def log_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if update.effective_user.id not in ALLOWED_USERS:
+        await query.answer("❌ У тебя нет прав для этой команды.", show_alert=True)
+        return
+    await query.answer()
+    spec = context.user_data.get("log_filter")
+    if spec is None:
+        await query.edit_message_text(LOG_USAGE, parse_mode="HTML")
+        return
+    _, arg = query.data.split("|", 1)
+    if arg == "refresh":
+        spec = {**spec, "until": time.time()}
+        context.user_data["log_filter"] = spec
+        page = 0
+    else:
+        page = int(arg)
+    text, markup = _render_log_page(spec, page)
+    try:
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
 
 
 @admin_only
 async def check_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    file_map = {
-        "assault": "modules-assault.json",
-        "battle": "modules-battle.json",
-        "smg": "modules-pp.json",
-        "shotgun": "modules-drobovik.json",
-        "marksman": "modules-pehotnay.json",
-        "lmg": "modules-pulemet.json",
-        "sniper": "modules-snayperki.json",
-        "pistol": "modules-pistolet.json",
-        "special": "modules-osoboe.json"
-    }
+    # Заодно перечитываем каталог, если файлы поменялись
+    await aio.run(catalog.refresh)
 
     lines = ["🔍 Проверка файлов в /database:"]
-    for key, fname in file_map.items():
-        path = f"database/{fname}"
-        icon = "✅" if os.path.exists(path) else "❌"
-        status = "найден" if icon == "✅" else "отсутствует"
+    for key, fname, found in catalog.file_status():
+        icon = "✅" if found else "❌"
+        status = "найден" if found else "отсутствует"
         lines.append(f"{icon} {key}: <code>{fname}</code> — {status}")
 
     await update.message.reply_text("\n".join(lines), parse_mode="HTML")
@@ -167,20 +285,64 @@ async def restart_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # 3) Помечаем флагом, что нужно подтвердить в on_startup
-    with open("restart_message.txt", "w", encoding="utf-8") as f:
-        f.write(str(user_id))
+    await aio.write_text("restart_message.txt", str(user_id))
 
-    # 4) Выходим — systemd автоматически перезапустит бот
+    # 4) Сохраняем незавершённые диалоги и прогресс рассылок: os._exit не даст Application сделать это самому
+    try:
+        await broadcaster.stop()
+        await context.application.update_persistence()
+        if context.application.persistence:
+            await context.application.persistence.flush()
+    except Exception:
+        logging.exception("Не удалось сохранить состояние перед рестартом")
+
+    # 5) Выходим — systemd автоматически перезапустит бот (очередь логов дописываем сами: atexit не сработает)
+    shutdown_logging()
     os._exit(0)
 
 restart_handler = CommandHandler("restart", restart_bot)
 
 
+def _latency_table(family, limit: int) -> list:
+    """Строки «имя  n  p50  p95  p99  ошибки» по убыванию числа вызовов."""
+    rows = sorted(
+        ((name, h) for name, h in family.series.items() if h.count),
+        key=lambda kv: kv[1].count, reverse=True,
+    )[:limit]
+    lines = []
+    for name, hist in rows:
+        p50, p95, p99 = (q * 1000 for q in hist.quantiles(0.50, 0.95, 0.99))
+        err = f" ❗{hist.errors}" if hist.errors else ""
+        lines.append(f"{name[:34]:34} {hist.count:>6} {p50:7.1f} {p95:7.1f} {p99:7.1f}{err}")
+    return lines
+
+
+@admin_only
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uptime = max(1.0, time.time() - metrics.started)
+    handled = sum(h.count for h in metrics.handlers.series.values())
+    header = f"{'':34} {'n':>6} {'p50':>7} {'p95':>7} {'p99':>7}"
+    msg = [
+        f"⏱ <b>Метрики</b> за {uptime / 3600:.1f} ч: апдейтов <code>{handled}</code> "
+        f"(<code>{handled / uptime * 60:.1f}</code>/мин), время в мс",
+        "",
+        "<b>Хэндлеры</b>",
+        f"<pre>{html.escape(chr(10).join([header, *_latency_table(metrics.handlers, 25)]))}</pre>",
+        "<b>Bot API</b>",
+        f"<pre>{html.escape(chr(10).join([header, *_latency_table(metrics.api, 10)]))}</pre>",
+        "<b>Хранилище</b>",
+        f"<pre>{html.escape(chr(10).join([header, *_latency_table(metrics.db, 10)]))}</pre>",
+    ]
+    await update.message.reply_text("\n".join(msg), parse_mode="HTML")
+
+
 
 # Экспорт всех админ-хэндлеров
 admin_handlers = [
     CommandHandler("status", status_command),
     CommandHandler("log", get_logs),
+    CallbackQueryHandler(log_page_callback, pattern="^log\\|"),
     CommandHandler("check_files", check_files),
+    CommandHandler("metrics", metrics_command),
     restart_handler
 ]
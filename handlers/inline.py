@@ -0,0 +1,83 @@
+import logging
+import os
+
+from telegram import (
+    Update,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InputTextMessageContent,
+)
+from telegram.ext import InlineQueryHandler, ContextTypes
+
+from utils import aio, repository
+from utils.captions import build_caption
+from utils.media_cache import file_ids
+from utils.module_catalog import catalog
+from utils.render_cache import render_cache, render_key
+from utils.search_index import search_index
+
+# Telegram принимает не больше 50 результатов за ответ
+RESULTS_PER_PAGE = 20
+# Сколько секунд Telegram может отдавать наш ответ из своего кэша
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+
+
+async def ensure_search_index():
+    """
+    Собирает индекс при первом запросе, после смены каталога модулей (переводов)
+    и после изменений базы, которые прошли мимо on_change (например, builds.json
+    поменяли на диске).
+    """
+    # total() заодно перечитывает базу, если файлы изменились, — generation актуален
+    await repository.total()
+    generation = repository.generation()
+    if search_index.version != catalog.version or search_index.generation != generation:
+        await aio.run(search_index.rebuild, await repository.all_builds(), generation)
+
+
+def _photo_ids(builds: list) -> list:
+    """file_id картинок: сохранённый при добавлении или из кэша file_id (читает диск)."""
+    return [
+        b.get("image_file_id") or (file_ids.get(b["image"]) if b.get("image") else None)
+        for b in builds
+    ]
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    await ensure_search_index()
+
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    # В пуле потоков: поиск держит лок индекса, event loop его не ждёт
+    builds, has_more = await aio.run(search_index.search, query.query, offset, RESULTS_PER_PAGE)
+    photos = await aio.run(_photo_ids, builds)
+
+    results = []
+    for b, photo in zip(builds, photos):
+        key = render_key(b, ("inline",))
+        caption = render_cache.get(key)
+        if caption is None:
+            caption = build_caption(b)
+            render_cache.put(key, caption)
+        title = f"{b.get('weapon_name', '—')} · {catalog.type_label(b.get('type', ''))}"
+        if photo:
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(b["id"]), photo_file_id=photo, title=title,
+                caption=caption, parse_mode="HTML",
+            ))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(b["id"]), title=title,
+                description=f"{b.get('category', '')} · {len(b.get('modules', {}))} модулей · {b.get('author', '—')}",
+                input_message_content=InputTextMessageContent(caption, parse_mode="HTML"),
+            ))
+
+    logging.debug(f"[INLINE] {query.query!r} offset={offset}: {len(results)} за {search_index.last_ms:.2f} мс")
+    await query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        next_offset=str(offset + len(results)) if has_more else "",
+    )
+
+
+inline_handler = InlineQueryHandler(inline_search)
@@ -1,7 +1,5 @@
 # handlers/show_all.py
 
-import os
-import json
 from telegram import (
     Update,
     InlineKeyboardButton,
@@ -12,12 +10,16 @@ from telegram.ext import (
     CallbackQueryHandler,
     ContextTypes,
 )
-from utils.db import load_weapon_types
+from utils.module_catalog import catalog
 from utils.translators import load_translation_dict
+from utils import repository
+from utils.render_cache import render_cache, render_key
+from utils.translators import translations_version
 
-ROOT = os.path.dirname(os.path.dirname(__file__))
-DB_PATH = os.path.join(ROOT, "database", "builds.json")
-PAGE_SIZE = 5
+# Лимит Telegram на текст сообщения; страница набирается сборками, пока влезает
+MAX_PAGE_CHARS = 4096
+# Сколько сборок подтягивать из хранилища за раз при наборе страницы
+FETCH_CHUNK = 20
 
 CATEGORY_EMOJI = {
     "Топовая мета": "🔥",
@@ -25,22 +27,7 @@ CATEGORY_EMOJI = {
     "Новинки": "🆕",
 }
 
-def load_builds() -> list:
-    if not os.path.exists(DB_PATH):
-        return []
-    with open(DB_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def get_type_label_by_key(type_key: str) -> str:
-    for item in load_weapon_types():
-        if item["key"] == type_key:
-            return item["label"]
-    return type_key  # если не найдено
-
-def make_categories_keyboard(builds: list) -> InlineKeyboardMarkup:
-    counts = {}
-    for b in builds:
-        counts[b.get("category", "—")] = counts.get(b.get("category", "—"), 0) + 1
+def make_categories_keyboard(counts: dict) -> InlineKeyboardMarkup:
     buttons = []
     for cat, emoji in CATEGORY_EMOJI.items():
         cnt = counts.get(cat, 0)
@@ -48,11 +35,11 @@ def make_categories_keyboard(builds: list) -> InlineKeyboardMarkup:
         buttons.append([InlineKeyboardButton(f"{emoji} {cat} ({cnt})", callback_data=f"cat|{cat}|0")])
     return InlineKeyboardMarkup(buttons)
 
-def make_page_keyboard(category: str, page: int, total: int) -> InlineKeyboardMarkup:
+def make_page_keyboard(category: str, page: int, has_next: bool) -> InlineKeyboardMarkup:
     kb = []
     if page > 0:
         kb.append(InlineKeyboardButton("⬅ Пред.", callback_data=f"cat|{category}|{page-1}"))
-    if (page+1)*PAGE_SIZE < total:
+    if has_next:
         kb.append(InlineKeyboardButton("След. ➡", callback_data=f"cat|{category}|{page+1}"))
     kb.append(InlineKeyboardButton("🏠 К категориям", callback_data="back|0|0"))
     # Каждая кнопка — на своей строке:
@@ -60,13 +47,11 @@ def make_page_keyboard(category: str, page: int, total: int) -> InlineKeyboardMa
 
 DIVIDER = "\n- - - - - - - - - - - - - - - - - - - - - - - -\n"
 
-from utils.translators import load_translation_dict
-
-def format_build(idx, build, get_type_label_by_key):
+def format_build(idx, build, type_label):
     name = build.get("weapon_name", "—")
     role = build.get("role", "-")
     type_key = build.get("type", "—")
-    typ = get_type_label_by_key(type_key)
+    typ = type_label(type_key)
     cnt = len(build.get("modules", {}))
     auth = build.get("author", "—")
 
@@ -97,9 +82,118 @@ def format_build(idx, build, get_type_label_by_key):
     )
 
 
+def category_header(category: str, total_in_cat: int) -> str:
+    return f"📂 <b>Сборки категории «{category}»</b> (<code>{total_in_cat}</code>)\n"
+
+
+async def render_build(idx: int, build: dict) -> str:
+    key = render_key(build, ("show_all", idx))
+    text = render_cache.get(key)
+    if text is None:
+        text = format_build(idx, build, catalog.type_label)
+        render_cache.put(key, text)
+    return text
+
+
+class CategoryPages:
+    """
+    Таблицы страниц /show_all по категориям.
+
+    Для каждой категории храним список страниц: (смещение начала, смещение конца, готовый текст).
+    Страница набирается сборками, пока текст влезает в MAX_PAGE_CHARS, поэтому длинные
+    списки модулей не ломают edit_message_text. Страницы строятся лениво: листание вперёд
+    дописывает следующую, уже построенные отдаются по номеру без обращения к хранилищу.
+    Таблица категории сбрасывается, когда в ней меняется сборка, сменились переводы,
+    не сошлось количество сборок или сменилась версия хранилища
+    (repository.generation() — например, builds.json поменяли руками).
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self.hits = 0
+        self.renders = 0
+
+    def invalidate(self, category: str = None):
+        if category is None:
+            self._tables.clear()
+        else:
+            self._tables.pop(category, None)
+
+    def _table(self, category: str, total_in_cat: int) -> dict:
+        version = (translations_version(), repository.generation())
+        table = self._tables.get(category)
+        if table is None or table["total"] != total_in_cat or table["version"] != version:
+            table = {"total": total_in_cat, "version": version, "pages": []}
+            self._tables[category] = table
+        return table
+
+    async def _render_page(self, category: str, start: int, total_in_cat: int):
+        header = category_header(category, total_in_cat)
+        parts = [header]
+        size = len(header)
+        end = start
+        while end < total_in_cat:
+            chunk = await repository.category_builds(category, end, FETCH_CHUNK)
+            if not chunk:
+                break
+            for b in chunk:
+                text = await render_build(end + 1, b)
+                extra = len(text) + 1 + (len(DIVIDER) + 1 if end > start else 0)
+                # Одна сборка попадает на страницу всегда, даже если она сама по себе длинная
+                if end > start and size + extra > MAX_PAGE_CHARS:
+                    return "\n".join(parts), end
+                if end > start:
+                    parts.append(DIVIDER)
+                parts.append(text)
+                size += extra
+                end += 1
+        return "\n".join(parts), end
+
+    async def page(self, category: str, page: int, total_in_cat: int):
+        """
+        (текст страницы, номер показанной страницы, есть ли следующая). Номер может
+        отличаться от запрошенного: вместо несуществующей страницы отдаётся последняя.
+        """
+        table = self._table(category, total_in_cat)
+        pages = table["pages"]
+        if page < len(pages):
+            self.hits += 1
+        while len(pages) <= page:
+            start = pages[-1][1] if pages else 0
+            if pages and start >= total_in_cat:
+                # Страницы с таким номером нет (старая кнопка) — показываем последнюю
+                page = len(pages) - 1
+                break
+            text, end = await self._render_page(category, start, total_in_cat)
+            self.renders += 1
+            if self._tables.get(category) is not table or len(pages) != len(table["pages"]):
+                # Пока рендерили, таблицу сбросили — отдаём результат без кэширования
+                return text, page, end < total_in_cat
+            pages.append((start, end, text))
+        _, end, text = pages[page]
+        return text, page, end < total_in_cat
+
+    def stats(self) -> dict:
+        return {
+            "categories": len(self._tables),
+            "pages": sum(len(t["pages"]) for t in self._tables.values()),
+            "hits": self.hits,
+            "renders": self.renders,
+        }
+
+
+category_pages = CategoryPages()
+
+
+def _on_build_change(op: str, build: dict):
+    category_pages.invalidate(build.get("category"))
+
+
+repository.on_change(_on_build_change)
+
+
 async def show_all_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    builds = load_builds()
-    total = len(builds)
+    total = await repository.total()
     text = (
         f"📦 <b>Все сборки</b>\n\n"
         f"Общее количество сборок в нашей БД: <b>{total}</b>\n\n"
@@ -108,7 +202,7 @@ async def show_all_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         text,
         parse_mode="HTML",
-        reply_markup=make_categories_keyboard(builds)
+        reply_markup=make_categories_keyboard(await repository.category_counts())
     )
 
 async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -116,9 +210,8 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     data = query.data.split("|")
     action = data[0]
-    builds = load_builds()
     if action == "back":
-        total = len(builds)
+        total = await repository.total()
         text = (
             f"📦 <b>Все сборки</b>\n\n"
             f"Общее количество сборок в нашей БД: <b>{total}</b>\n\n"
@@ -127,28 +220,20 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(
             text,
             parse_mode="HTML",
-            reply_markup=make_categories_keyboard(builds)
+            reply_markup=make_categories_keyboard(await repository.category_counts())
         )
         return
 
     # Выбрана категория
     category = data[1]
     page = int(data[2])
-    filtered = [b for b in builds if b.get("category") == category]
-    total_in_cat = len(filtered)
-    chunk = filtered[page*PAGE_SIZE:(page+1)*PAGE_SIZE]
-
-    lines = [f"📂 <b>Сборки категории «{category}»</b> (<code>{total_in_cat}</code>)\n"]
-    for i, b in enumerate(chunk):
-        idx = page * PAGE_SIZE + i + 1
-        lines.append(format_build(idx, b, get_type_label_by_key))
-        if i < len(chunk) - 1:
-            lines.append(DIVIDER)
-
-    
-    kb = make_page_keyboard(category, page, total_in_cat)
+    total_in_cat = (await repository.category_counts()).get(category, 0)
+    text, page, has_next = await category_pages.page(category, page, total_in_cat)
+
+    # Клавиатура — от страницы, которую показали на самом деле
+    kb = make_page_keyboard(category, page, has_next)
     await query.edit_message_text(
-        "\n".join(lines),    # без двойного переноса
+        text,
         parse_mode="HTML",
         reply_markup=kb
     )
@@ -2,10 +2,14 @@ from telegram import Update
 from telegram.ext import CommandHandler, ContextTypes
 from utils.keyboards import get_main_menu
 from utils.permissions import ALLOWED_USERS
+from utils import aio
+from utils.subscribers import subscribers
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     menu = get_main_menu(user_id)
+    # Каждый, кто нажал /start, получает новые сборки (кроме отписавшихся)
+    await aio.run(subscribers.add, user_id)
 
     if user_id in ALLOWED_USERS:
         text = "Добро пожаловать в NDsborki BOT\n\n🛠 Админ: используйте команду /add для добавления сборок."
@@ -18,6 +22,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             " • Листать подходящие варианты с фото и автором\n\n"
             "📍 Жми <b>«Сборки Warzone»</b>, чтобы начать!\n\n"
             "⚠️ Добавление сборок доступно только администраторам.\n\n"
+            "🔔 Новые сборки будут приходить сюда. Отписаться: /unsubscribe\n\n"
             "💬 Если есть идеи или нашёл баг — пиши @nd_admin95\n\n"
             "🛠 Бот будет постоянно обновляться и улучшаться!!"
         )
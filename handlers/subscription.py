@@ -0,0 +1,21 @@
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from utils import aio
+from utils.subscribers import subscribers
+
+
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await aio.run(subscribers.set_subscribed, update.effective_user.id, True)
+    await update.message.reply_text("🔔 Готово! Новые сборки из «Новинок» и «Топовой меты» будут приходить сюда.")
+
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await aio.run(subscribers.set_subscribed, update.effective_user.id, False)
+    await update.message.reply_text("🔕 Вы отписались от новых сборок. Вернуть рассылку: /subscribe")
+
+
+subscription_handlers = [
+    CommandHandler("subscribe", subscribe),
+    CommandHandler("unsubscribe", unsubscribe),
+]
@@ -0,0 +1,43 @@
+import asyncio
+
+from utils.build_store import BuildStore
+
+
+def _build(weapon: str) -> dict:
+    return {"weapon_name": weapon, "type": "assault", "category": "Топовая мета", "modules": {}}
+
+
+def test_ids_are_not_reused_after_compaction(tmp_path):
+    path = tmp_path / "builds.json"
+
+    async def scenario():
+        store = BuildStore(path)
+        first = await store.add(_build("A"))
+        last = await store.add(_build("B"))
+        await store.remove(last)
+        await store.compact()
+        return first, last
+
+    first, last = asyncio.run(scenario())
+
+    # Заново открытое хранилище не знает про удалённую сборку — только про next_id
+    reopened = BuildStore(path)
+    assert [b["id"] for b in reopened.get_all()] == [first]
+    new_id = asyncio.run(reopened.add(_build("C")))
+    assert new_id > last
+
+
+def test_ids_are_not_reused_after_reopen_without_compaction(tmp_path):
+    path = tmp_path / "builds.json"
+
+    async def scenario():
+        store = BuildStore(path)
+        build_id = await store.add(_build("A"))
+        await store.remove(build_id)
+        return build_id
+
+    removed = asyncio.run(scenario())
+
+    reopened = BuildStore(path)
+    assert reopened.get_all() == []
+    assert asyncio.run(reopened.add(_build("B"))) > removed
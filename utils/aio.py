@@ -0,0 +1,145 @@
+"""
+Асинхронный доступ к диску для хэндлеров.
+
+Все чтения/записи файлов идут через ограниченный пул потоков, чтобы один
+большой json.load не останавливал event loop, который обслуживает всех.
+Размер пула — IO_WORKERS (по умолчанию 4).
+
+При BOT_DEBUG_BLOCKING=1 включается охрана: любое открытие файла или запуск
+процесса прямо в потоке event loop пишется в лог с местом вызова.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import pathlib
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IO_WORKERS", "4")),
+    thread_name_prefix="bot-io",
+)
+
+
+async def run(func, *args, **kwargs):
+    """Выполняет блокирующую функцию в пуле ввода-вывода."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def submit(func, *args, **kwargs):
+    """Запускает функцию в пуле без ожидания результата (fire-and-forget)."""
+    return _executor.submit(func, *args, **kwargs)
+
+
+async def exists(path) -> bool:
+    return await run(os.path.exists, path)
+
+
+async def read_text(path, encoding: str = "utf-8") -> str:
+    return await run(pathlib.Path(path).read_text, encoding=encoding)
+
+
+async def read_bytes(path) -> bytes:
+    return await run(pathlib.Path(path).read_bytes)
+
+
+def _write_text_atomic(path, text: str, encoding: str):
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding=encoding)
+    os.replace(tmp, path)
+
+
+async def write_text(path, text: str, encoding: str = "utf-8"):
+    """Атомарная запись: временный файл + rename."""
+    await run(_write_text_atomic, path, text, encoding)
+
+
+def _read_json(path, default):
+    path = pathlib.Path(path)
+    if not path.exists():
+        return default
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def read_json(path, default=None):
+    return await run(_read_json, path, default)
+
+
+async def remove(path):
+    def _remove():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    await run(_remove)
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Охрана от блокирующего ввода-вывода в event loop (режим отладки) ---
+
+_guard_state = threading.local()
+_reported = set()
+_WATCHED_EVENTS = {"open", "subprocess.Popen", "os.system"}
+
+
+def _in_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _audit_hook(event, args):
+    if event not in _WATCHED_EVENTS or getattr(_guard_state, "busy", False):
+        return
+    if not _in_event_loop_thread():
+        return
+    # Исходники читает linecache (трейсбеки, отладка asyncio) — это не ввод-вывод хэндлера
+    if event == "open" and isinstance(args[0], str) and args[0].endswith(".py"):
+        return
+    _guard_state.busy = True
+    try:
+        stack = traceback.extract_stack()[:-1]
+        # Ищем ближайший кадр из кода бота — это и есть виновник
+        frame = next(
+            (f for f in reversed(stack) if "site-packages" not in f.filename and "/lib/python" not in f.filename
+             and not f.filename.endswith("utils/aio.py")),
+            None,
+        )
+        if frame is None:
+            return
+        where = f"{frame.filename}:{frame.lineno}"
+        if where in _reported:
+            return
+        _reported.add(where)
+        target = args[0] if args else ""
+        logging.warning(f"🐢 Блокирующий ввод-вывод в event loop: {event} {target!r} в {where} ({frame.name})")
+    finally:
+        _guard_state.busy = False
+
+
+def install_blocking_guard(loop: asyncio.AbstractEventLoop = None):
+    """
+    Включает охрану, если задан BOT_DEBUG_BLOCKING=1. Вызывать из post_init.
+    Дополнительно включает отладку asyncio: колбэки дольше 50 мс попадут в лог.
+    """
+    if os.getenv("BOT_DEBUG_BLOCKING", "").strip() not in ("1", "true", "yes"):
+        return False
+    sys.addaudithook(_audit_hook)
+    if loop is not None:
+        loop.set_debug(True)
+        loop.slow_callback_duration = 0.05
+    logging.warning("🐢 Охрана от блокирующего ввода-вывода включена")
+    return True
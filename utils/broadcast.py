@@ -0,0 +1,195 @@
+"""
+Рассылка новых сборок подписчикам.
+
+Рассылка идёт фоновой задачей: подписчики читаются из реестра пачками по
+возрастанию user_id, внутри пачки одновременно не больше BROADCAST_CONCURRENCY
+отправок. Темп задаёт общий rate limiter (utils/rate_limiter.py): запросы
+рассылки помечены приоритетом BULK, поэтому ответы живым пользователям всегда
+уходят раньше, а 30 сообщений в секунду на бота не превышаются — 100 000
+подписчиков это около часа.
+
+Картинка загружается в Telegram один раз (или вообще не загружается, если у
+сборки уже есть file_id), дальше везде отправляется по file_id.
+
+Прогресс (cursor — последний user_id, до которого всё отправлено, и список
+получивших сверх него) пишется в реестр каждые CHECKPOINT_INTERVAL секунд и при
+остановке; после рестарта незаконченные рассылки продолжаются с этого места, а
+повторно может прийти только тем, чей запрос был в полёте в момент остановки. Заблокировавшие бота
+удаляются из реестра.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from utils import aio, repository
+from utils.captions import build_caption
+from utils.media_cache import file_ids
+from utils.rate_limiter import BULK
+from utils.subscribers import subscribers
+
+# Категории, о новых сборках в которых сообщаем подписчикам
+BROADCAST_CATEGORIES = ("Новинки", "Топовая мета")
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "30"))
+CHUNK_SIZE = 1000
+CHECKPOINT_INTERVAL = 2.0
+
+# Рассылка терпеливее интерактивных запросов к 429
+BULK_ARGS = {"priority": BULK, "max_retries": 10}
+
+# Ошибки BadRequest, после которых писать этому пользователю бессмысленно
+GONE_ERRORS = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+class Broadcaster:
+    def __init__(self, concurrency: int = BROADCAST_CONCURRENCY):
+        self.concurrency = concurrency
+        self._tasks = {}  # id рассылки -> asyncio.Task
+        self._jobs = {}   # id рассылки -> состояние (то же, что в реестре)
+
+    async def start(self, bot, build_id: int) -> dict:
+        """Заводит рассылку сборки и запускает её в фоне."""
+        job = await aio.run(subscribers.create_broadcast, build_id)
+        logging.info(f"[BROADCAST] #{job['id']}: сборка #{build_id}, подписчиков {job['total']}")
+        self._spawn(bot, job)
+        return job
+
+    async def resume(self, bot) -> int:
+        """При старте бота продолжает рассылки, прерванные остановкой."""
+        jobs = await aio.run(subscribers.unfinished)
+        for job in jobs:
+            logging.info(f"[BROADCAST] #{job['id']}: продолжаю после user_id {job['cursor']} ({job['sent']} уже отправлено)")
+            self._spawn(bot, job)
+        return len(jobs)
+
+    async def stop(self):
+        """Останавливает рассылки, сохранив прогресс (до остановки самого бота)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, bot, job: dict):
+        self._jobs[job["id"]] = job
+        self._tasks[job["id"]] = asyncio.create_task(self._run(bot, job))
+
+    # --- Сама рассылка ---
+
+    async def _run(self, bot, job: dict):
+        dropped = []
+        try:
+            build = await repository.get_build(job["build_id"])
+            if build is None:
+                logging.warning(f"[BROADCAST] #{job['id']}: сборка #{job['build_id']} удалена, рассылка отменена")
+            else:
+                await self._deliver_all(bot, job, build, dropped)
+            await aio.run(subscribers.save_progress, job, dropped, True)
+            logging.info(
+                f"[BROADCAST] #{job['id']} завершена: отправлено {job['sent']}, "
+                f"заблокировали {job['blocked']}, ошибок {job['failed']}"
+            )
+        except asyncio.CancelledError:
+            await aio.run(subscribers.save_progress, job, dropped)
+            raise
+        except Exception:
+            logging.exception(f"[BROADCAST] #{job['id']}: рассылка упала, продолжится после рестарта")
+            await aio.run(subscribers.save_progress, job, dropped)
+        finally:
+            self._tasks.pop(job["id"], None)
+            self._jobs.pop(job["id"], None)
+
+    async def _deliver_all(self, bot, job: dict, build: dict, dropped: list):
+        caption = build_caption(build)
+        image = build.get("image")
+        if not job["file_id"]:
+            job["file_id"] = build.get("image_file_id") or (await aio.run(file_ids.get, image) if image else None)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_save = time.monotonic()
+
+        while True:
+            ids = await aio.run(subscribers.page_after, job["cursor"], CHUNK_SIZE)
+            if not ids:
+                return
+            # Кому уже отправили до остановки (дальше cursor) — пропускаем
+            skip = set(job["ahead"])
+            done = bytearray(1 if uid in skip else 0 for uid in ids)
+            prefix = 0
+
+            def checkpoint():
+                nonlocal prefix
+                while prefix < len(ids) and done[prefix]:
+                    prefix += 1
+                if prefix:
+                    job["cursor"] = ids[prefix - 1]
+                job["ahead"] = [ids[j] for j in range(prefix, len(ids)) if done[j]]
+
+            async def deliver(i: int, user_id: int):
+                nonlocal last_save
+                async with semaphore:
+                    await self._send_one(bot, job, user_id, caption, image, dropped)
+                done[i] = 1
+                if time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                    last_save = time.monotonic()
+                    checkpoint()
+                    batch, dropped[:] = dropped[:], []
+                    await aio.run(subscribers.save_progress, dict(job), batch)
+
+            pending = [i for i in range(len(ids)) if not done[i]]
+            try:
+                if pending and not job["file_id"] and image and await aio.exists(image):
+                    # Пока file_id нет, шлём по одному: первая удачная отправка загружает файл,
+                    # остальные идут по её file_id. Если получатель недоступен (заблокировал
+                    # бота, чат не найден) — загружаем следующему, а не всем разом
+                    while pending and not job["file_id"]:
+                        await deliver(pending[0], ids[pending[0]])
+                        pending = pending[1:]
+                await asyncio.gather(*(deliver(i, ids[i]) for i in pending))
+            finally:
+                checkpoint()
+
+    async def _send_one(self, bot, job: dict, user_id: int, caption: str, image, dropped: list):
+        try:
+            if job["file_id"]:
+                await bot.send_photo(
+                    user_id, job["file_id"], caption=caption, parse_mode="HTML", rate_limit_args=BULK_ARGS
+                )
+            elif image and await aio.exists(image):
+                msg = await bot.send_photo(
+                    user_id, await aio.read_bytes(image), caption=caption, parse_mode="HTML",
+                    rate_limit_args=BULK_ARGS,
+                )
+                if msg.photo:
+                    job["file_id"] = msg.photo[-1].file_id
+                    await aio.run(file_ids.put, image, job["file_id"])
+            else:
+                await bot.send_message(user_id, caption, parse_mode="HTML", rate_limit_args=BULK_ARGS)
+            job["sent"] += 1
+        except Forbidden:
+            job["blocked"] += 1
+            dropped.append(user_id)
+        except BadRequest as e:
+            if any(err in str(e).lower() for err in GONE_ERRORS):
+                job["blocked"] += 1
+                dropped.append(user_id)
+            else:
+                if "file identifier" in str(e).lower():
+                    # file_id протух — следующая отправка загрузит файл заново
+                    job["file_id"] = None
+                job["failed"] += 1
+                logging.warning(f"[BROADCAST] #{job['id']} → {user_id}: {e}")
+        except TelegramError as e:
+            job["failed"] += 1
+            logging.warning(f"[BROADCAST] #{job['id']} → {user_id}: {e}")
+
+    def stats(self) -> list:
+        """Идущие рассылки: для /status."""
+        return [
+            {k: job[k] for k in ("id", "build_id", "total", "sent", "blocked", "failed")}
+            for job in self._jobs.values()
+        ]
+
+
+broadcaster = Broadcaster()
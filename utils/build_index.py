@@ -0,0 +1,187 @@
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+
+def _module_count(build: dict) -> int:
+    return len(build.get("modules", {}))
+
+
+def _build_id(build: dict) -> int:
+    return build.get("id", 0)
+
+
+def find_position(bucket: list, build_id: int):
+    """Позиция сборки в списке, отсортированном по id (бинарный поиск), или None."""
+    pos = bisect_left(bucket, build_id, key=_build_id)
+    if pos < len(bucket) and _build_id(bucket[pos]) == build_id:
+        return pos
+    return None
+
+
+class BuildIndex:
+    """
+    Фасетный индекс для каскада Категория → Тип → Оружие → Кол-во модулей.
+    Каждый шаг просмотра — один поиск в словаре, без прохода по всей базе.
+    Индекс обновляется инкрементально при добавлении/удалении сборки.
+    """
+
+    def __init__(self, builds=()):
+        self.clear()
+        for b in builds:
+            self.add(b)
+
+    def clear(self):
+        # category -> {type_key: кол-во сборок} (только режим Warzone) + отсортированные ключи
+        self._type_counts = defaultdict(Counter)
+        self._types_sorted = defaultdict(list)
+        # (category, type_key) -> {weapon: кол-во сборок} + отсортированные названия
+        self._weapon_counts = defaultdict(Counter)
+        self._weapons_sorted = defaultdict(list)
+        # (category, type_key, weapon) -> {module_count: кол-во сборок}
+        self._module_counts = defaultdict(Counter)
+        # (category, type_key, weapon, module_count) -> сборки, отсортированные по id
+        self._builds = defaultdict(list)
+        # category -> сборки, отсортированные по id (для /show_all)
+        self._category_builds = defaultdict(list)
+        self._category_counts = Counter()
+        # кол-во модулей -> кол-во сборок (для /status)
+        self._size_counts = Counter()
+        # все сборки / по типу / по автору, отсортированные по id (для /delete)
+        self._all_builds = []
+        self._type_builds = defaultdict(list)
+        self._author_builds = defaultdict(list)
+
+    @staticmethod
+    def _inc(counts: Counter, ordered: list, key):
+        counts[key] += 1
+        if counts[key] == 1:
+            insort(ordered, key)
+
+    @staticmethod
+    def _dec(counts: Counter, ordered: list, key):
+        counts[key] -= 1
+        if counts[key] <= 0:
+            del counts[key]
+            pos = bisect_left(ordered, key)
+            if pos < len(ordered) and ordered[pos] == key:
+                del ordered[pos]
+
+    def add(self, build: dict):
+        category = build.get("category")
+        type_key = build.get("type")
+        weapon = build.get("weapon_name")
+        count = _module_count(build)
+
+        self._category_counts[build.get("category", "—")] += 1
+        if build.get("mode", "").lower() == "warzone":
+            self._inc(self._type_counts[category], self._types_sorted[category], type_key)
+        self._inc(self._weapon_counts[(category, type_key)], self._weapons_sorted[(category, type_key)], weapon)
+        self._module_counts[(category, type_key, weapon)][count] += 1
+        self._size_counts[count] += 1
+        insort(self._builds[(category, type_key, weapon, count)], build, key=_build_id)
+        insort(self._category_builds[build.get("category", "—")], build, key=_build_id)
+        insort(self._all_builds, build, key=_build_id)
+        insort(self._type_builds[type_key], build, key=_build_id)
+        insort(self._author_builds[build.get("author", "—")], build, key=_build_id)
+
+    @staticmethod
+    def _remove_from(lists: dict, key, build: dict):
+        bucket = lists.get(key, [])
+        pos = find_position(bucket, _build_id(build))
+        if pos is not None:
+            del bucket[pos]
+        if not bucket:
+            lists.pop(key, None)
+
+    def remove(self, build: dict):
+        category = build.get("category")
+        type_key = build.get("type")
+        weapon = build.get("weapon_name")
+        count = _module_count(build)
+
+        bucket = self._builds.get((category, type_key, weapon, count), [])
+        pos = find_position(bucket, _build_id(build))
+        if pos is None:
+            return
+        del bucket[pos]
+        by_category = self._category_builds[build.get("category", "—")]
+        pos = find_position(by_category, _build_id(build))
+        if pos is not None:
+            del by_category[pos]
+        pos = find_position(self._all_builds, _build_id(build))
+        if pos is not None:
+            del self._all_builds[pos]
+        self._remove_from(self._type_builds, type_key, build)
+        self._remove_from(self._author_builds, build.get("author", "—"), build)
+
+        self._category_counts[build.get("category", "—")] -= 1
+        if self._category_counts[build.get("category", "—")] <= 0:
+            del self._category_counts[build.get("category", "—")]
+        if build.get("mode", "").lower() == "warzone":
+            self._dec(self._type_counts[category], self._types_sorted[category], type_key)
+        self._dec(self._weapon_counts[(category, type_key)], self._weapons_sorted[(category, type_key)], weapon)
+        counts = self._module_counts[(category, type_key, weapon)]
+        counts[count] -= 1
+        if counts[count] <= 0:
+            del counts[count]
+        self._size_counts[count] -= 1
+        if self._size_counts[count] <= 0:
+            del self._size_counts[count]
+
+    # --- Запросы (все O(1)) ---
+
+    def types(self, category: str) -> list:
+        """Отсортированные ключи типов оружия в категории (режим Warzone)."""
+        return self._types_sorted.get(category, [])
+
+    def weapons(self, category: str, type_key: str) -> list:
+        """Отсортированные названия оружия для категории и типа."""
+        return self._weapons_sorted.get((category, type_key), [])
+
+    def module_count(self, category: str, type_key: str, weapon: str, count: int) -> int:
+        """Сколько сборок с заданным количеством модулей."""
+        return self._module_counts.get((category, type_key, weapon), {}).get(count, 0)
+
+    def builds(self, category: str, type_key: str, weapon: str, count: int) -> list:
+        """Сборки для конечного шага каскада, по возрастанию id (порядок добавления)."""
+        return self._builds.get((category, type_key, weapon, count), [])
+
+    def module_counts(self, category: str, type_key: str, weapon: str) -> dict:
+        return dict(self._module_counts.get((category, type_key, weapon), {}))
+
+    def category_count(self, category: str) -> int:
+        return self._category_counts.get(category, 0)
+
+    def category_counts(self) -> dict:
+        return dict(self._category_counts)
+
+    def category_builds(self, category: str) -> list:
+        """Сборки категории по возрастанию id."""
+        return self._category_builds.get(category, [])
+
+    def all_builds(self) -> list:
+        """Все сборки по возрастанию id."""
+        return self._all_builds
+
+    def type_builds(self, type_key: str) -> list:
+        return self._type_builds.get(type_key, [])
+
+    def author_builds(self, author: str) -> list:
+        return self._author_builds.get(author, [])
+
+    def type_counts(self) -> dict:
+        return {k: len(v) for k, v in self._type_builds.items()}
+
+    def author_counts(self) -> dict:
+        """{автор: кол-во сборок}, по убыванию."""
+        return dict(sorted(((a, len(v)) for a, v in self._author_builds.items()), key=lambda x: -x[1]))
+
+    def summary(self) -> dict:
+        """Сводка для /status — из счётчиков индекса, без прохода по сборкам."""
+        return {
+            "total": len(self._all_builds),
+            "authors": self.author_counts(),
+            "categories": self.category_counts(),
+            "types": dict(sorted(self.type_counts().items(), key=lambda x: -x[1])),
+            "module_counts": dict(sorted(self._size_counts.items())),
+        }
@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+from utils import aio
+from utils.metrics import metrics
+from utils.build_index import BuildIndex, find_position
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+DB_PATH = ROOT / "database" / "builds.json"
+
+# После скольких записей в журнале сворачиваем его в снапшот
+COMPACT_EVERY = 200
+
+
+def _file_signature(path: pathlib.Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _fsync_dir(path: pathlib.Path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path: pathlib.Path, payload: bytes):
+    """
+    Пишет во временный файл, fsync и атомарно подменяет целевой через rename.
+    При падении на диске остаётся либо старая, либо новая версия — не обрезок.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+def _apply(builds: dict, entry: dict) -> list:
+    """
+    Применяет операцию журнала к словарю {id: сборка}, возвращает изменённые сборки.
+    """
+    op = entry.get("op")
+    if op == "add":
+        build = entry["build"]
+        builds[build["id"]] = build
+        return [build]
+    if op == "del":
+        if "id" in entry:
+            build = builds.pop(entry["id"], None)
+            return [build] if build else []
+        # Записи журнала до появления id удаляли по полному совпадению
+        removed = [b for b in builds.values() if {k: v for k, v in b.items() if k != "id"} == entry["build"]]
+        for b in removed:
+            del builds[b["id"]]
+        return removed
+    if op == "set":
+        old = builds.get(entry["id"])
+        if old is None:
+            return []
+        # Сборки не меняем на месте — их могут держать кэши и индексы; None удаляет поле
+        build = {k: v for k, v in {**old, **entry["fields"]}.items() if v is not None}
+        builds[build["id"]] = build
+        return [build]
+    raise ValueError(f"Неизвестная операция журнала: {op}")
+
+
+class BuildStore:
+    """
+    Держит сборки в памяти: снапшот builds.json + журнал операций builds.journal.
+
+    У каждой сборки постоянный числовой id (выдаётся при добавлении), по нему
+    сборка находится за O(1) — через хэш-индекс id → запись.
+
+    Добавление и удаление — одна строка в журнале с fsync, O(1) вместо
+    перезаписи всей базы. Фоновая компакция сворачивает журнал в новый снапшот
+    (временный файл + rename). Все писатели идут через один asyncio.Lock.
+
+    Первая строка журнала хранит хэш снапшота, на который он накатывается:
+    если компакция успела подменить снапшот, но не журнал, при старте
+    устаревший журнал просто игнорируется, а не применяется повторно.
+    Там же лежит next_id — следующий свободный id. Он только растёт, поэтому
+    id удалённых сборок не достаются новым даже после компакции.
+
+    С диска данные перечитываются только если файлы изменились (mtime/size/inode).
+    generation растёт при каждом перечитывании и каждой записи — по нему кэши
+    понимают, что данные могли поменяться (в том числе другим процессом).
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.journal_path = self.path.with_suffix(".journal")
+        self._by_id: dict = {}
+        self._next_id = 1
+        self._index = BuildIndex()
+        self._signature = None
+        self._snapshot_hash = None
+        self._journal_entries = 0
+        self._missing_ids = False
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._write_lock = asyncio.Lock()
+        self._compaction = None
+        self.hits = 0
+        self.reloads = 0
+        self.writes = 0
+        self.compactions = 0
+        self.generation = 0
+
+    def _stat_signature(self):
+        return (_file_signature(self.path), _file_signature(self.journal_path))
+
+    # --- Чтение ---
+
+    def _read_journal(self, snapshot_hash: str):
+        """(записи журнала, next_id из заголовка или 0)."""
+        if not self.journal_path.exists():
+            return [], 0
+        entries = []
+        next_id = 0
+        with self.journal_path.open("r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        for n, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Оборванная последняя строка — запись не успела завершиться
+                logging.warning(f"⚠️ Пропущена битая строка журнала #{n + 1}")
+                continue
+            if entry.get("op") == "base":
+                if entry.get("snapshot") != snapshot_hash:
+                    logging.warning("⚠️ Журнал относится к другому снапшоту — пропускаю его")
+                    return [], 0
+                next_id = entry.get("next_id", 0)
+                continue
+            entries.append(entry)
+        return entries, next_id
+
+    def _reload(self, signature):
+        try:
+            started = time.perf_counter()
+            raw = self.path.read_bytes() if self.path.exists() else b""
+            snapshot_hash = hashlib.sha256(raw).hexdigest()
+            read_done = time.perf_counter()
+            snapshot = json.loads(raw.decode("utf-8")) if raw else []
+            parse_done = time.perf_counter()
+
+            # Старым сборкам без id выдаём их по порядку в снапшоте — детерминированно,
+            # поэтому записи журнала, сделанные поверх этого снапшота, остаются верными
+            next_id = max((b["id"] for b in snapshot if "id" in b), default=0) + 1
+            missing_ids = False
+            by_id = {}
+            for b in snapshot:
+                if "id" not in b:
+                    b = {"id": next_id, **b}
+                    next_id += 1
+                    missing_ids = True
+                by_id[b["id"]] = b
+
+            entries, stored_next_id = self._read_journal(snapshot_hash)
+            next_id = max(next_id, stored_next_id)
+            for entry in entries:
+                _apply(by_id, entry)
+                if entry.get("op") == "add":
+                    next_id = max(next_id, entry["build"]["id"] + 1)
+                elif "id" in entry:
+                    next_id = max(next_id, entry["id"] + 1)
+        except Exception as e:
+            # Оставляем последнюю удачную копию и попробуем ещё раз при следующем обращении
+            logging.warning(f"❌ Ошибка загрузки БД: {e}")
+            return
+        self._by_id = by_id
+        # Уже выданные id не возвращаем, даже если на диске их больше нет
+        self._next_id = max(self._next_id, next_id)
+        self._missing_ids = missing_ids
+        self._index = BuildIndex(by_id.values())
+        metrics.db.observe("load.read", read_done - started)
+        metrics.db.observe("load.parse", parse_done - read_done)
+        # журнал + индекс
+        metrics.db.observe("load.index", time.perf_counter() - parse_done)
+        self._snapshot_hash = snapshot_hash
+        self._journal_entries = len(entries)
+        self._signature = signature
+        self._loaded = True
+        self.reloads += 1
+        self.generation += 1
+
+    def _ensure_fresh(self):
+        signature = self._stat_signature()
+        if self._loaded and signature == self._signature:
+            self.hits += 1
+        else:
+            self._reload(signature)
+
+    def get_all(self) -> list:
+        """
+        Возвращает актуальный список сборок (копия списка, сами сборки менять нельзя).
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._by_id.values())
+
+    def get(self, build_id: int):
+        """Сборка по id или None."""
+        with self._lock:
+            self._ensure_fresh()
+            return self._by_id.get(build_id)
+
+    def facets(self) -> BuildIndex:
+        """
+        Фасетный индекс по актуальным сборкам (см. BuildIndex).
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return self._index
+
+    # --- Запись ---
+
+    def _append_journal(self, entry: dict) -> list:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._ensure_fresh()
+            new_journal = not self.journal_path.exists()
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                if new_journal:
+                    f.write(self._base_line(self._snapshot_hash))
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if new_journal:
+                _fsync_dir(self.journal_path.parent)
+
+            old = self._by_id.get(entry["id"]) if entry["op"] == "set" else None
+            changed = _apply(self._by_id, entry)
+            for build in changed:
+                if entry["op"] == "set":
+                    self._index.remove(old)
+                    self._index.add(build)
+                elif entry["op"] == "add":
+                    self._index.add(build)
+                else:
+                    self._index.remove(build)
+            self._journal_entries += 1
+            self._signature = self._stat_signature()
+            self.writes += 1
+            self.generation += 1
+            return changed
+
+    def _base_line(self, snapshot_hash: str) -> str:
+        return json.dumps({"op": "base", "snapshot": snapshot_hash, "next_id": self._next_id}) + "\n"
+
+    def _maybe_compact(self):
+        if self._journal_entries >= COMPACT_EVERY:
+            self.schedule_compaction()
+
+    def _add_sync(self, build: dict) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            build_id = self._next_id
+            self._next_id += 1
+            self._append_journal({"op": "add", "build": {"id": build_id, **{k: v for k, v in build.items() if k != "id"}}})
+            return build_id
+
+    def _remove_sync(self, build_id: int) -> list:
+        with self._lock:
+            self._ensure_fresh()
+            if build_id not in self._by_id:
+                return []
+            return self._append_journal({"op": "del", "id": build_id})
+
+    def _update_sync(self, build_id: int, fields: dict) -> list:
+        with self._lock:
+            self._ensure_fresh()
+            if build_id not in self._by_id:
+                return []
+            return self._append_journal({"op": "set", "id": build_id, "fields": fields})
+
+    async def add(self, build: dict) -> int:
+        """
+        Добавляет сборку, выдаёт ей новый id и возвращает его.
+        Проверка свежести и запись идут в пуле потоков, event loop диск не ждёт.
+        """
+        async with self._write_lock:
+            build_id = await aio.run(self._add_sync, build)
+        self._maybe_compact()
+        return build_id
+
+    async def remove(self, build_id: int) -> int:
+        """
+        Удаляет сборку по id, возвращает число удалённых (0 или 1).
+        """
+        async with self._write_lock:
+            removed = await aio.run(self._remove_sync, build_id)
+        self._maybe_compact()
+        return len(removed)
+
+    async def update(self, build_id: int, fields: dict):
+        """
+        Меняет поля сборки (None — удалить поле), возвращает новую сборку или None.
+        """
+        async with self._write_lock:
+            changed = await aio.run(self._update_sync, build_id, fields)
+        self._maybe_compact()
+        return changed[0] if changed else None
+
+    # --- Компакция ---
+
+    def _compact_sync(self):
+        builds = self.get_all()
+        payload = json.dumps(builds, indent=2, ensure_ascii=False).encode("utf-8")
+        snapshot_hash = hashlib.sha256(payload).hexdigest()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self.path, payload)
+        # Новый журнал ссылается на новый снапшот; старый после этого неактуален
+        _atomic_write(self.journal_path, self._base_line(snapshot_hash).encode("utf-8"))
+        with self._lock:
+            self._snapshot_hash = snapshot_hash
+            self._journal_entries = 0
+            self._missing_ids = False
+            self._signature = self._stat_signature()
+            self.compactions += 1
+
+    async def compact(self):
+        """
+        Сворачивает журнал в снапшот builds.json. Писатели ждут на общем локе.
+        Заодно сохраняет id, выданные старым сборкам при загрузке.
+        """
+        async with self._write_lock:
+            if not self._journal_entries and not self._missing_ids:
+                return
+            await aio.run(self._compact_sync)
+        logging.info("[DB] Журнал свёрнут в снапшот")
+
+    def schedule_compaction(self):
+        if self._compaction and not self._compaction.done():
+            return
+        self._compaction = asyncio.get_running_loop().create_task(self.compact())
+
+    # --- Запросы репозитория (см. utils.repository) ---
+
+    def list_types(self, category: str) -> list:
+        return list(self.facets().types(category))
+
+    def list_weapons(self, category: str, type_key: str) -> list:
+        return list(self.facets().weapons(category, type_key))
+
+    def module_counts(self, category: str, type_key: str, weapon: str) -> dict:
+        return self.facets().module_counts(category, type_key, weapon)
+
+    def view_build(self, category: str, type_key: str, weapon: str, count: int, build_id: int):
+        """
+        Сборка для листалки и id соседей: (сборка, prev_id, next_id, всего).
+        Если сборки с таким id уже нет (или id=0) — открываем первую.
+        """
+        with self._lock:
+            builds = self.facets().builds(category, type_key, weapon, count)
+            if not builds:
+                return None, None, None, 0
+            pos = find_position(builds, build_id)
+            if pos is None:
+                pos = 0
+            total = len(builds)
+            return (
+                builds[pos],
+                builds[(pos - 1) % total]["id"],
+                builds[(pos + 1) % total]["id"],
+                total,
+            )
+
+    def get_build(self, build_id: int):
+        return self.get(build_id)
+
+    def total(self) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            return len(self._by_id)
+
+    def category_counts(self) -> dict:
+        return self.facets().category_counts()
+
+    def author_counts(self) -> dict:
+        with self._lock:
+            return self.facets().author_counts()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return self.facets().summary()
+
+    def category_builds(self, category: str, offset: int, limit: int) -> list:
+        with self._lock:
+            return self.facets().category_builds(category)[offset:offset + limit]
+
+    def all_builds(self) -> list:
+        return self.get_all()
+
+    def browse(self, category: str, type_key: str, author: str, offset: int, limit: int):
+        """
+        Страница сборок по фильтрам (None — без фильтра), по возрастанию id: (сборки, всего).
+        Берём самый короткий список индекса из подходящих и фильтруем только его.
+        """
+        with self._lock:
+            index = self.facets()
+            candidates = [index.all_builds()]
+            if category is not None:
+                candidates.append(index.category_builds(category))
+            if type_key is not None:
+                candidates.append(index.type_builds(type_key))
+            if author is not None:
+                candidates.append(index.author_builds(author))
+            builds = min(candidates, key=len)
+            if len(candidates) > 2:
+                builds = [
+                    b for b in builds
+                    if (category is None or b.get("category", "—") == category)
+                    and (type_key is None or b.get("type") == type_key)
+                    and (author is None or b.get("author", "—") == author)
+                ]
+            return builds[offset:offset + limit], len(builds)
+
+    def browse_facets(self) -> dict:
+        """Значения фильтров /delete с количеством сборок."""
+        with self._lock:
+            index = self.facets()
+            return {
+                "category": index.category_counts(),
+                "type": index.type_counts(),
+                "author": index.author_counts(),
+            }
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._missing_ids
+
+    def stats(self) -> dict:
+        return {
+            "backend": "json",
+            "builds": len(self._by_id),
+            "hits": self.hits,
+            "reloads": self.reloads,
+            "writes": self.writes,
+            "journal": self._journal_entries,
+            "compactions": self.compactions,
+        }
+
+
+store = BuildStore(os.getenv("BUILDS_JSON_PATH") or DB_PATH)
@@ -0,0 +1,16 @@
+from utils.module_catalog import catalog
+
+
+def build_caption(build: dict) -> str:
+    """Текст карточки сборки (HTML) — общий для просмотра, инлайн-поиска и рассылки."""
+    type_key = build.get("type", "")
+    tr = catalog.translations(type_key)
+    modules = build.get("modules", {})
+    mods = "\n".join(f"├ {k}: {tr.get(v, v)}" for k, v in modules.items())
+    return (
+        f"📌 <b>Оружие:</b> {build['weapon_name']}\n"
+        f"🎯 <b>Роль:</b> {build.get('role','-')}\n"
+        f"🔫 <b>Тип:</b> {catalog.type_label(type_key)}\n\n"
+        f"🧩 <b>Модули ({len(modules)}):</b>\n{mods}\n\n"
+        f"✍ <b>Автор:</b> {build['author']}"
+    )
@@ -1,60 +1,87 @@
-from telegram import BotCommandScopeDefault, BotCommandScopeAllPrivateChats, BotCommandScopeAllGroupChats, BotCommandScopeChat
-from telegram import BotCommand
-import os
-import logging
-
+"""
+Меню команд бота (кнопка «/» в Telegram).
 
-async def clear_all_scopes(app):
-    await app.bot.delete_my_commands(scope=BotCommandScopeDefault())
-    await app.bot.delete_my_commands(scope=BotCommandScopeAllPrivateChats())
-    await app.bot.delete_my_commands(scope=BotCommandScopeAllGroupChats())
+Желаемое состояние: публичные команды в области по умолчанию, пустые области
+«все личные чаты» и «все группы», админские команды в чате каждого админа из
+ALLOWED_USERS. При старте текущие команды всех областей запрашиваются
+одновременно, а set/delete отправляются только туда, где они отличаются, —
+обычный рестарт обходится одним getMyCommands на область.
+"""
+import asyncio
+import logging
+import os
 
-    for admin_id in os.getenv("ALLOWED_USERS", "").split(","):
-        if admin_id.strip().isdigit():
-            await app.bot.delete_my_commands(scope=BotCommandScopeChat(chat_id=int(admin_id)))
+from telegram import BotCommandScopeDefault, BotCommandScopeAllPrivateChats, BotCommandScopeAllGroupChats, BotCommandScopeChat
+from telegram import BotCommand
 
 public_commands = [
     BotCommand("home", "🏠 Главное меню"),
     BotCommand("help", "📩 Помощь и поддержка"),
     BotCommand("show_all", "📋 Все сборки"),
     BotCommand("add", "➕ Добавить сборку"),
+    BotCommand("subscribe", "🔔 Подписаться на новые сборки"),
+    BotCommand("unsubscribe", "🔕 Отписаться от рассылки"),
 ]
 
 admin_commands = [
     BotCommand("restart", "🔁 Перезапустить бота"),
     *public_commands,
-    BotCommand("log", "🪵 Последние 30 строк логов"),
+    BotCommand("log", "🪵 Логи: /log error 2h"),
     BotCommand("status", "📊 Статистика и состояние"),
+    BotCommand("metrics", "⏱ Задержки хэндлеров"),
     BotCommand("check_files", "🗂 Проверка модулей"),
     BotCommand("delete", "❌ Удалить сборку"),
     BotCommand("stop_delete", "⛔ Остановить удаление"),
 ]
 
 
-async def set_commands(app):
-    logging.warning("⚙ Установка команд запускается...")
-    
-    # Публичные команды
-    try:
-        await app.bot.delete_my_commands(scope=BotCommandScopeDefault())
-        await app.bot.set_my_commands(public_commands, scope=BotCommandScopeDefault())
-        logging.warning("✅ Установлены публичные команды")
-    except Exception as e:
-        logging.error(f"❌ Ошибка установки публичных команд: {e}")
-
-    # Команды для админов
+def _admin_ids() -> list:
+    ids = []
     for admin_id in os.getenv("ALLOWED_USERS", "").split(","):
         if admin_id.strip().isdigit():
-            try:
-                chat_id = int(admin_id.strip())
-                await app.bot.delete_my_commands(scope=BotCommandScopeChat(chat_id=chat_id))
-                await app.bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=chat_id))
-                logging.warning(f"✅ Установлены команды для админа: {chat_id}")
-            except Exception as e:
-                logging.error(f"❌ Ошибка установки команд для админа {admin_id}: {e}")
-        else:
+            ids.append(int(admin_id))
+        elif admin_id.strip():
             logging.warning(f"⚠️ Пропущен невалидный chat_id: {admin_id}")
+    return ids
+
+
+def desired_scopes() -> list:
+    """[(название, область, команды)]; пустой список команд — область очищается."""
+    scopes = [
+        ("default", BotCommandScopeDefault(), public_commands),
+        ("private", BotCommandScopeAllPrivateChats(), []),
+        ("groups", BotCommandScopeAllGroupChats(), []),
+    ]
+    scopes += [(f"admin {chat_id}", BotCommandScopeChat(chat_id=chat_id), admin_commands) for chat_id in _admin_ids()]
+    return scopes
+
+
+def _same(current, wanted) -> bool:
+    return [(c.command, c.description) for c in current] == [(c.command, c.description) for c in wanted]
+
+
+async def _sync_scope(bot, name: str, scope, commands: list) -> str:
+    try:
+        if _same(await bot.get_my_commands(scope=scope), commands):
+            return "unchanged"
+        if commands:
+            # set_my_commands заменяет список целиком — delete перед ним не нужен
+            await bot.set_my_commands(commands, scope=scope)
+            return "updated"
+        await bot.delete_my_commands(scope=scope)
+        return "cleared"
+    except Exception as e:
+        logging.error(f"❌ Ошибка установки команд ({name}): {e}")
+        return "failed"
 
-    logging.warning("🎯 set_commands завершена.")
 
-print('✅ Команды успешно установлены')
+async def sync_commands(app) -> dict:
+    """Приводит меню команд всех областей к желаемому; возвращает {итог: число областей}."""
+    scopes = desired_scopes()
+    results = await asyncio.gather(*(_sync_scope(app.bot, *s) for s in scopes))
+    summary = {}
+    for (name, _, _), result in zip(scopes, results):
+        summary[result] = summary.get(result, 0) + 1
+        if result in ("updated", "cleared"):
+            logging.info(f"✅ Команды обновлены: {name}")
+    return summary
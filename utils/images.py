@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+# IMAGES_DIR — например, чтобы нагрузочный тест не писал в картинки рабочего бота
+IMAGES_DIR = pathlib.Path(os.getenv("IMAGES_DIR") or ROOT / "images")
+THUMBS_DIR = IMAGES_DIR / "thumbs"
+
+# Больше Telegram всё равно не покажет; миниатюра — для инлайн-выдачи и списков
+MAX_SIDE = 1920
+THUMB_SIDE = 320
+JPEG_QUALITY = 85
+
+_pool = None
+
+# Сколько байт сэкономили за время работы (перекодирование + дубликаты)
+stats = {"processed": 0, "deduplicated": 0, "bytes_in": 0, "bytes_stored": 0}
+
+
+def _write_atomic(path: pathlib.Path, payload: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, path)
+
+
+def _encode(raw: bytes):
+    """
+    Перекодирует картинку в JPEG ограниченного размера + миниатюру.
+    Метаданные (EXIF и т.п.) не переносятся. Без Pillow возвращает (None, None).
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None, None
+
+    with Image.open(io.BytesIO(raw)) as src:
+        img = ImageOps.exif_transpose(src)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+        thumb = img.copy()
+        thumb.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.LANCZOS)
+        thumb_out = io.BytesIO()
+        thumb.save(thumb_out, "JPEG", quality=80, optimize=True)
+    return out.getvalue(), thumb_out.getvalue()
+
+
+def process_image(raw: bytes) -> dict:
+    """
+    Выполняется в отдельном процессе. Кладёт картинку в images/<sha256>.jpg,
+    миниатюру — в images/thumbs/<sha256>.jpg. Хэш считается по исходным байтам,
+    поэтому одинаковые скриншоты хранятся один раз и повторно не перекодируются.
+    """
+    sha = hashlib.sha256(raw).hexdigest()
+    image_path = IMAGES_DIR / f"{sha}.jpg"
+    thumb_path = THUMBS_DIR / f"{sha}.jpg"
+
+    if image_path.exists():
+        return {
+            "image": str(image_path),
+            "thumb": str(thumb_path) if thumb_path.exists() else "",
+            "sha256": sha,
+            "bytes_in": len(raw),
+            "bytes_stored": 0,
+            "deduplicated": True,
+        }
+
+    IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+
+    encoded, thumb = _encode(raw)
+    if encoded is None:
+        # Pillow не установлен — сохраняем как есть
+        encoded = raw
+    _write_atomic(image_path, encoded)
+    if thumb is not None:
+        _write_atomic(thumb_path, thumb)
+
+    return {
+        "image": str(image_path),
+        "thumb": str(thumb_path) if thumb is not None else "",
+        "sha256": sha,
+        "bytes_in": len(raw),
+        "bytes_stored": len(encoded) + (len(thumb) if thumb else 0),
+        "deduplicated": False,
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: в процессе бота уже есть потоки
+        _pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def process_upload(raw: bytes) -> dict:
+    """
+    Обрабатывает загруженный скриншот в пуле процессов, не блокируя event loop.
+    Возвращает пути к картинке/миниатюре и сколько байт удалось сэкономить.
+    """
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_get_pool(), process_image, bytes(raw))
+
+    result["bytes_saved"] = result["bytes_in"] - result["bytes_stored"]
+    stats["processed"] += 1
+    stats["deduplicated"] += result["deduplicated"]
+    stats["bytes_in"] += result["bytes_in"]
+    stats["bytes_stored"] += result["bytes_stored"]
+    logging.info(
+        "[IMG] %s: %d → %d байт%s",
+        result["sha256"][:12], result["bytes_in"], result["bytes_stored"],
+        " (дубликат)" if result["deduplicated"] else "",
+    )
+    return result
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
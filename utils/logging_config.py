@@ -1,10 +1,175 @@
+"""
+Логирование бота.
+
+Корневой логгер пишет только в очередь (QueueHandler): запись лога в хэндлере
+стоит одной постановки в queue.SimpleQueue, а файлы, ротация и буфер /log
+обслуживаются отдельным потоком QueueListener — event loop на диске не ждёт.
+
+К каждой записи добавляются поля апдейта, в котором она сделана (их ставит
+обёртка хэндлеров из utils.metrics): update_id, user_id, handler и duration_ms —
+сколько хэндлер уже работал к моменту записи. LOG_FORMAT=json переключает
+info.log / error.log на JSON Lines с этими полями, LOG_UPDATES=1 добавляет
+по строке на каждый обработанный апдейт — для разбора логов пачкой.
+"""
+import atexit
+import contextvars
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
 from pathlib import Path
 
+# Сколько последних записей держит в памяти кольцевой буфер для /log
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+# Длинные сообщения (трейсбеки) в буфере обрезаются
+LOG_ENTRY_MAX = 2000
+LOG_JSON = os.getenv("LOG_FORMAT", "").strip().lower() == "json"
+LOG_UPDATES = os.getenv("LOG_UPDATES", "").strip().lower() in ("1", "true", "yes")
+
+# Поля апдейта, который сейчас обрабатывается: {"handler", "update_id", "user_id", "started"}
+update_context = contextvars.ContextVar("update_context", default=None)
+CONTEXT_FIELDS = ("update_id", "user_id", "handler", "duration_ms")
+_exc_formatter = logging.Formatter()
+
+
+class ContextFilter(logging.Filter):
+    """Переносит поля апдейта из контекста в запись — до того, как она уйдёт в другой поток."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = update_context.get()
+        values = {"update_id": None, "user_id": None, "handler": None, "duration_ms": None}
+        if ctx is not None:
+            values.update(
+                update_id=ctx["update_id"], user_id=ctx["user_id"], handler=ctx["handler"],
+                duration_ms=round((time.perf_counter() - ctx["started"]) * 1000, 2),
+            )
+        for field, value in values.items():
+            # Явно переданное через extra= не перетираем
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Как QueueHandler, но трейсбек остаётся отдельно от текста (в exc_text):
+    файлы получают привычный формат, JSON — отдельное поле exc.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON; пустые поля апдейта опускаются."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Последние LOG_BUFFER_SIZE записей лога в памяти, уже разобранные по полям:
+    время, уровень, логгер, хэндлер бота, текст. /log фильтрует и листает их
+    без journalctl — одинаково под systemd и без него.
+    """
+
+    def __init__(self, capacity: int = LOG_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        # Каждый запрос к Bot API httpx пишет в INFO — в буфере они вытеснили бы всё остальное
+        # (задержки вызовов API и так есть в /metrics)
+        if record.name.startswith("httpx") and record.levelno < logging.WARNING:
+            return
+        try:
+            message = record.getMessage()
+            if record.exc_info and not record.exc_text:
+                record.exc_text = _exc_formatter.formatException(record.exc_info)
+            if record.exc_text:
+                message += "\n" + record.exc_text
+        except Exception:
+            self.handleError(record)
+            return
+        handler = getattr(record, "handler", None)
+        if handler is None and update_context.get() is not None:
+            handler = update_context.get()["handler"]
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "levelno": record.levelno,
+            "logger": record.name,
+            "handler": handler,
+            "message": message[:LOG_ENTRY_MAX],
+        }
+        with self._lock:
+            self.records.append(entry)
+
+    def query(self, level: int = logging.NOTSET, logger: str = None, handler: str = None,
+              since: float = None, until: float = None) -> list:
+        """
+        Записи по фильтрам, от новых к старым. logger — префикс имени
+        («telegram» найдёт «telegram.ext.Application»), handler — часть имени.
+        """
+        with self._lock:
+            records = list(self.records)
+        result = []
+        for entry in reversed(records):
+            if until is not None and entry["time"] > until:
+                continue
+            if since is not None and entry["time"] < since:
+                break
+            if entry["levelno"] < level:
+                continue
+            if logger and not (entry["logger"] == logger or entry["logger"].startswith(logger + ".")):
+                continue
+            if handler and handler not in (entry["handler"] or ""):
+                continue
+            result.append(entry)
+        return result
+
+    def stats(self) -> dict:
+        return {"size": len(self.records), "capacity": self.records.maxlen}
+
+
+log_buffer = RingBufferHandler()
+_listener = None
+
+
 def configure_logging():
-    logs_dir = Path(__file__).resolve().parent.parent / "logs"
-    logs_dir.mkdir(exist_ok=True)
+    global _listener
+    # LOG_DIR — например, чтобы нагрузочный тест не писал в логи рабочего бота
+    logs_dir = Path(os.getenv("LOG_DIR") or Path(__file__).resolve().parent.parent / "logs")
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    formatter = JsonFormatter() if LOG_JSON else logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 
     info = RotatingFileHandler(logs_dir / "info.log", maxBytes=1_000_000, backupCount=3, encoding="utf-8")
     info.setLevel(logging.INFO)
@@ -13,8 +178,22 @@ def configure_logging():
     err = RotatingFileHandler(logs_dir / "error.log", maxBytes=1_000_000, backupCount=3, encoding="utf-8")
     err.setLevel(logging.WARNING)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[info, err]
-    )
+    for handler in (info, err):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    to_queue = _QueueHandler(log_queue)
+    to_queue.addFilter(ContextFilter())
+    _listener = QueueListener(log_queue, info, err, log_buffer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    logging.basicConfig(level=logging.INFO, handlers=[to_queue])
+
+
+def shutdown_logging():
+    """Дописывает очередь на диск (перед os._exit в /restart и при выходе)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
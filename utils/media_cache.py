@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from utils import aio
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+CACHE_PATH = ROOT / "database" / "file_ids.json"
+
+
+def file_sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileIdCache:
+    """
+    Кэш «картинка → file_id Telegram», чтобы не загружать один и тот же JPEG заново.
+
+    Ключ — хэш содержимого: одинаковые скриншоты под разными путями делят один file_id.
+    Для каждого пути запоминаем (mtime, size, sha256), чтобы не хэшировать файл
+    на каждый просмотр — хэш пересчитывается только если файл поменялся.
+    Кэш лежит в database/file_ids.json.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._by_hash: dict = {}
+        self._paths: dict = {}
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._by_hash = data.get("by_hash", {})
+            self._paths = data.get("paths", {})
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось загрузить кэш file_id: {e}")
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps({"by_hash": self._by_hash, "paths": self._paths}, ensure_ascii=False)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def _content_hash(self, image: str):
+        """sha256 файла; пересчитывается только если изменились mtime/size."""
+        try:
+            st = os.stat(image)
+        except OSError:
+            entry = self._paths.get(image)
+            return entry["sha256"] if entry else None
+        entry = self._paths.get(image)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry["sha256"]
+        sha = file_sha256(image)
+        self._paths[image] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha}
+        return sha
+
+    def get(self, image: str):
+        """file_id для картинки или None, если её ещё не отправляли."""
+        with self._lock:
+            self._load()
+            sha = self._content_hash(image)
+            file_id = self._by_hash.get(sha) if sha else None
+        if file_id:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return file_id
+
+    def put(self, image: str, file_id: str):
+        with self._lock:
+            self._load()
+            sha = self._content_hash(image)
+            if not sha or self._by_hash.get(sha) == file_id:
+                return
+            self._by_hash[sha] = file_id
+        self._schedule_save()
+
+    def forget(self, image: str):
+        """Убирает file_id (например, если Telegram его больше не принимает)."""
+        with self._lock:
+            self._load()
+            sha = self._content_hash(image)
+            if not sha or self._by_hash.pop(sha, None) is None:
+                return
+        self._schedule_save()
+
+    def _schedule_save(self):
+        aio.submit(self._save)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._by_hash), "hits": self.hits, "misses": self.misses}
+
+
+file_ids = FileIdCache(os.getenv("FILE_IDS_PATH") or CACHE_PATH)
@@ -0,0 +1,209 @@
+"""
+Метрики производительности: хэндлеры, вызовы Bot API, хранилище.
+
+Каждый хэндлер из bot.py оборачивается в instrument(app): на апдейт — два
+perf_counter и запись в гистограмму (несколько микросекунд). Вызовы Bot API
+меряет rate limiter, запросы к хранилищу — repository и build_store.
+
+Наружу метрики уходят двумя путями:
+  • текстовый файл в формате Prometheus (METRICS_PATH, по умолчанию
+    database/metrics.prom, обновляется раз в METRICS_INTERVAL секунд) —
+    подхватывается textfile-коллектором node_exporter;
+  • админская команда /metrics: p50/p95/p99 по хэндлерам.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import pathlib
+import threading
+import time
+from collections import deque
+
+from telegram.ext import CommandHandler, ConversationHandler
+
+from utils import aio
+from utils.logging_config import LOG_UPDATES, update_context
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+METRICS_PATH = pathlib.Path(os.getenv("METRICS_PATH") or ROOT / "database" / "metrics.prom")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# По скольким последним замерам считаются перцентили в /metrics
+RECENT_SAMPLES = 2048
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "errors", "recent", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.sum += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+            self.recent.append(seconds)
+
+    def quantiles(self, *qs) -> list:
+        with self._lock:
+            ordered = sorted(self.recent)
+        if not ordered:
+            return [0.0] * len(qs)
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs]
+
+
+class Family:
+    """Гистограммы одной метрики с одной меткой (хэндлер, метод API, операция БД)."""
+
+    def __init__(self, name: str, label: str, help_text: str):
+        self.name = name
+        self.label = label
+        self.help = help_text
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def get(self, value: str) -> Histogram:
+        hist = self.series.get(value)
+        if hist is None:
+            with self._lock:
+                hist = self.series.setdefault(value, Histogram())
+        return hist
+
+    def observe(self, value: str, seconds: float, error: bool = False):
+        self.get(value).observe(seconds, error)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name}_seconds {self.help}", f"# TYPE {self.name}_seconds histogram"]
+        errors = []
+        for value, hist in sorted(self.series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for le, n in zip((*BUCKETS, "+Inf"), hist.counts):
+                cumulative += n
+                lines.append(f'{self.name}_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_seconds_sum{{{label}}} {hist.sum:.6f}")
+            lines.append(f"{self.name}_seconds_count{{{label}}} {hist.count}")
+            errors.append(f"{self.name}_errors_total{{{label}}} {hist.errors}")
+        lines += [f"# TYPE {self.name}_errors_total counter", *errors]
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.handlers = Family("ndsborki_handler", "handler", "Время обработки апдейта хэндлером")
+        self.api = Family("ndsborki_bot_api", "method", "Длительность вызовов Bot API")
+        self.db = Family("ndsborki_db", "op", "Запросы к хранилищу сборок и загрузка базы")
+        self._gauges = []  # (имя, описание, функция → {значение метки: число} или число)
+
+    def gauge(self, name: str, help_text: str, func, label: str = None):
+        """Показатель, который считается в момент выгрузки (глубина очереди и т.п.)."""
+        self._gauges.append((name, help_text, func, label))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for family in (self.handlers, self.api, self.db):
+            lines += family.render()
+        for name, help_text, func, label in self._gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            try:
+                value = func()
+            except Exception:
+                logging.exception(f"[METRICS] Не удалось посчитать {name}")
+                continue
+            if isinstance(value, dict):
+                lines += [f'{name}{{{label}="{_escape(k)}"}} {v}' for k, v in value.items()]
+            else:
+                lines.append(f"{name} {value}")
+        lines.append(f"ndsborki_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    async def export_loop(self, path: pathlib.Path = METRICS_PATH, interval: float = METRICS_INTERVAL):
+        """Фоновая задача: переписывает .prom файл (атомарно, через rename)."""
+        while True:
+            try:
+                await aio.write_text(path, self.render_prometheus())
+            except Exception:
+                logging.exception("[METRICS] Не удалось записать файл метрик")
+            await asyncio.sleep(interval)
+
+
+metrics = Metrics()
+
+
+# --- Обёртка хэндлеров ---
+
+def _timed(hist: Histogram, callback, name: str):
+    async def timed(update, context):
+        started = time.perf_counter()
+        # Поля апдейта попадают во все записи лога, сделанные во время обработки (см. utils.logging_config)
+        user = getattr(update, "effective_user", None)
+        token = update_context.set({
+            "handler": name,
+            "update_id": getattr(update, "update_id", None),
+            "user_id": user.id if user else None,
+            "started": started,
+        })
+        error = False
+        try:
+            return await callback(update, context)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            hist.observe(elapsed, error)
+            if LOG_UPDATES:
+                logging.info(f"[UPDATE] {name}" + (" ❗" if error else ""), extra={"duration_ms": round(elapsed * 1000, 2)})
+            update_context.reset(token)
+    return timed
+
+
+def _handler_name(handler, prefix: str = "") -> str:
+    if isinstance(handler, CommandHandler):
+        name = "/" + sorted(handler.commands)[0]
+    else:
+        name = getattr(handler.callback, "__name__", type(handler).__name__)
+    return f"{prefix}{name}"
+
+
+def _instrument_handler(handler, seen: set, prefix: str = ""):
+    # Один и тот же хэндлер может стоять в нескольких состояниях диалога
+    if id(handler) in seen:
+        return
+    seen.add(id(handler))
+    if isinstance(handler, ConversationHandler):
+        conv_prefix = f"{handler.name or 'conversation'}:"
+        inner = [*handler.entry_points, *handler.fallbacks]
+        for state_handlers in handler.states.values():
+            inner += state_handlers
+        for h in inner:
+            _instrument_handler(h, seen, conv_prefix)
+        return
+    name = _handler_name(handler, prefix)
+    handler.callback = _timed(metrics.handlers.get(name), handler.callback, name)
+
+
+def instrument(app):
+    """Оборачивает все зарегистрированные хэндлеры (вызывать после add_handler)."""
+    seen = set()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler, seen)
+    logging.info(f"[METRICS] Хэндлеров под замером: {len(seen)}")
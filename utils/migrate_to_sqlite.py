@@ -0,0 +1,55 @@
+"""
+Разовый перенос сборок из builds.json (+ журнал) в SQLite.
+
+    python -m utils.migrate_to_sqlite [--json database/builds.json] [--db database/builds.sqlite3] [--force]
+
+json.load сам разворачивает \\uXXXX-последовательности, поэтому файлы,
+сохранённые с ensure_ascii (как писал старый delete_confirm), переносятся так же.
+Старые сборки с русским названием типа вместо ключа приводятся к ключу из types.json.
+id сборок сохраняются, чтобы ссылки на них (кнопки, кэши) остались рабочими.
+"""
+import argparse
+import logging
+import pathlib
+import sys
+
+from utils.build_store import BuildStore, DB_PATH
+from utils.module_catalog import catalog, TypeRegistry
+from utils.sqlite_store import SqliteBuildStore, SQLITE_PATH
+
+
+def normalize_build(build: dict, registry: TypeRegistry) -> dict:
+    build = dict(build)
+    type_value = build.get("type", "")
+    build["type"] = registry.key_for(type_value) or type_value
+    build["modules"] = build.get("modules") or {}
+    return build
+
+
+def migrate(json_path: pathlib.Path, db_path: pathlib.Path, force: bool = False) -> int:
+    builds = BuildStore(json_path).get_all()
+    registry = catalog.type_registry()
+
+    target = SqliteBuildStore(db_path)
+    existing = target.total()
+    if existing and not force:
+        raise SystemExit(f"❌ В {db_path} уже есть {existing} сборок. Запустите с --force, чтобы перезалить.")
+    # Очистка и перенос — одна транзакция: при ошибке старые данные остаются
+    return target.add_many([normalize_build(b, registry) for b in builds], replace=bool(existing))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенос builds.json в SQLite")
+    parser.add_argument("--json", type=pathlib.Path, default=DB_PATH)
+    parser.add_argument("--db", type=pathlib.Path, default=SQLITE_PATH)
+    parser.add_argument("--force", action="store_true", help="очистить SQLite перед переносом")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    count = migrate(args.json, args.db, args.force)
+    print(f"✅ Перенесено сборок: {count} → {args.db}")
+    print("Включите хранилище: BUILDS_BACKEND=sqlite в .env")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
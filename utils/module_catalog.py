@@ -0,0 +1,259 @@
+"""
+Каталог модулей и типов оружия.
+
+Единственное место, которое знает, в каком файле лежат модули каждого типа.
+Всё читается один раз при старте: варианты модулей, переводы en→ru и ru→en,
+готовые клавиатуры для диалога добавления. Фоновая задача раз в
+CHECK_INTERVAL секунд сверяет mtime файлов modules-*.json и types.json и при
+изменении перечитывает их; новая версия подменяет старую целиком, поэтому
+хэндлер никогда не увидит наполовину обновлённые данные.
+"""
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import threading
+from types import MappingProxyType
+
+from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
+
+from utils import aio
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+DB_DIR = ROOT / "database"
+TYPES_FILE = "types.json"
+
+# Маппинг ключей оружия на файлы модулей
+FILE_MAP = {
+    "assault":  "modules-assault.json",
+    "battle":   "modules-battle.json",
+    "smg":      "modules-pp.json",
+    "shotgun":  "modules-drobovik.json",
+    "marksman": "modules-pehotnay.json",
+    "lmg":      "modules-pulemet.json",
+    "sniper":   "modules-snayperki.json",
+    "pistol":   "modules-pistolet.json",
+    "special":  "modules-osoboe.json",
+}
+
+# Как часто (сек) проверять, не поменялись ли файлы на диске
+CHECK_INTERVAL = 5.0
+
+
+def _rows(items: list, per_row: int = 2) -> list:
+    return [items[i:i + per_row] for i in range(0, len(items), per_row)]
+
+
+class TypeRegistry:
+    """
+    Неизменяемый реестр типов оружия из types.json: ключ ↔ ярлык за O(1)
+    и порядок типов как в файле.
+    """
+
+    __slots__ = ("keys", "labels", "_label_by_key", "_key_by_label", "_order")
+
+    def __init__(self, types: list):
+        pairs = [(t["key"], t["label"]) for t in types if t.get("key")]
+        self.keys = tuple(k for k, _ in pairs)
+        self.labels = tuple(lbl for _, lbl in pairs)
+        self._label_by_key = MappingProxyType(dict(pairs))
+        self._key_by_label = MappingProxyType({lbl: k for k, lbl in pairs})
+        self._order = MappingProxyType({k: i for i, k in enumerate(self.keys)})
+
+    def label(self, key: str) -> str:
+        """Ярлык по ключу; если ключ не найден — сам ключ."""
+        return self._label_by_key.get(key, key)
+
+    def key_for(self, label: str):
+        """Ключ по ярлыку или None."""
+        return self._key_by_label.get(label)
+
+    def order(self, key: str) -> int:
+        """Позиция типа в types.json (неизвестные — в конец)."""
+        return self._order.get(key, len(self.keys))
+
+    def __contains__(self, key) -> bool:
+        return key in self._label_by_key
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+
+class _CatalogData:
+    """Неизменяемый снимок каталога; после сборки не меняется."""
+
+    def __init__(self, types: list, variants: dict, version: int, missing: set):
+        self.version = version
+        self.types = types
+        self.variants = variants
+        self.missing = missing
+
+        self.en_ru = {}
+        self.ru_en = {}
+        self.module_keyboards = {}
+        self.variant_keyboards = {}
+        for type_key, groups in variants.items():
+            en_ru, ru_en = {}, {}
+            # raw: { категория: [ { "en": "...", "ru": "..." }, ... ], ... }
+            for entries in groups.values():
+                for entry in entries:
+                    en, ru = entry.get("en"), entry.get("ru")
+                    if en and ru:
+                        en_ru[en] = ru
+                        ru_en[ru] = en
+            self.en_ru[type_key] = en_ru
+            self.ru_en[type_key] = ru_en
+            self.module_keyboards[type_key] = ReplyKeyboardMarkup(_rows(list(groups)), resize_keyboard=True)
+            self.variant_keyboards[type_key] = {
+                module: InlineKeyboardMarkup(
+                    [[InlineKeyboardButton(v["en"], callback_data=v["en"])] for v in entries]
+                )
+                for module, entries in groups.items()
+            }
+
+        self.type_registry = TypeRegistry(types)
+        labels = list(self.type_registry.labels)
+        self.type_keyboard = ReplyKeyboardMarkup(_rows(labels), resize_keyboard=True) if labels else None
+
+
+class ModuleCatalog:
+    """
+    Каталог модулей: варианты, переводы и клавиатуры для каждого типа оружия.
+
+    Чтение — из памяти, без блокировок: текущий снимок подменяется одной
+    операцией присваивания. Если файл при перезагрузке не читается (например,
+    его прямо сейчас правят), для этого типа остаются прежние данные.
+    """
+
+    def __init__(self, db_dir: pathlib.Path):
+        self.db_dir = pathlib.Path(db_dir)
+        self._data = None
+        self._fingerprint = None
+        self._load_lock = threading.Lock()
+        self.reloads = 0
+
+    def _files(self) -> list:
+        return [TYPES_FILE, *FILE_MAP.values()]
+
+    def _stat_files(self) -> tuple:
+        fingerprint = []
+        for fname in self._files():
+            try:
+                st = os.stat(self.db_dir / fname)
+                fingerprint.append((fname, st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append((fname, None, None))
+        return tuple(fingerprint)
+
+    def _read(self, fname: str, fallback):
+        path = self.db_dir / fname
+        if not path.exists():
+            return None
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"❌ Не удалось загрузить {path}: {e}")
+            return fallback
+
+    def refresh(self, force: bool = False) -> bool:
+        """Перечитывает файлы, если они изменились. Возвращает True, если каталог обновился."""
+        with self._load_lock:
+            fingerprint = self._stat_files()
+            if not force and fingerprint == self._fingerprint:
+                return False
+            old = self._data
+
+            types = self._read(TYPES_FILE, old.types if old else [])
+            variants, missing = {}, set()
+            for type_key, fname in FILE_MAP.items():
+                raw = self._read(fname, old.variants.get(type_key) if old else None)
+                if raw is None:
+                    missing.add(type_key)
+                    continue
+                variants[type_key] = raw
+
+            if missing and (old is None or missing != old.missing):
+                logging.warning(f"⚠️ Нет файлов модулей для типов: {', '.join(sorted(missing))}")
+            version = old.version + 1 if old else 0
+            self._data = _CatalogData(types or [], variants, version, missing)
+            self._fingerprint = fingerprint
+            if old is not None:
+                self.reloads += 1
+                logging.info(f"[CATALOG] Файлы модулей изменились — каталог перечитан (версия {version})")
+            return True
+
+    @property
+    def data(self) -> _CatalogData:
+        if self._data is None:
+            self.refresh()
+        return self._data
+
+    async def watch(self):
+        """Фоновая проверка файлов; запускается из on_startup."""
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await aio.run(self.refresh)
+            except Exception:
+                logging.exception("[CATALOG] Ошибка перезагрузки каталога")
+
+    # --- Доступ к данным ---
+
+    @property
+    def version(self) -> int:
+        return self.data.version
+
+    def types(self) -> list:
+        """Список типов оружия из types.json: [{"key": ..., "label": ...}, ...]"""
+        return self.data.types
+
+    def type_registry(self) -> TypeRegistry:
+        return self.data.type_registry
+
+    def type_label(self, type_key: str) -> str:
+        return self.data.type_registry.label(type_key)
+
+    def variants(self, type_key: str):
+        """{категория модуля: [{"en": ..., "ru": ...}, ...]} или None, если модули не настроены."""
+        return self.data.variants.get(type_key)
+
+    def translations(self, type_key: str) -> dict:
+        """{английское имя модуля: русское}"""
+        return self.data.en_ru.get(type_key, {})
+
+    def reverse_translations(self, type_key: str) -> dict:
+        """{русское имя модуля: английское}"""
+        return self.data.ru_en.get(type_key, {})
+
+    def type_keyboard(self):
+        return self.data.type_keyboard
+
+    def module_keyboard(self, type_key: str):
+        return self.data.module_keyboards.get(type_key)
+
+    def variant_keyboard(self, type_key: str, module: str):
+        return self.data.variant_keyboards.get(type_key, {}).get(module)
+
+    def file_status(self) -> list:
+        """[(тип, файл, найден ли)] — по состоянию на последнюю проверку."""
+        missing = self.data.missing
+        return [(key, fname, key not in missing) for key, fname in FILE_MAP.items()]
+
+    def stats(self) -> dict:
+        data = self.data
+        return {
+            "version": data.version,
+            "types": len(data.types),
+            "files": len(data.variants),
+            "missing": sorted(data.missing),
+            "reloads": self.reloads,
+        }
+
+
+catalog = ModuleCatalog(DB_DIR)
@@ -1,3 +1,4 @@
+import functools
 import os
 from dotenv import load_dotenv
 
@@ -9,6 +10,7 @@ raw_users = os.getenv("ALLOWED_USERS", "")
 ALLOWED_USERS = [int(uid) for uid in raw_users.split(",") if uid.strip().isdigit()]
 
 def admin_only(func):
+    @functools.wraps(func)
     async def wrapper(update, context):
         user_id = update.effective_user.id
         if user_id not in ALLOWED_USERS:
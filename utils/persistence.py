@@ -0,0 +1,244 @@
+"""
+Сохранение состояния диалогов и user_data между перезапусками.
+
+Хранилище — маленькая SQLite-база database/state.sqlite3 (JSON в колонке на каждого
+пользователя / на каждый ключ диалога). Application раз в update_interval
+секунд отдаёт только изменённые записи; мы копим их и пишем одной транзакцией.
+user_data пользователя читается с диска при первом его апдейте, а не при старте,
+поэтому старт не зависит от количества пользователей.
+"""
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from utils import aio
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+STATE_PATH = ROOT / "database" / "state.sqlite3"
+
+# Через сколько секунд после изменения записи уходят на диск
+FLUSH_DELAY = 1.0
+
+# Ключи user_data, которые не сохраняем: их можно восстановить или они тяжёлые
+TRIMMED_KEYS = {"module_variants", "delete_map"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id  INTEGER PRIMARY KEY,
+    data     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name   TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    state  TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def trim_user_data(data: dict) -> dict:
+    """Копия user_data без тяжёлых и несериализуемых значений."""
+    trimmed = {}
+    for key, value in data.items():
+        if key in TRIMMED_KEYS:
+            continue
+        try:
+            _dumps(value)
+        except (TypeError, ValueError):
+            logging.debug(f"[STATE] Пропускаю несериализуемое значение user_data[{key!r}]")
+            continue
+        trimmed[key] = value
+    return trimmed
+
+
+def restore_user_data(data: dict) -> dict:
+    """Возвращает то, что вырезал trim_user_data (варианты модулей — из каталога)."""
+    if "type" in data and "module_options" in data and "module_variants" not in data:
+        from utils.module_catalog import catalog
+        variants = catalog.variants(data["type"])
+        if variants is not None:
+            data["module_variants"] = variants
+    return data
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Persistence для python-telegram-bot: user_data и состояния ConversationHandler.
+    chat_data, bot_data и callback_data бот не использует — они не хранятся.
+    """
+
+    def __init__(self, path: pathlib.Path = STATE_PATH, update_interval: float = 30):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = pathlib.Path(path)
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._loaded_users = set()
+        self._dirty_users = {}          # user_id -> dict или None (удалить)
+        self._dirty_conversations = {}  # (name, key) -> state или None (удалить)
+        self._flush_task = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    # --- Работа с базой (в пуле потоков) ---
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _load_user(self, user_id: int):
+        with self._db_lock:
+            row = self._db().execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_conversations(self, name: str) -> dict:
+        with self._db_lock:
+            rows = self._db().execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    def _write(self, users: dict, conversations: dict):
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                for user_id, data in users.items():
+                    if data is None:
+                        conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                            (user_id, _dumps(data)),
+                        )
+                for (name, key), state in conversations.items():
+                    if state is None:
+                        conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                            (name, key, _dumps(state)),
+                        )
+        self.flushes += 1
+        self.rows_written += len(users) + len(conversations)
+
+    # --- Пакетная запись ---
+
+    def _take_dirty(self):
+        users, self._dirty_users = self._dirty_users, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        return users, conversations
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Ждём, пока Application отдаст все изменения этого прохода
+        await asyncio.sleep(FLUSH_DELAY)
+        users, conversations = self._take_dirty()
+        if users or conversations:
+            try:
+                await aio.run(self._write, users, conversations)
+            except Exception:
+                logging.exception("[STATE] Не удалось сохранить состояние")
+
+    async def flush(self):
+        """Вызывается при остановке (и перед рестартом): пишет всё, что накопилось."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        users, conversations = self._take_dirty()
+        if users or conversations:
+            await aio.run(self._write, users, conversations)
+
+    # --- BasePersistence: user_data (лениво) ---
+
+    async def get_user_data(self) -> dict:
+        # Ничего не читаем заранее — см. refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        stored = await aio.run(self._load_user, user_id)
+        if stored:
+            for key, value in restore_user_data(stored).items():
+                user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._loaded_users.add(user_id)
+        self._dirty_users[user_id] = trim_user_data(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int):
+        self._dirty_users[user_id] = None
+        self._schedule_flush()
+
+    # --- BasePersistence: диалоги ---
+
+    async def get_conversations(self, name: str) -> dict:
+        return await aio.run(self._load_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        self._dirty_conversations[(name, _dumps(list(key)))] = new_state
+        self._schedule_flush()
+
+    # --- Не используются ботом ---
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "loaded_users": len(self._loaded_users),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
+
+
+def make_persistence() -> SqlitePersistence:
+    """Persistence для ApplicationBuilder; путь и интервал можно задать в .env."""
+    return SqlitePersistence(
+        os.getenv("STATE_PATH") or STATE_PATH,
+        update_interval=float(os.getenv("STATE_UPDATE_INTERVAL", "30")),
+    )
@@ -0,0 +1,312 @@
+"""
+Планировщик исходящих запросов к Bot API.
+
+Все вызовы бота (reply_text, edit_message_*, send_message…) проходят через
+Application.rate_limiter. Запросы в чат ограничиваются двумя ведрами токенов:
+общим на бота (Telegram: ~30 сообщений в секунду) и своим на каждый чат
+(~1 в секунду в личке с небольшим запасом, 20 в минуту в группах). Запросы без
+chat_id (getUpdates, answerCallbackQuery, answerInlineQuery) не ограничиваются.
+
+В общей очереди первыми идут интерактивные правки (edit*, deleteMessage —
+ответ на нажатие кнопки), затем обычные ответы, затем массовые рассылки.
+Рассылка помечает свои вызовы: bot.send_message(..., rate_limit_args={"priority": BULK}).
+Интерактивные правки считаются по своему, более свободному ведру чата
+(RATE_EDIT_PER_SEC, RATE_EDIT_BURST): листание карточек не ждёт лимита,
+рассчитанного на новые сообщения, — строгое ведро остаётся для отправок и рассылок.
+
+RetryAfter (429) обрабатывается здесь же: чат (или весь бот, если чата нет)
+ставится на паузу на указанное время, запрос повторяется до max_retries раз.
+
+Настройки в .env: RATE_GLOBAL_PER_SEC, RATE_CHAT_PER_SEC, RATE_CHAT_BURST,
+RATE_GROUP_PER_MIN, RATE_EDIT_PER_SEC, RATE_EDIT_BURST, RATE_MAX_RETRIES.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.metrics import metrics
+
+# Приоритеты: меньше — раньше
+INTERACTIVE, NORMAL, BULK = range(3)
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+INTERACTIVE_PREFIXES = ("edit", "deletemessage", "stopmessagelivelocation")
+
+# Сколько последних ожиданий держим для перцентилей
+WAIT_SAMPLES = 1000
+# Когда вёдер чатов больше — выбрасываем полные (давно молчащие чаты)
+MAX_CHAT_BUCKETS = 10_000
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до свободного токена (не забирая его)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен в долг и возвращает, сколько ждать до его наступления."""
+        wait = self.delay(now)
+        self.tokens -= 1
+        return max(wait, 0.0)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class _PriorityGate:
+    """
+    Общее ведро бота с очередью по приоритету. Пока очередь пуста, токен
+    берётся сразу; иначе ожидающих по одному отпускает фоновая задача.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters = []  # (приоритет, порядковый номер, future)
+        self._seq = itertools.count()
+        self._pump_task = None
+
+    def depth(self) -> dict:
+        counts = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                counts[PRIORITY_NAMES[priority]] += 1
+        return counts
+
+    async def acquire(self, priority: int):
+        if not self._waiters and self.bucket.delay(time.monotonic()) <= 0:
+            self.bucket.take()
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await fut
+
+    async def _pump(self):
+        while self._waiters:
+            wait = self.bucket.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():  # ожидающий отменён
+                continue
+            self.bucket.take()
+            fut.set_result(None)
+
+    def close(self):
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+        for _, _, fut in self._waiters:
+            if not fut.done():
+                fut.cancel()
+        self._waiters.clear()
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    def __init__(
+        self,
+        global_per_sec: float = 30,
+        chat_per_sec: float = 1,
+        chat_burst: float = 3,
+        group_per_min: float = 20,
+        edit_per_sec: float = 5,
+        edit_burst: float = 10,
+        max_retries: int = 3,
+    ):
+        self.global_per_sec = global_per_sec
+        self.chat_per_sec = chat_per_sec
+        self.chat_burst = chat_burst
+        self.group_per_min = group_per_min
+        self.edit_per_sec = edit_per_sec
+        self.edit_burst = edit_burst
+        self.max_retries = max_retries
+        self._gate = _PriorityGate(TokenBucket(global_per_sec, global_per_sec))
+        self._chats = {}
+        self._edit_chats = {}
+        # Метрики
+        self.requests = 0
+        self.delayed = 0
+        self.retry_after = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._chat_waiting = 0
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._gate.close()
+
+    # --- Классификация запроса ---
+
+    @staticmethod
+    def _priority(endpoint: str, rate_limit_args) -> int:
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            return rate_limit_args["priority"]
+        return INTERACTIVE if endpoint.lower().startswith(INTERACTIVE_PREFIXES) else NORMAL
+
+    def _chat_bucket(self, chat_id, priority: int = NORMAL) -> TokenBucket:
+        """Ведро чата: для интерактивных правок в личке своё, для остального строгое."""
+        # Отрицательный id или @username — группа/канал
+        group = isinstance(chat_id, str) or chat_id < 0
+        interactive = priority == INTERACTIVE and not group
+        buckets = self._edit_chats if interactive else self._chats
+        bucket = buckets.get(chat_id)
+        if bucket is None:
+            if len(buckets) >= MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                buckets = {k: b for k, b in buckets.items() if not b.idle(now)}
+                if interactive:
+                    self._edit_chats = buckets
+                else:
+                    self._chats = buckets
+            if group:
+                bucket = TokenBucket(self.group_per_min / 60, self.chat_burst)
+            elif interactive:
+                bucket = TokenBucket(self.edit_per_sec, self.edit_burst)
+            else:
+                bucket = TokenBucket(self.chat_per_sec, self.chat_burst)
+            buckets[chat_id] = bucket
+        return bucket
+
+    # --- BaseRateLimiter ---
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+        priority = self._priority(endpoint, rate_limit_args)
+        max_retries = self.max_retries
+        if isinstance(rate_limit_args, dict):
+            max_retries = rate_limit_args.get("max_retries", max_retries)
+
+        self.requests += 1
+        for attempt in range(max_retries + 1):
+            if chat_id is not None:
+                await self._wait_turn(chat_id, priority)
+            else:
+                pause = self._gate.bucket.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+
+            self.in_flight += 1
+            started = time.perf_counter()
+            error = True
+            try:
+                result = await callback(*args, **kwargs)
+                error = False
+                return result
+            except RetryAfter as e:
+                self.retry_after += 1
+                if attempt == max_retries:
+                    self.failed += 1
+                    logging.error(f"[RATE] {endpoint}: 429 после {max_retries} повторов, сдаюсь")
+                    raise
+                logging.warning(f"[RATE] {endpoint} chat={chat_id}: 429, пауза {e.retry_after} с")
+                if chat_id is None:
+                    self._gate.bucket.pause(e.retry_after + 0.1)
+                else:
+                    # 429 относится ко всему чату — паузу получают оба его ведра
+                    for p in (NORMAL, INTERACTIVE):
+                        self._chat_bucket(chat_id, p).pause(e.retry_after + 0.1)
+            finally:
+                self.in_flight -= 1
+                metrics.api.observe(endpoint, time.perf_counter() - started, error)
+
+    async def _wait_turn(self, chat_id, priority: int):
+        started = time.monotonic()
+        chat_wait = self._chat_bucket(chat_id, priority).reserve(started)
+        if chat_wait > 0:
+            self._chat_waiting += 1
+            try:
+                await asyncio.sleep(chat_wait)
+            finally:
+                self._chat_waiting -= 1
+        await self._gate.acquire(priority)
+
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.delayed += 1
+        self._waits[priority].append(waited)
+
+    # --- Метрики ---
+
+    def stats(self) -> dict:
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            pick = (lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000) if ordered else (lambda q: 0.0)
+            waits[PRIORITY_NAMES[priority]] = {
+                "p50_ms": pick(0.50),
+                "p95_ms": pick(0.95),
+                "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+            }
+        queued = self._gate.depth()
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "retry_after": self.retry_after,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "queued": sum(queued.values()) + self._chat_waiting,
+            "queued_by_priority": queued,
+            "chat_waiting": self._chat_waiting,
+            "chats": len(self._chats),
+            "waits": waits,
+        }
+
+
+def make_rate_limiter() -> TelegramRateLimiter:
+    """Лимитер для ApplicationBuilder; лимиты можно подкрутить в .env."""
+    return TelegramRateLimiter(
+        global_per_sec=float(os.getenv("RATE_GLOBAL_PER_SEC", "30")),
+        chat_per_sec=float(os.getenv("RATE_CHAT_PER_SEC", "1")),
+        chat_burst=float(os.getenv("RATE_CHAT_BURST", "3")),
+        group_per_min=float(os.getenv("RATE_GROUP_PER_MIN", "20")),
+        edit_per_sec=float(os.getenv("RATE_EDIT_PER_SEC", "5")),
+        edit_burst=float(os.getenv("RATE_EDIT_BURST", "10")),
+        max_retries=int(os.getenv("RATE_MAX_RETRIES", "3")),
+    )
+
+
+rate_limiter = make_rate_limiter()
+metrics.gauge(
+    "ndsborki_rate_queue_depth", "Запросы к Bot API, ждущие очереди в общем лимите",
+    lambda: rate_limiter.stats()["queued_by_priority"], label="priority",
+)
+metrics.gauge(
+    "ndsborki_rate_wait_p95_seconds", "p95 ожидания в очереди Bot API",
+    lambda: {p: w["p95_ms"] / 1000 for p, w in rate_limiter.stats()["waits"].items()}, label="priority",
+)
+metrics.gauge("ndsborki_rate_retry_after_total", "Ответов 429 от Telegram", lambda: rate_limiter.retry_after)
@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from utils import repository
+from utils.translators import translations_version
+
+
+class RenderCache:
+    """
+    LRU-кэш готовых карточек сборок: текст (HTML) + InlineKeyboardMarkup.
+
+    Ключ — (id сборки, версия хранилища, версия переводов, раскладка). Раскладка
+    описывает, где и как показана сборка (просмотр, /show_all, /delete) и всё,
+    от чего зависит текст/кнопки: номер в списке, соседей в листалке и т.п.
+    При смене файлов переводов или данных хранилища (запись, перечитывание
+    изменённой базы) меняется версия в ключе — старые записи просто
+    вытесняются. При удалении сборки её записи удаляются сразу.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._keys_by_build = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._keys_by_build[key[0]].add(key)
+            while len(self._data) > self.maxsize:
+                old_key, _ = self._data.popitem(last=False)
+                self._discard_ref(old_key)
+
+    def _discard_ref(self, key):
+        keys = self._keys_by_build.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_build[key[0]]
+
+    def invalidate_build(self, build_id):
+        with self._lock:
+            for key in self._keys_by_build.pop(build_id, ()):
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._keys_by_build.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+def render_key(build: dict, layout: tuple) -> tuple:
+    return (build.get("id"), repository.generation(), translations_version(), layout)
+
+
+render_cache = RenderCache(maxsize=int(os.getenv("RENDER_CACHE_SIZE", "2048")))
+
+
+def _on_build_change(op: str, build: dict):
+    render_cache.invalidate_build(build.get("id"))
+
+
+repository.on_change(_on_build_change)
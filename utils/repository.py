@@ -0,0 +1,189 @@
+"""
+Единая точка доступа к сборкам для хэндлеров.
+
+Хранилище выбирается переменной окружения BUILDS_BACKEND:
+  json   — builds.json + журнал в памяти (utils.build_store), по умолчанию
+           (путь — BUILDS_JSON_PATH);
+  sqlite — database/builds.sqlite3 (utils.sqlite_store), для больших каталогов.
+
+Все вызовы уходят в пул ввода-вывода (utils.aio), чтобы чтение диска/SQLite не блокировало event loop.
+"""
+import logging
+import os
+import time
+
+from utils import aio
+from utils.metrics import metrics
+from utils.build_store import store
+from utils.sqlite_store import SqliteBuildStore, SQLITE_PATH
+
+_backend = None
+_listeners = []
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        name = os.getenv("BUILDS_BACKEND", "json").strip().lower()
+        if name == "sqlite":
+            _backend = SqliteBuildStore(os.getenv("BUILDS_SQLITE_PATH") or SQLITE_PATH)
+        else:
+            if name != "json":
+                logging.warning(f"⚠️ Неизвестный BUILDS_BACKEND='{name}', использую json")
+            _backend = store
+        logging.info(f"[DB] Хранилище сборок: {name}")
+    return _backend
+
+
+def on_change(callback):
+    """
+    Подписка на изменения сборок: callback(op, build), op — "add", "update" или "del".
+    Используется кэшами и индексами, которые нужно обновить после записи.
+    """
+    _listeners.append(callback)
+
+
+def _notify(op: str, build: dict):
+    for callback in _listeners:
+        try:
+            callback(op, build)
+        except Exception:
+            logging.exception(f"[DB] Ошибка подписчика на изменения ({op})")
+
+
+def _timed_call(method: str, *args):
+    started = time.perf_counter()
+    try:
+        return getattr(get_backend(), method)(*args)
+    finally:
+        metrics.db.observe(method, time.perf_counter() - started)
+
+
+async def _call(method: str, *args):
+    return await aio.run(_timed_call, method, *args)
+
+
+# --- Просмотр: Категория → Тип → Оружие → Кол-во модулей ---
+
+async def list_types(category: str) -> list:
+    return await _call("list_types", category)
+
+
+async def list_weapons(category: str, type_key: str) -> list:
+    return await _call("list_weapons", category, type_key)
+
+
+async def module_counts(category: str, type_key: str, weapon: str) -> dict:
+    """{кол-во модулей: кол-во сборок}"""
+    return await _call("module_counts", category, type_key, weapon)
+
+
+async def view_build(category: str, type_key: str, weapon: str, count: int, build_id: int):
+    """(сборка или None, prev_id, next_id, всего сборок) для листалки."""
+    return await _call("view_build", category, type_key, weapon, count, build_id)
+
+
+async def get_build(build_id: int):
+    """Сборка по id или None."""
+    return await _call("get_build", build_id)
+
+
+# --- /show_all и /status ---
+
+async def total() -> int:
+    return await _call("total")
+
+
+async def category_counts() -> dict:
+    return await _call("category_counts")
+
+
+async def author_counts() -> dict:
+    """{автор: кол-во сборок}, по убыванию."""
+    return await _call("author_counts")
+
+
+async def summary() -> dict:
+    """
+    Сводка для /status: {"total", "authors", "categories", "types", "module_counts"}.
+    Хранилища ведут её счётчики при добавлении/удалении — базу заново не читаем.
+    """
+    return await _call("summary")
+
+
+async def category_builds(category: str, offset: int, limit: int) -> list:
+    return await _call("category_builds", category, offset, limit)
+
+
+# --- /delete и /add ---
+
+async def all_builds() -> list:
+    return await _call("all_builds")
+
+
+async def browse(category: str = None, type_key: str = None, author: str = None,
+                 offset: int = 0, limit: int = 10):
+    """Страница сборок по фильтрам (None — любой) по возрастанию id: (сборки, всего)."""
+    return await _call("browse", category, type_key, author, offset, limit)
+
+
+async def browse_facets() -> dict:
+    """{"category"|"type"|"author": {значение: кол-во сборок}} для фильтров /delete."""
+    return await _call("browse_facets")
+
+
+async def add(build: dict) -> int:
+    """Сохраняет сборку и возвращает её постоянный id."""
+    backend = get_backend()
+    if backend is store:
+        build_id = await store.add(build)
+    else:
+        build_id = await _call("add", build)
+    _notify("add", {"id": build_id, **build})
+    return build_id
+
+
+async def remove(build_id: int) -> int:
+    build = await get_build(build_id)
+    if build is None:
+        return 0
+    backend = get_backend()
+    if backend is store:
+        removed = await store.remove(build_id)
+    else:
+        removed = await _call("remove", build_id)
+    if removed:
+        _notify("del", build)
+    return removed
+
+
+async def update(build_id: int, fields: dict):
+    """Меняет поля сборки (значение None удаляет поле); возвращает новую сборку или None."""
+    backend = get_backend()
+    if backend is store:
+        build = await store.update(build_id, fields)
+    else:
+        build = await _call("update", build_id, fields)
+    if build is not None:
+        _notify("update", build)
+    return build
+
+
+async def warm_up():
+    """Поднимает хранилище при старте (для json — снапшот + журнал)."""
+    await _call("total")
+    if get_backend() is store and store.needs_compaction:
+        # Сохраняем id, выданные старым сборкам
+        await store.compact()
+
+
+def generation() -> int:
+    """
+    Версия данных хранилища: меняется при каждой записи и перечитывании с диска.
+    Кэши кладут её в ключ, чтобы не отдавать устаревшее после изменений извне.
+    """
+    return get_backend().generation
+
+
+def stats() -> dict:
+    return get_backend().stats()
@@ -0,0 +1,65 @@
+"""
+Запуск бота: long polling (по умолчанию) или вебхук.
+
+Вебхук включается BOT_MODE=webhook и настраивается в .env:
+  WEBHOOK_URL              — публичный адрес, который увидит Telegram (https://bot.example.com)
+  WEBHOOK_PATH             — путь на этом адресе (по умолчанию telegram)
+  WEBHOOK_LISTEN / _PORT   — где слушает встроенный сервер (127.0.0.1:8443, за nginx)
+  WEBHOOK_SECRET           — секрет из заголовка X-Telegram-Bot-Api-Secret-Token;
+                             если не задан, генерируется при каждом запуске
+  WEBHOOK_MAX_CONNECTIONS  — сколько параллельных соединений Telegram откроет (1–100, по умолчанию 40)
+  DROP_PENDING_UPDATES     — 1, чтобы выбросить апдейты, накопившиеся пока бот лежал (для обоих режимов)
+
+Если чего-то не хватает (нет WEBHOOK_URL или не установлен tornado — extra [webhooks]),
+бот пишет предупреждение и работает через polling.
+"""
+import logging
+import os
+import secrets
+
+
+def _flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes")
+
+
+def webhook_settings():
+    """Параметры для Application.run_webhook или None, если вебхук не настроен."""
+    if os.getenv("BOT_MODE", "polling").strip().lower() != "webhook":
+        return None
+
+    base_url = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+    if not base_url:
+        logging.warning("⚠️ BOT_MODE=webhook, но WEBHOOK_URL не задан — запускаюсь через polling")
+        return None
+    try:
+        import tornado  # noqa: F401 — встроенный сервер PTB работает на tornado
+    except ImportError:
+        logging.warning("⚠️ Для вебхука нужен python-telegram-bot[webhooks] — запускаюсь через polling")
+        return None
+
+    url_path = os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/")
+    max_connections = min(100, max(1, int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))))
+    return {
+        "listen": os.getenv("WEBHOOK_LISTEN", "127.0.0.1"),
+        "port": int(os.getenv("WEBHOOK_PORT", "8443")),
+        "url_path": url_path,
+        "webhook_url": f"{base_url}/{url_path}",
+        "secret_token": os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32),
+        "max_connections": max_connections,
+    }
+
+
+def run(app):
+    """Запускает приложение в выбранном режиме (блокирует до остановки)."""
+    drop_pending = _flag("DROP_PENDING_UPDATES")
+    settings = webhook_settings()
+    if settings is None:
+        logging.info("Режим: polling")
+        app.run_polling(drop_pending_updates=drop_pending)
+        return
+
+    logging.info(
+        f"Режим: webhook {settings['webhook_url']} → {settings['listen']}:{settings['port']}, "
+        f"max_connections={settings['max_connections']}"
+    )
+    app.run_webhook(drop_pending_updates=drop_pending, **settings)
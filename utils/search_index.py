@@ -0,0 +1,320 @@
+"""
+Поисковый индекс сборок для инлайн-режима (@бот запрос).
+
+Индексируются название оружия, ярлык типа и модули (английские и русские названия).
+Слова лежат в отсортированном списке — поиск по префиксу это бинарный поиск;
+для поиска по середине слова есть триграммы. Индекс обновляется при каждом
+добавлении/удалении сборки, а целиком перестраивается только при смене
+каталога модулей (переводов/типов).
+"""
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from utils import repository
+from utils.module_catalog import catalog
+
+# Вес поля: совпадение в названии оружия важнее, чем в модулях
+FIELD_WEIGHTS = {"weapon": 8, "type": 3, "module": 1}
+# Вес вида совпадения слова запроса со словом сборки
+EXACT, PREFIX, INFIX = 3, 2, 1
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    return _WORD_RE.findall(str(text).lower().replace("ё", "е"))
+
+
+def _trigrams(term: str) -> set:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class SearchIndex:
+    """
+    Двухуровневый индекс. Нижний уровень — «сущности»: конкретное оружие, тип
+    или модуль со списком id сборок, где они встречаются. Верхний — слова этих
+    сущностей. Различных сущностей немного (сотни), поэтому запрос сначала
+    находит подходящие сущности, а сборки достаёт из их списков лениво,
+    ровно столько, сколько нужно для страницы.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.version = None
+        # Версия хранилища (repository.generation()), по которой собран индекс
+        self.generation = None
+        self.queries = 0
+        self.last_ms = 0.0
+
+    def _clear(self):
+        self._terms = []                        # отсортированные уникальные слова
+        self._term_entities = defaultdict(set)  # слово → сущности
+        self._trigrams = defaultdict(set)       # триграмма → слова
+        self._entities = {}                     # сущность → id сборок по возрастанию
+        self._entity_terms = {}                 # сущность → её слова
+        self._docs = {}                         # id → (сборка, сущности)
+        self._bits = {}                         # сущность → маска id (см. _entity_bits)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _doc_entities(build: dict) -> tuple:
+        entities = [("weapon", build.get("weapon_name", "")), ("type", build.get("type", ""))]
+        entities += [("module", v) for v in (build.get("modules") or {}).values()]
+        return tuple(dict.fromkeys(e for e in entities if e[1]))
+
+    @staticmethod
+    def _entity_words(entity: tuple, type_key: str) -> set:
+        field, value = entity
+        if field == "type":
+            return set(tokenize(value)) | set(tokenize(catalog.type_label(value)))
+        words = set(tokenize(value))
+        if field == "module":
+            words |= set(tokenize(catalog.translations(type_key).get(value, "")))
+        return words
+
+    def _add_entity(self, entity: tuple, type_key: str):
+        words = self._entity_words(entity, type_key)
+        self._entities[entity] = []
+        self._entity_terms[entity] = words
+        for term in words:
+            if term not in self._term_entities:
+                insort(self._terms, term)
+                for tri in _trigrams(term):
+                    self._trigrams[tri].add(term)
+            self._term_entities[term].add(entity)
+
+    def _drop_entity(self, entity: tuple):
+        del self._entities[entity]
+        self._bits.pop(entity, None)
+        for term in self._entity_terms.pop(entity):
+            entities = self._term_entities[term]
+            entities.discard(entity)
+            if entities:
+                continue
+            del self._term_entities[term]
+            pos = bisect_left(self._terms, term)
+            if pos < len(self._terms) and self._terms[pos] == term:
+                del self._terms[pos]
+            for tri in _trigrams(term):
+                terms = self._trigrams.get(tri)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._trigrams[tri]
+
+    def add(self, build: dict):
+        build_id = build.get("id")
+        if build_id is None:
+            return
+        with self._lock:
+            if build_id in self._docs:
+                self.remove(build_id)
+            entities = self._doc_entities(build)
+            self._docs[build_id] = (build, entities)
+            for entity in entities:
+                if entity not in self._entities:
+                    # Слова модуля зависят от типа оружия (файл переводов)
+                    self._add_entity(entity, build.get("type", ""))
+                ids = self._entities[entity]
+                if not ids or ids[-1] < build_id:
+                    ids.append(build_id)
+                else:
+                    insort(ids, build_id)
+                if entity in self._bits:
+                    self._bits[entity] |= 1 << build_id
+
+    def remove(self, build_id: int):
+        with self._lock:
+            doc = self._docs.pop(build_id, None)
+            if doc is None:
+                return
+            for entity in doc[1]:
+                ids = self._entities.get(entity)
+                if ids is None:
+                    continue
+                pos = bisect_left(ids, build_id)
+                if pos < len(ids) and ids[pos] == build_id:
+                    del ids[pos]
+                if entity in self._bits:
+                    self._bits[entity] &= ~(1 << build_id)
+                if not ids:
+                    self._drop_entity(entity)
+
+    def rebuild(self, builds: list, generation: int = None):
+        started = time.perf_counter()
+        # Собираем в отдельном объекте и подменяем разом — поиск не ждёт пересборки
+        version = catalog.version
+        fresh = SearchIndex()
+        for b in sorted(builds, key=lambda b: b.get("id", 0)):
+            fresh.add(b)
+        # Маски — сразу, чтобы первый запрос из нескольких слов их не ждал
+        for entity in fresh._entities:
+            fresh._entity_bits(entity)
+        with self._lock:
+            self._terms, self._term_entities, self._trigrams = fresh._terms, fresh._term_entities, fresh._trigrams
+            self._entities, self._entity_terms, self._docs = fresh._entities, fresh._entity_terms, fresh._docs
+            self._bits = fresh._bits
+            self.version = version
+            self.generation = generation
+        logging.info(f"[SEARCH] Индекс собран: {len(builds)} сборок за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    def _match_terms(self, token: str) -> dict:
+        """{слово индекса: вес совпадения} для одного слова запроса."""
+        matches = {}
+        pos = bisect_left(self._terms, token)
+        while pos < len(self._terms) and self._terms[pos].startswith(token):
+            term = self._terms[pos]
+            matches[term] = EXACT if term == token else PREFIX
+            pos += 1
+        if len(token) >= 3:
+            grams = sorted((self._trigrams.get(tri, set()) for tri in _trigrams(token)), key=len)
+            if grams and grams[0]:
+                for term in grams[0].intersection(*grams[1:]):
+                    if term not in matches and token in term:
+                        matches[term] = INFIX
+        return matches
+
+    def _match_entities(self, token: str) -> dict:
+        """{сущность: вес} для одного слова запроса."""
+        weights = {}
+        for term, kind in self._match_terms(token).items():
+            for entity in self._term_entities[term]:
+                weight = kind * FIELD_WEIGHTS[entity[0]]
+                if weights.get(entity, 0) < weight:
+                    weights[entity] = weight
+        return weights
+
+    def _iter_ranked(self, weights: dict, seen: set):
+        """id сборок по убыванию веса, внутри веса — от новых к старым, без повторов."""
+        tiers = defaultdict(list)
+        for entity, weight in weights.items():
+            tiers[weight].append(self._entities[entity])
+        for weight in sorted(tiers, reverse=True):
+            for build_id in heapq.merge(*(reversed(ids) for ids in tiers[weight]), reverse=True):
+                if build_id not in seen:
+                    seen.add(build_id)
+                    yield build_id
+
+    def _entity_bits(self, entity: tuple) -> int:
+        """
+        id сборок сущности битовой маской (бит i — сборка #i). Считается при
+        пересборке индекса (для новых сущностей — при первом запросе), дальше
+        add/remove правят её на месте.
+        """
+        bits = self._bits.get(entity)
+        if bits is None:
+            ids = self._entities[entity]
+            raw = bytearray((ids[-1] >> 3) + 1 if ids else 0)
+            for build_id in ids:
+                raw[build_id >> 3] |= 1 << (build_id & 7)
+            bits = self._bits[entity] = int.from_bytes(raw, "little")
+        return bits
+
+    def _cross_tiers(self, per_token: list) -> list:
+        """
+        Слова запроса попали в разные сущности (например, оружие + модуль):
+        [(вес, маска id)] по убыванию веса. Для каждого слова маски «лучшее совпадение
+        с весом w» собираются OR-ом масок его сущностей, ярус — AND таких масок по всем
+        словам. Перебираются сущности и веса (их единицы), а не сборки.
+        """
+        levels = []
+        for weights in per_token:
+            by_weight = defaultdict(int)
+            for entity, weight in weights.items():
+                by_weight[weight] |= self._entity_bits(entity)
+            token_levels, better = [], 0
+            for weight in sorted(by_weight, reverse=True):
+                exact = by_weight[weight] & ~better
+                better |= by_weight[weight]
+                if exact:
+                    token_levels.append((weight, exact))
+            levels.append(token_levels)
+        # Меньше вариантов у первых слов — пустые пересечения отсекаются раньше
+        levels.sort(key=len)
+
+        tiers = defaultdict(int)
+
+        def walk(depth: int, score: int, bits: int):
+            if depth == len(levels):
+                tiers[score] |= bits
+                return
+            for weight, mask in levels[depth]:
+                both = bits & mask
+                if both:
+                    walk(depth + 1, score + weight, both)
+
+        walk(0, 0, -1)  # -1 — все биты
+        return sorted(tiers.items(), reverse=True)
+
+    def _iter_results(self, per_token: list):
+        """
+        Сначала сборки, где все слова запроса попали в одну сущность («kastov 762» —
+        название оружия), затем — совпадения по разным полям. И те и другие
+        достаются лениво, по убыванию веса, внутри веса — от новых к старым.
+        """
+        seen = set()
+        common = set(per_token[0]).intersection(*per_token[1:])
+        yield from self._iter_ranked({e: sum(w[e] for w in per_token) for e in common}, seen)
+        if len(per_token) == 1:
+            return
+        for _, bits in self._cross_tiers(per_token):
+            while bits:
+                build_id = bits.bit_length() - 1
+                bits ^= 1 << build_id
+                if build_id not in seen:
+                    yield build_id
+
+    def search(self, query: str, offset: int = 0, limit: int = 20):
+        """(сборки страницы, есть ли ещё). Сборки достаются лениво — ровно до конца страницы."""
+        started = time.perf_counter()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            self.queries += 1
+            per_token = [self._match_entities(t) for t in tokens]
+            if not tokens:
+                # Пустой запрос — просто последние добавленные сборки
+                ids = list(itertools.islice(reversed(self._docs), offset, offset + limit + 1))
+            elif not all(per_token):
+                ids = []
+            else:
+                results = self._iter_results(per_token)
+                ids = list(itertools.islice(results, offset, offset + limit + 1))
+            page = [self._docs[i][0] for i in ids[:limit]]
+        self.last_ms = (time.perf_counter() - started) * 1000
+        return page, len(ids) > limit
+
+    def stats(self) -> dict:
+        return {
+            "builds": len(self._docs),
+            "entities": len(self._entities),
+            "terms": len(self._terms),
+            "queries": self.queries,
+            "last_ms": round(self.last_ms, 3),
+        }
+
+
+search_index = SearchIndex()
+
+
+def _on_build_change(op: str, build: dict):
+    expected = search_index.generation
+    if op in ("add", "update"):
+        search_index.add(build)
+    else:
+        search_index.remove(build.get("id"))
+    # Своя запись сдвигает версию хранилища ровно на 1 и уже учтена; если сдвиг
+    # больше, базу меняли ещё и извне — индекс пересоберётся при следующем запросе
+    if expected is not None and repository.generation() == expected + 1:
+        search_index.generation = expected + 1
+
+
+repository.on_change(_on_build_change)
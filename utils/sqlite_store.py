@@ -0,0 +1,346 @@
+import json
+import pathlib
+import sqlite3
+import threading
+from collections import Counter
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+SQLITE_PATH = ROOT / "database" / "builds.sqlite3"
+
+# Сколько id подставлять в один IN (...) — с запасом до SQLITE_MAX_VARIABLE_NUMBER старых сборок (999)
+ID_CHUNK = 900
+
+# Поля сборки, которые лежат в отдельных колонках; всё остальное — в extra (JSON)
+COLUMNS = ("weapon_name", "role", "category", "mode", "type", "image", "author")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    weapon_name   TEXT NOT NULL DEFAULT '',
+    role          TEXT NOT NULL DEFAULT '',
+    category      TEXT NOT NULL DEFAULT '',
+    mode          TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    type          TEXT NOT NULL DEFAULT '',
+    module_count  INTEGER NOT NULL DEFAULT 0,
+    image         TEXT NOT NULL DEFAULT '',
+    author        TEXT NOT NULL DEFAULT '',
+    extra         TEXT
+);
+
+CREATE TABLE IF NOT EXISTS build_modules (
+    build_id  INTEGER NOT NULL REFERENCES builds(id) ON DELETE CASCADE,
+    position  INTEGER NOT NULL,
+    slot      TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    PRIMARY KEY (build_id, position)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_builds_facets
+    ON builds (mode, category, type, weapon_name);
+CREATE INDEX IF NOT EXISTS idx_builds_module_count
+    ON builds (category, type, weapon_name, module_count);
+CREATE INDEX IF NOT EXISTS idx_builds_category
+    ON builds (category, id);
+CREATE INDEX IF NOT EXISTS idx_builds_type
+    ON builds (type, id);
+CREATE INDEX IF NOT EXISTS idx_builds_author
+    ON builds (author, id);
+"""
+
+
+class SqliteBuildStore:
+    """
+    Хранилище сборок в SQLite (режим WAL). Модули лежат в дочерней таблице.
+    Методы синхронные и рассчитаны на вызов из пула потоков (см. utils.repository):
+    у каждого потока своё соединение.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # Счётчики для /status: считаются GROUP BY один раз, дальше меняются в add/remove
+        self._counters = None
+        self._counters_lock = threading.Lock()
+        self.queries = 0
+        # Растёт при каждой записи (см. BuildStore.generation)
+        self.generation = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _query(self, sql: str, params=()) -> list:
+        self.queries += 1
+        return self._conn().execute(sql, params).fetchall()
+
+    # --- Преобразование строк ---
+
+    def _attach_modules(self, rows) -> list:
+        if not rows:
+            return []
+        ids = [r["id"] for r in rows]
+        modules = {i: {} for i in ids}
+        # Не больше ID_CHUNK параметров на запрос: у SQLite есть предел числа переменных
+        for start in range(0, len(ids), ID_CHUNK):
+            chunk = ids[start:start + ID_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for m in self._query(
+                f"SELECT build_id, slot, value FROM build_modules "
+                f"WHERE build_id IN ({placeholders}) ORDER BY build_id, position",
+                chunk,
+            ):
+                modules[m["build_id"]][m["slot"]] = m["value"]
+
+        builds = []
+        for r in rows:
+            build = json.loads(r["extra"]) if r["extra"] else {}
+            build.update({col: r[col] for col in COLUMNS})
+            build["modules"] = modules[r["id"]]
+            build["id"] = r["id"]
+            builds.append(build)
+        return builds
+
+    # --- Запросы для просмотра (conversations/view.py) ---
+
+    def list_types(self, category: str) -> list:
+        rows = self._query(
+            "SELECT DISTINCT type FROM builds WHERE mode = 'warzone' AND category = ? ORDER BY type",
+            (category,),
+        )
+        return [r["type"] for r in rows]
+
+    def list_weapons(self, category: str, type_key: str) -> list:
+        rows = self._query(
+            "SELECT DISTINCT weapon_name FROM builds WHERE category = ? AND type = ? ORDER BY weapon_name",
+            (category, type_key),
+        )
+        return [r["weapon_name"] for r in rows]
+
+    def module_counts(self, category: str, type_key: str, weapon: str) -> dict:
+        rows = self._query(
+            "SELECT module_count, COUNT(*) AS n FROM builds "
+            "WHERE category = ? AND type = ? AND weapon_name = ? GROUP BY module_count",
+            (category, type_key, weapon),
+        )
+        return {r["module_count"]: r["n"] for r in rows}
+
+    def view_build(self, category: str, type_key: str, weapon: str, count: int, build_id: int):
+        """
+        Сборка для листалки и id соседей: (сборка, prev_id, next_id, всего).
+        Если сборки с таким id уже нет (или id=0) — открываем первую.
+        """
+        params = (category, type_key, weapon, count)
+        where = "category = ? AND type = ? AND weapon_name = ? AND module_count = ?"
+        total = self._query(f"SELECT COUNT(*) AS n FROM builds WHERE {where}", params)[0]["n"]
+        if not total:
+            return None, None, None, 0
+
+        rows = self._query(f"SELECT * FROM builds WHERE {where} AND id = ?", params + (build_id,))
+        if not rows:
+            rows = self._query(f"SELECT * FROM builds WHERE {where} ORDER BY id LIMIT 1", params)
+        build = self._attach_modules(rows)[0]
+
+        # Соседи по id с переходом через край — по индексу (category, type, weapon_name, module_count)
+        prev_row = (
+            self._query(f"SELECT id FROM builds WHERE {where} AND id < ? ORDER BY id DESC LIMIT 1", params + (build["id"],))
+            or self._query(f"SELECT id FROM builds WHERE {where} ORDER BY id DESC LIMIT 1", params)
+        )
+        next_row = (
+            self._query(f"SELECT id FROM builds WHERE {where} AND id > ? ORDER BY id LIMIT 1", params + (build["id"],))
+            or self._query(f"SELECT id FROM builds WHERE {where} ORDER BY id LIMIT 1", params)
+        )
+        return build, prev_row[0]["id"], next_row[0]["id"], total
+
+    def get_build(self, build_id: int):
+        return next(iter(self._attach_modules(self._query("SELECT * FROM builds WHERE id = ?", (build_id,)))), None)
+
+    # --- /show_all и /status ---
+
+    def total(self) -> int:
+        return self._query("SELECT COUNT(*) AS n FROM builds")[0]["n"]
+
+    def category_counts(self) -> dict:
+        rows = self._query("SELECT category, COUNT(*) AS n FROM builds GROUP BY category")
+        return {r["category"] or "—": r["n"] for r in rows}
+
+    def author_counts(self) -> dict:
+        rows = self._query("SELECT author, COUNT(*) AS n FROM builds GROUP BY author ORDER BY n DESC")
+        return {r["author"] or "—": r["n"] for r in rows}
+
+    def _load_counters(self) -> dict:
+        def grouped(column: str, default=None) -> Counter:
+            rows = self._query(f"SELECT {column} AS k, COUNT(*) AS n FROM builds GROUP BY {column}")
+            return Counter({(r["k"] if default is None else r["k"] or default): r["n"] for r in rows})
+
+        return {
+            "authors": grouped("author", "—"),
+            "categories": grouped("category", "—"),
+            "types": grouped("type"),
+            "module_counts": grouped("module_count"),
+        }
+
+    def _bump(self, row: dict, delta: int):
+        with self._counters_lock:
+            self.generation += 1
+            if self._counters is None:
+                return
+            for name, key in (
+                ("authors", row["author"] or "—"),
+                ("categories", row["category"] or "—"),
+                ("types", row["type"]),
+                ("module_counts", row["module_count"]),
+            ):
+                counter = self._counters[name]
+                counter[key] += delta
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def summary(self) -> dict:
+        """Сводка для /status: всего, по авторам, категориям, типам и числу модулей."""
+        with self._counters_lock:
+            if self._counters is None:
+                self._counters = self._load_counters()
+            c = self._counters
+            return {
+                "total": sum(c["categories"].values()),
+                "authors": dict(c["authors"].most_common()),
+                "categories": dict(c["categories"]),
+                "types": dict(c["types"].most_common()),
+                "module_counts": dict(sorted(c["module_counts"].items())),
+            }
+
+    def category_builds(self, category: str, offset: int, limit: int) -> list:
+        rows = self._query(
+            "SELECT * FROM builds WHERE category = ? ORDER BY id LIMIT ? OFFSET ?",
+            (category, limit, offset),
+        )
+        return self._attach_modules(rows)
+
+    # --- /delete и /add ---
+
+    def all_builds(self) -> list:
+        return self._attach_modules(self._query("SELECT * FROM builds ORDER BY id"))
+
+    def browse(self, category: str, type_key: str, author: str, offset: int, limit: int):
+        """Страница сборок по фильтрам (None — без фильтра), по возрастанию id: (сборки, всего)."""
+        clauses, params = [], []
+        for column, value in (("category", category), ("type", type_key), ("author", author)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append("" if value == "—" else value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        total = self._query(f"SELECT COUNT(*) AS n FROM builds {where}", params)[0]["n"]
+        rows = self._query(f"SELECT * FROM builds {where} ORDER BY id LIMIT ? OFFSET ?", (*params, limit, offset))
+        return self._attach_modules(rows), total
+
+    def browse_facets(self) -> dict:
+        rows = self._query("SELECT type, COUNT(*) AS n FROM builds GROUP BY type")
+        return {
+            "category": self.category_counts(),
+            "type": {r["type"]: r["n"] for r in rows},
+            "author": self.author_counts(),
+        }
+
+    def _insert(self, conn: sqlite3.Connection, build: dict) -> int:
+        modules = build.get("modules") or {}
+        extra = {k: v for k, v in build.items() if k not in COLUMNS and k not in ("modules", "id")}
+        cur = conn.execute(
+            f"INSERT INTO builds (id, {', '.join(COLUMNS)}, module_count, extra) "
+            f"VALUES (?, {', '.join('?' * len(COLUMNS))}, ?, ?)",
+            [build.get("id")]
+            + [str(build.get(col) or "") for col in COLUMNS]
+            + [len(modules), json.dumps(extra, ensure_ascii=False) if extra else None],
+        )
+        build_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO build_modules (build_id, position, slot, value) VALUES (?, ?, ?, ?)",
+            [(build_id, pos, slot, str(value)) for pos, (slot, value) in enumerate(modules.items())],
+        )
+        return build_id
+
+    def add(self, build: dict) -> int:
+        """Добавляет сборку и возвращает её id."""
+        conn = self._conn()
+        with conn:
+            build_id = self._insert(conn, build)
+        self.queries += 1
+        self._bump({
+            "author": str(build.get("author") or ""),
+            "category": str(build.get("category") or ""),
+            "type": str(build.get("type") or ""),
+            "module_count": len(build.get("modules") or {}),
+        }, +1)
+        return build_id
+
+    def add_many(self, builds: list, replace: bool = False) -> int:
+        """Добавляет сборки одной транзакцией; replace=True — сначала удаляет все существующие."""
+        conn = self._conn()
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM builds")
+            for b in builds:
+                self._insert(conn, b)
+        with self._counters_lock:
+            self._counters = None
+            self.generation += 1
+        return len(builds)
+
+    def remove(self, build_id: int) -> int:
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT author, category, type, module_count FROM builds WHERE id = ?", (build_id,)
+            ).fetchone()
+            cur = conn.execute("DELETE FROM builds WHERE id = ?", (build_id,))
+        self.queries += 1
+        if cur.rowcount and row is not None:
+            self._bump(dict(row), -1)
+        return cur.rowcount
+
+    def update(self, build_id: int, fields: dict):
+        """Меняет поля сборки (None — удалить поле), возвращает новую сборку или None."""
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                f"SELECT {', '.join(COLUMNS)}, extra FROM builds WHERE id = ?", (build_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            extra = json.loads(row["extra"]) if row["extra"] else {}
+            values = {col: row[col] for col in COLUMNS}
+            for key, value in fields.items():
+                if key in COLUMNS:
+                    values[key] = str(value or "")
+                elif value is None:
+                    extra.pop(key, None)
+                else:
+                    extra[key] = value
+            conn.execute(
+                f"UPDATE builds SET {', '.join(f'{col} = ?' for col in COLUMNS)}, extra = ? WHERE id = ?",
+                [values[col] for col in COLUMNS]
+                + [json.dumps(extra, ensure_ascii=False) if extra else None, build_id],
+            )
+        self.queries += 1
+        with self._counters_lock:
+            # Автор/категория/тип могли поменяться — счётчики пересчитаются по запросу
+            self._counters = None
+            self.generation += 1
+        return self.get_build(build_id)
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "queries": self.queries}
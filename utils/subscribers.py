@@ -0,0 +1,143 @@
+"""
+Реестр подписчиков на новые сборки и журнал рассылок.
+
+database/subscribers.sqlite3:
+  subscribers — кто нажимал /start; subscribed=0 — отписался (/unsubscribe),
+                такие записи /start обратно не включает;
+  broadcasts  — рассылки с точкой продолжения: cursor — последний user_id,
+                до которого (включительно, по возрастанию id) всё уже отправлено,
+                ahead — JSON-список тех, кому отправлено дальше cursor (отправки
+                идут параллельно и заканчиваются не по порядку).
+
+Все методы синхронные — вызывать через aio.run.
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+SUBSCRIBERS_PATH = ROOT / "database" / "subscribers.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    user_id     INTEGER PRIMARY KEY,
+    subscribed  INTEGER NOT NULL DEFAULT 1,
+    since       INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    build_id  INTEGER NOT NULL,
+    created   INTEGER NOT NULL,
+    finished  INTEGER,
+    total     INTEGER NOT NULL,
+    cursor    INTEGER NOT NULL DEFAULT 0,
+    sent      INTEGER NOT NULL DEFAULT 0,
+    failed    INTEGER NOT NULL DEFAULT 0,
+    blocked   INTEGER NOT NULL DEFAULT 0,
+    file_id   TEXT,
+    ahead     TEXT NOT NULL DEFAULT '[]'
+);
+"""
+
+BROADCAST_FIELDS = (
+    "id", "build_id", "created", "finished", "total", "cursor", "sent", "failed", "blocked", "file_id", "ahead",
+)
+
+
+def _row_to_job(row) -> dict:
+    job = dict(zip(BROADCAST_FIELDS, row))
+    job["ahead"] = json.loads(job["ahead"])
+    return job
+
+
+class SubscriberRegistry:
+    def __init__(self, path: pathlib.Path = SUBSCRIBERS_PATH):
+        self.path = pathlib.Path(path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    # --- Подписчики ---
+
+    def add(self, user_id: int) -> bool:
+        """Новый пользователь становится подписчиком; отписавшихся не трогаем."""
+        with self._lock, self._db() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO subscribers (user_id, subscribed, since) VALUES (?, 1, ?)",
+                (user_id, int(time.time())),
+            )
+        return cur.rowcount > 0
+
+    def set_subscribed(self, user_id: int, subscribed: bool):
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT INTO subscribers (user_id, subscribed, since) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET subscribed = excluded.subscribed",
+                (user_id, int(subscribed), int(time.time())),
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM subscribers WHERE subscribed = 1").fetchone()[0]
+
+    def page_after(self, after: int, limit: int) -> list:
+        """user_id подписчиков по возрастанию, начиная после after (ходим по первичному ключу)."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT user_id FROM subscribers WHERE subscribed = 1 AND user_id > ? ORDER BY user_id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    # --- Рассылки ---
+
+    def create_broadcast(self, build_id: int) -> dict:
+        with self._lock, self._db() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM subscribers WHERE subscribed = 1").fetchone()[0]
+            cur = conn.execute(
+                "INSERT INTO broadcasts (build_id, created, total) VALUES (?, ?, ?)",
+                (build_id, int(time.time()), total),
+            )
+            broadcast_id = cur.lastrowid
+        return self.get_broadcast(broadcast_id)
+
+    def get_broadcast(self, broadcast_id: int):
+        with self._lock:
+            row = self._db().execute(
+                f"SELECT {', '.join(BROADCAST_FIELDS)} FROM broadcasts WHERE id = ?", (broadcast_id,)
+            ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT {', '.join(BROADCAST_FIELDS)} FROM broadcasts WHERE finished IS NULL ORDER BY id"
+            ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def save_progress(self, job: dict, dropped=(), finished: bool = False):
+        """Точка продолжения + удаление выбывших подписчиков — одной транзакцией."""
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, blocked = ?, file_id = ?, ahead = ?, "
+                "finished = ? WHERE id = ?",
+                (job["cursor"], job["sent"], job["failed"], job["blocked"], job["file_id"], json.dumps(job["ahead"]),
+                 int(time.time()) if finished else None, job["id"]),
+            )
+            if dropped:
+                conn.executemany("DELETE FROM subscribers WHERE user_id = ?", [(u,) for u in dropped])
+
+
+subscribers = SubscriberRegistry(os.getenv("SUBSCRIBERS_PATH") or SUBSCRIBERS_PATH)
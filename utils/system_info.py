@@ -0,0 +1,66 @@
+"""
+Состояние сервиса (systemctl) и последний коммит (git) для /status.
+
+Процессы запускаются не на каждый /status: snapshot() сразу отдаёт последние
+известные значения и, если им больше STATUS_INFO_TTL секунд, запускает
+обновление в фоне — ответ его не ждёт. Первый раз данные собираются при старте.
+"""
+import asyncio
+import logging
+import os
+import time
+
+STATUS_INFO_TTL = float(os.getenv("STATUS_INFO_TTL", "60"))
+SERVICE_NAME = "ndsborki.service"
+
+
+async def _run(*cmd, cwd=None) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate()
+    return (out or err).decode().strip()
+
+
+class SystemInfo:
+    def __init__(self, ttl: float = STATUS_INFO_TTL):
+        self.ttl = ttl
+        self.service_status = "—"
+        self.commit_time = "—"
+        self.commit_files = []
+        self.updated = None  # time.monotonic() последнего обновления
+        self._task = None
+
+    async def refresh(self):
+        try:
+            self.service_status = await _run("/usr/bin/systemctl", "is-active", SERVICE_NAME)
+        except Exception as e:
+            self.service_status = f"⚠️ Ошибка при проверке systemd: {e}"
+
+        try:
+            lines = (await _run("git", "log", "-1", "--format=%ci", "--name-only", cwd=os.getcwd())).splitlines()
+            if lines:
+                self.commit_time = lines[0].strip()
+                self.commit_files = [ln for ln in lines[1:] if ln.strip()]
+        except Exception:
+            logging.exception("Не удалось получить данные о последнем коммите")
+        self.updated = time.monotonic()
+
+    def refresh_in_background(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.refresh())
+
+    def snapshot(self) -> dict:
+        """Последние известные данные; устаревшие обновятся к следующему вызову."""
+        age = None if self.updated is None else time.monotonic() - self.updated
+        if age is None or age > self.ttl:
+            self.refresh_in_background()
+        return {
+            "service": self.service_status,
+            "commit_time": self.commit_time,
+            "commit_files": list(self.commit_files),
+            "age": age,
+        }
+
+
+system_info = SystemInfo()